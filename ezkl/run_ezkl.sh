@@ -6,25 +6,47 @@ SHARED_DIR="shared_circuit"
 MODEL_PATH=""
 SRS_PATH=""
 GENERATE_CONTRACT=false
+QUIET_FLAG=""
+PROOF_ROOT="proof_generation"
 
 # Display usage information
 show_usage() {
-    echo "Usage: $0 [--setup-common --model-path <path> --srs-path <path>] [--generate-contract] <address_dir>"
+    echo "Usage: $0 [--setup-common --model-path <path> --srs-path <path>] [--generate-contract] [--quiet] <address_dir>"
+    echo "   or: $0 [--generate-contract] [--quiet] --address <address>"
     echo
     echo "Options:"
     echo "  --setup-common       Generate common circuit and keys (only needed once)"
     echo "  --model-path <path>  Path to the ONNX model file (required with --setup-common)"
     echo "  --srs-path <path>    Path to the SRS file (required with --setup-common)"
     echo "  --generate-contract  Generate Solidity verifier contract and calldata"
+    echo "  --quiet              Do not print witness.json and metadata.json"
+    echo "  --address <address>  Use the address's directory under $PROOF_ROOT (flat or sharded layout)"
     echo "  <address_dir>        Directory containing address-specific input.json file"
     echo
     echo "Examples:"
     echo "  $0 --setup-common --model-path model.onnx --srs-path kzg.srs"
     echo "  $0 proof_generation/4444444444444444444444444444444444444444"
     echo "  $0 --generate-contract proof_generation/4444444444444444444444444444444444444444"
+    echo "  $0 --address 0x4444444444444444444444444444444444444444"
     exit 1
 }
 
+# Print the directory of an address under $PROOF_ROOT, following the layout file
+# written by create_model.py or migrate_layout.py (same paths as address_dir in src/utils.rs)
+address_dir() {
+    local name="$1"
+    while [[ "$name" == 0x* ]]; do
+        name="${name#0x}"
+    done
+    if [ "$(cat "$PROOF_ROOT/layout" 2>/dev/null)" = "sharded" ]; then
+        local digest
+        digest=$(printf '%s' "$name" | tr '[:upper:]' '[:lower:]' | sha256sum | cut -c1-4)
+        echo "$PROOF_ROOT/${digest:0:2}/${digest:2:2}/$name"
+    else
+        echo "$PROOF_ROOT/$name"
+    fi
+}
+
 # Parse command line arguments
 while [[ $# -gt 0 ]]; do
     case $1 in
@@ -44,6 +66,14 @@ while [[ $# -gt 0 ]]; do
             GENERATE_CONTRACT=true
             shift
             ;;
+        --quiet)
+            QUIET_FLAG="--quiet"
+            shift
+            ;;
+        --address)
+            ADDRESS_DIR="$(address_dir "$2")"
+            shift 2
+            ;;
         -h|--help)
             show_usage
             ;;
@@ -90,7 +120,7 @@ fi
 # Generate proof for the specific address
 echo "Generating proof for address in $ADDRESS_DIR..."
 if [ "$GENERATE_CONTRACT" = true ]; then
-    ./run_ezkl_individual.sh "$ADDRESS_DIR/input.json" "$SHARED_DIR" "$ADDRESS_DIR" --generate-contract
+    ./run_ezkl_individual.sh "$ADDRESS_DIR/input.json" "$SHARED_DIR" "$ADDRESS_DIR" --generate-contract $QUIET_FLAG
 else
-    ./run_ezkl_individual.sh "$ADDRESS_DIR/input.json" "$SHARED_DIR" "$ADDRESS_DIR"
+    ./run_ezkl_individual.sh "$ADDRESS_DIR/input.json" "$SHARED_DIR" "$ADDRESS_DIR" $QUIET_FLAG
 fi
@@ -7,8 +7,9 @@ BASE_DIR="$(dirname "$SCRIPT_DIR")"
 
 # Check if required arguments are provided
 if [ "$#" -lt 3 ]; then
-    echo "Usage: $0 <input_file> <shared_circuit_dir> <output_dir> [--generate-contract]"
+    echo "Usage: $0 <input_file> <shared_circuit_dir> <output_dir> [--generate-contract] [--quiet]"
     echo "Example: $0 input.json shared_circuit proof_output --generate-contract"
+    echo "--quiet skips printing witness.json and metadata.json"
     exit 1
 fi
 
@@ -35,11 +36,15 @@ if [[ "$SHARED_DIR" == *"shared_circuit"* ]]; then
 fi
 
 GENERATE_CONTRACT=false
+QUIET=false
 
-# Check for optional --generate-contract flag
-if [ "$#" -eq 4 ] && [ "$4" = "--generate-contract" ]; then
-    GENERATE_CONTRACT=true
-fi
+# Check for optional flags
+for arg in "${@:4}"; do
+    case "$arg" in
+        --generate-contract) GENERATE_CONTRACT=true ;;
+        --quiet) QUIET=true ;;
+    esac
+done
 
 # Create output directory if it doesn't exist
 mkdir -p "$OUTPUT_DIR"
@@ -68,19 +73,21 @@ ezkl prove --witness "$OUTPUT_DIR/witness.json" \
          --compiled-circuit "$SHARED_DIR/model.compiled" \
          --srs-path "$SHARED_DIR/kzg.srs"
 
-# Log the output data for comparison
-echo "----------------------------------------"
-echo "Checking for witness and metadata files:"
-if [ -f "$OUTPUT_DIR/witness.json" ]; then
-    echo "Witness output:"
-    cat "$OUTPUT_DIR/witness.json"
-fi
+# Log the output data for comparison; with --quiet, logs stay the same size whatever the witness
+if [ "$QUIET" = false ]; then
+    echo "----------------------------------------"
+    echo "Checking for witness and metadata files:"
+    if [ -f "$OUTPUT_DIR/witness.json" ]; then
+        echo "Witness output:"
+        cat "$OUTPUT_DIR/witness.json"
+    fi
 
-if [ -f "$OUTPUT_DIR/metadata.json" ]; then
-    echo "Metadata output:"
-    cat "$OUTPUT_DIR/metadata.json"
+    if [ -f "$OUTPUT_DIR/metadata.json" ]; then
+        echo "Metadata output:"
+        cat "$OUTPUT_DIR/metadata.json"
+    fi
+    echo "----------------------------------------"
 fi
-echo "----------------------------------------"
 # Copy verification key to output directory
 echo "Copying verification key..."
 cp "$SHARED_DIR/vk.key" "$OUTPUT_DIR/vk.key"
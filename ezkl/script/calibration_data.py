@@ -0,0 +1,115 @@
+"""Build a representative multi-row calibration set for ezkl calibrate-settings.
+
+Calibrating on a single address sizes the circuit's lookup ranges for that
+one input. This set covers what the proofs will actually see:
+
+- rows from credit_data.json spread over the score range of each tier;
+- every corner of [0, 1]^4, i.e. each feature at its clamp bounds and the
+  logit extremes of -5 and +5;
+- rows just below and just above each tier and eligibility threshold.
+
+All rows are concatenated into one flat input_data entry. ezkl splits it
+into chunks of the model's input size, so --target resources keeps the
+settings valid for every row.
+"""
+import argparse
+import itertools
+import json
+
+import numpy as np
+
+from credit_model import MODEL_WEIGHTS, NUM_FEATURES, score_batch, tier_of
+from heads import ELIGIBILITY_THRESHOLD, TIER_THRESHOLDS
+
+TIERS = ("LOW", "MEDIUM", "HIGH")
+ROWS_PER_TIER = 16
+
+# Offset of the rows placed either side of each threshold, in feature units
+THRESHOLD_STEP = 1e-3
+
+
+def load_credit_features(data_path):
+    """Feature rows of a credit_data.json written by the synthetic_data crate."""
+    with open(data_path) as f:
+        data = json.load(f)
+    return np.clip(np.asarray(data["features"], dtype=np.float32).reshape(-1, NUM_FEATURES), 0.0, 1.0)
+
+
+def stratified_rows(features, rows_per_tier=ROWS_PER_TIER):
+    """Up to rows_per_tier rows per tier, evenly spaced over that tier's sorted scores."""
+    scores = score_batch(features)
+    tiers = tier_of(scores)
+    picked = []
+    for tier in TIERS:
+        indices = np.flatnonzero(tiers == tier)
+        if indices.size == 0:
+            continue
+        indices = indices[np.argsort(scores[indices], kind="stable")]
+        positions = np.unique(np.linspace(0, indices.size - 1, min(rows_per_tier, indices.size)).round().astype(int))
+        picked.append(features[indices[positions]])
+    return np.concatenate(picked) if picked else np.empty((0, NUM_FEATURES), dtype=np.float32)
+
+
+def corner_rows(num_features=NUM_FEATURES):
+    """All 2^num_features corners of the feature cube."""
+    return np.array(list(itertools.product((0.0, 1.0), repeat=num_features)), dtype=np.float32)
+
+
+def threshold_rows(weights=MODEL_WEIGHTS):
+    """Uniform rows whose exact score lands just either side of each threshold.
+
+    Rows exactly on a threshold are left out: any rounding decides their tier.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    rows = []
+    for threshold in sorted(TIER_THRESHOLDS + (ELIGIBILITY_THRESHOLD,)):
+        # sigmoid(10 * x * sum(w) - 5) == threshold for a uniform row x
+        value = (np.log(threshold / (1.0 - threshold)) + 5.0) / (10.0 * weights.sum())
+        for offset in (-THRESHOLD_STEP, THRESHOLD_STEP):
+            rows.append(np.full(weights.size, np.clip(value + offset, 0.0, 1.0)))
+    return np.asarray(rows, dtype=np.float32)
+
+
+def calibration_rows(features, rows_per_tier=ROWS_PER_TIER, batch_size=None):
+    """The full calibration set, padded with zero rows to a multiple of batch_size."""
+    rows = np.concatenate([stratified_rows(features, rows_per_tier), corner_rows(), threshold_rows()])
+    if batch_size:
+        padding = -len(rows) % batch_size
+        rows = np.concatenate([rows, np.zeros((padding, NUM_FEATURES), dtype=np.float32)])
+    return rows
+
+
+def write_calibration_input(output_path, rows):
+    """Write rows as one flat EZKL input, with the model's scores as output_data."""
+    scores = score_batch(rows)
+    calibration_input = {
+        "input_data": [rows.reshape(-1).tolist()],
+        "input_shapes": [[len(rows), NUM_FEATURES]],
+        "output_data": [scores.tolist()],
+    }
+    with open(output_path, "w") as f:
+        json.dump(calibration_input, f, indent=2)
+    return scores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("data", help="credit_data.json produced by the synthetic_data crate")
+    parser.add_argument("output", help="calibration input to write, e.g. proof_generation/calibration.json")
+    parser.add_argument("--rows-per-tier", type=int, default=ROWS_PER_TIER,
+                        help=f"rows sampled from each tier (default {ROWS_PER_TIER})")
+    parser.add_argument("--batch-size", type=int,
+                        help="pad to a multiple of the batch size of a fixed-batch model export")
+    args = parser.parse_args(argv)
+    if args.rows_per_tier < 1 or (args.batch_size is not None and args.batch_size < 1):
+        parser.error("--rows-per-tier and --batch-size must be at least 1")
+
+    rows = calibration_rows(load_credit_features(args.data), args.rows_per_tier, args.batch_size)
+    scores = write_calibration_input(args.output, rows)
+    tiers = tier_of(scores)
+    summary = ", ".join(f"{tier} {int(np.count_nonzero(tiers == tier))}" for tier in TIERS)
+    print(f"Wrote {len(rows)} calibration rows to {args.output} ({summary})")
+
+
+if __name__ == "__main__":
+    main()
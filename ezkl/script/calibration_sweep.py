@@ -0,0 +1,161 @@
+"""Sweep ezkl calibration configurations in parallel and promote the cheapest valid one.
+
+Each configuration (scale, calibration target, lookup safety margin) gets
+its own gen-settings + calibrate-settings run in a work directory. The
+resulting settings.json is checked with the fixed-point estimate on every
+calibration row (and any --records):
+
+- every row must keep its tier;
+- every lookup input must fit in run_args.lookup_range.
+
+The valid configuration with the fewest logrows, then num_rows, then the
+smallest max score error, is copied to the output settings path. Every
+result goes to a JSON report.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from credit_model import read_records, score_batch, tier_of
+from fixed_point import FixedPointModel, input_features
+
+SWEEP_SCALES = (4, 7, 10, 13)
+SWEEP_TARGETS = ("resources", "accuracy")
+SWEEP_MARGINS = (1.0, 2.0)
+SWEEP_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def sweep_configs(scales=SWEEP_SCALES, targets=SWEEP_TARGETS, margins=SWEEP_MARGINS):
+    return [
+        {"name": f"s{scale}_{target}_m{margin:g}", "scale": scale, "target": target, "margin": margin}
+        for scale in scales for target in targets for margin in margins
+    ]
+
+
+def run_ezkl(ezkl, *args):
+    result = subprocess.run([ezkl, *map(str, args)], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ezkl {args[0]} failed: {(result.stderr or result.stdout).strip()}")
+
+
+def calibrate(config, model_path, data_path, work_dir, ezkl="ezkl"):
+    """Generate and calibrate settings for one configuration; return their path."""
+    config_dir = os.path.join(work_dir, config["name"])
+    os.makedirs(config_dir, exist_ok=True)
+    settings_path = os.path.join(config_dir, "settings.json")
+    run_ezkl(ezkl, "gen-settings", "-M", model_path, "-O", settings_path,
+             "--input-scale", config["scale"], "--param-scale", config["scale"])
+    run_ezkl(ezkl, "calibrate-settings", "-M", model_path, "-D", data_path, "-O", settings_path,
+             "--target", config["target"], "--lookup-safety-margin", config["margin"],
+             "--scales", config["scale"])
+    return settings_path
+
+
+def evaluate(model_path, settings_path, rows):
+    """Circuit size and estimated accuracy of one settings.json on the given rows."""
+    with open(settings_path) as f:
+        settings = json.load(f)
+    run_args = settings["run_args"]
+
+    model = FixedPointModel.from_settings(model_path, settings_path)
+    scores = model.scores(rows)
+    exact = score_batch(rows)
+    lookup_range = run_args.get("lookup_range")
+    lookups_fit = lookup_range is None or (
+        lookup_range[0] <= model.lookup_extent[0] and model.lookup_extent[1] <= lookup_range[1])
+    tier_mismatches = int(np.count_nonzero(tier_of(scores) != tier_of(exact)))
+    return {
+        "logrows": int(run_args["logrows"]),
+        "num_rows": int(settings.get("num_rows", 0)),
+        "input_scale": int(run_args["input_scale"]),
+        "param_scale": int(run_args["param_scale"]),
+        "max_error": float(np.abs(scores - exact).max()),
+        "tier_mismatches": tier_mismatches,
+        "lookup_extent": list(model.lookup_extent),
+        "lookup_range": lookup_range,
+        "valid": tier_mismatches == 0 and lookups_fit,
+    }
+
+
+def run_config(config, model_path, data_path, work_dir, rows, ezkl="ezkl"):
+    start = time.perf_counter()
+    result = dict(config)
+    try:
+        settings_path = calibrate(config, model_path, data_path, work_dir, ezkl)
+        result.update(evaluate(model_path, settings_path, rows), settings=settings_path)
+    except (RuntimeError, OSError, ValueError, KeyError) as e:
+        result.update(valid=False, error=str(e))
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def cheapest(results):
+    """The valid result with the smallest circuit, or None if none is valid."""
+    valid = [r for r in results if r["valid"]]
+    if not valid:
+        return None
+    return min(valid, key=lambda r: (r["logrows"], r["num_rows"], r["max_error"]))
+
+
+def sweep(model_path, data_path, work_dir, configs, rows, workers=SWEEP_WORKERS, ezkl="ezkl"):
+    # Each job mostly waits on its own ezkl process, so threads bound the process count
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda config: run_config(config, model_path, data_path, work_dir, rows, ezkl),
+                             configs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("model", help="credit_model.onnx")
+    parser.add_argument("data", help="calibration input, e.g. from calibration_data.py")
+    parser.add_argument("output", help="where to write the promoted settings.json")
+    parser.add_argument("--work-dir", help="per-configuration directories (default: <output dir>/calibration_sweep)")
+    parser.add_argument("--records", help="JSONL/CSV address records that must also keep their tiers")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(SWEEP_SCALES))
+    parser.add_argument("--targets", nargs="+", choices=SWEEP_TARGETS, default=list(SWEEP_TARGETS))
+    parser.add_argument("--margins", type=float, nargs="+", default=list(SWEEP_MARGINS))
+    parser.add_argument("--workers", type=int, default=SWEEP_WORKERS)
+    parser.add_argument("--ezkl", default="ezkl", help="ezkl binary (default: ezkl on PATH)")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    work_dir = args.work_dir or os.path.join(os.path.dirname(os.path.abspath(args.output)), "calibration_sweep")
+    rows = input_features(args.data)
+    if args.records:
+        records = np.asarray([row for _, row in read_records(args.records)], dtype=np.float64)
+        rows = np.concatenate([rows, records.reshape(-1, rows.shape[1])])
+
+    configs = sweep_configs(args.scales, args.targets, args.margins)
+    print(f"Calibrating {len(configs)} configurations with {args.workers} workers...")
+    results = sweep(args.model, args.data, work_dir, configs, rows, args.workers, args.ezkl)
+    best = cheapest(results)
+
+    for r in sorted(results, key=lambda r: r["name"]):
+        if "error" in r:
+            print(f"  {r['name']}: failed ({r['error']})")
+        else:
+            print(f"  {r['name']}: logrows {r['logrows']}, num_rows {r['num_rows']}, "
+                  f"max error {r['max_error']:.4f}, tier mismatches {r['tier_mismatches']}"
+                  f"{'' if r['valid'] else ' (invalid)'}")
+
+    report_path = os.path.join(work_dir, "sweep_report.json")
+    with open(report_path, "w") as f:
+        json.dump({"best": best and best["name"], "results": results}, f, indent=2)
+    print(f"Report written to {report_path}")
+
+    if best is None:
+        print("No configuration kept every row in its tier")
+        raise SystemExit(1)
+    shutil.copyfile(best["settings"], args.output)
+    print(f"Promoted {best['name']} (logrows {best['logrows']}) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Estimate the EZKL circuit cost of an ONNX model without running ezkl.
+
+The estimator walks the graph once and tracks three things per tensor: its
+shape, its float interval (features lie in [0, 1]), and its fixed-point
+scale, using the same rules as fixed_point.py. From these it counts:
+
+- linear assignments: one per multiply-accumulate of MatMul/Gemm and one
+  per element of every other op;
+- lookups: one per element of each op in fixed_point.LOOKUP_OPS (Relu and
+  Clip are linear clamps) and of each Div. The lookup table must
+  span every lookup input at its scale, i.e. the union of those integer
+  ranges;
+- rebases: one range-checked division per element whenever a product's
+  scale is divided back down to input_scale.
+
+The required logrows is the smallest k where 2^k holds both the rows (the
+assignments spread over num_inner_cols columns, plus blinding rows) and
+the lookup table. These are estimates: ezkl's layouter packs some ops more
+tightly. They are meant for ranking and rejecting model variants, not for
+replacing gen-settings.
+
+pk.key size and proving time are predicted from a history of measured runs
+(--record appends one). Both are fitted as log2(y) = a + b * logrows.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+from fixed_point import LOOKUP_OPS, constant_denominator
+
+# Unusable rows ezkl reserves at the bottom of every column for blinding
+BLINDING_ROWS = 6
+NUM_INNER_COLS = 2
+
+
+def interval_product(a, b):
+    """Elementwise interval product of (low, high) pairs, with broadcasting."""
+    corners = [a[0] * b[0], a[0] * b[1], a[1] * b[0], a[1] * b[1]]
+    return np.minimum.reduce(corners), np.maximum.reduce(corners)
+
+
+def interval_matmul(a, b):
+    low, high = interval_product((a[0][..., :, None], a[1][..., :, None]), (b[0][None, ...], b[1][None, ...]))
+    return low.sum(axis=-2), high.sum(axis=-2)
+
+
+def monotone(function, interval, increasing=True):
+    low, high = function(interval[0]), function(interval[1])
+    return (low, high) if increasing else (high, low)
+
+
+class CostEstimator:
+    """Shape, interval and scale propagation over one ONNX graph."""
+
+    def __init__(self, model_path, input_scale, param_scale, scale_rebase_multiplier=1,
+                 num_inner_cols=NUM_INNER_COLS):
+        from fixed_point import FixedPointModel
+
+        # Reuse the fixed-point estimate's graph loading and scale rules
+        self.graph = FixedPointModel(model_path, input_scale, param_scale, scale_rebase_multiplier)
+        self.num_inner_cols = num_inner_cols
+
+    def estimate(self, input_shape):
+        """Return the cost estimate for a graph input of the given shape."""
+        g = self.graph
+        ones = np.ones(input_shape)
+        tensors = {g.input_name: ((0.0 * ones, ones), g.input_scale)}
+        counts = {"assignments": 0, "lookups": 0, "rebases": 0}
+        lookup_low, lookup_high = 0, 0
+        ops = []
+
+        for node in g.nodes:
+            if node.op_type == "Constant":
+                continue
+            (low, high), scale, assignments = self.apply(node, tensors)
+            size = int(np.size(low))
+            indexed = self.lookup_input(node)
+            lookups = size if indexed else 0
+            if lookups:
+                # The table is indexed by the op's quantized input
+                (in_low, in_high), in_scale = tensors[indexed]
+                lookup_low = min(lookup_low, math.floor(float(np.min(in_low)) * 2 ** in_scale))
+                lookup_high = max(lookup_high, math.ceil(float(np.max(in_high)) * 2 ** in_scale))
+            rebases = 0
+            if scale > g.input_scale * g.scale_rebase_multiplier:
+                scale, rebases = g.input_scale, size
+            tensors[node.output[0]] = ((low, high), scale)
+            counts["assignments"] += assignments
+            counts["lookups"] += lookups
+            counts["rebases"] += rebases
+            ops.append({"op": node.op_type, "shape": list(np.shape(low)), "scale": scale,
+                        "assignments": assignments, "lookups": lookups, "rebases": rebases})
+
+        rows = math.ceil((counts["assignments"] + counts["lookups"] + counts["rebases"]) / self.num_inner_cols)
+        table_rows = lookup_high - lookup_low + 1 if counts["lookups"] else 0
+        logrows = max(1, math.ceil(math.log2(max(rows, table_rows) + BLINDING_ROWS)))
+        (low, high), output_scale = tensors[g.output_name]
+        return {
+            "input_shape": list(input_shape),
+            "input_scale": g.input_scale,
+            "param_scale": g.param_scale,
+            **counts,
+            "rows": rows,
+            "lookup_range": [lookup_low, lookup_high],
+            "logrows": logrows,
+            "output_scale": output_scale,
+            "output_interval": [float(np.min(low)), float(np.max(high))],
+            "ops": ops,
+        }
+
+    def lookup_input(self, node):
+        """Name of the tensor a node looks up, or None for a linear node."""
+        if node.op_type in LOOKUP_OPS:
+            return node.input[0]
+        if node.op_type == "Div":
+            # A constant denominator looks up the numerator; a variable one goes through a reciprocal lookup
+            return node.input[0] if node.input[1] in self.graph.constants else node.input[1]
+        return None
+
+    def operand(self, tensors, name):
+        if name in tensors:
+            return tensors[name]
+        value = self.graph.constants[name]
+        return (value, value), self.graph.param_scale
+
+    def apply(self, node, tensors):
+        """Return (output interval, output scale, linear assignments) for one node."""
+        op = node.op_type
+        if op in ("MatMul", "Gemm"):
+            (a, a_scale), (b, b_scale) = self.operand(tensors, node.input[0]), self.operand(tensors, node.input[1])
+            attributes = {attr.name: attr for attr in node.attribute}
+            if "transA" in attributes and attributes["transA"].i:
+                a = (a[0].T, a[1].T)
+            if "transB" in attributes and attributes["transB"].i:
+                b = (b[0].T, b[1].T)
+            low, high = interval_matmul(a, b)
+            assignments = int(np.size(a[0]) * np.shape(b[0])[-1])
+            if op == "Gemm" and len(node.input) > 2:
+                bias = self.graph.constants[node.input[2]]
+                low, high = low + bias, high + bias
+                assignments += int(np.size(low))
+            return (low, high), a_scale + b_scale, assignments
+        if op in ("Mul", "Add", "Sub") or (op == "Div" and node.input[1] not in self.graph.constants):
+            (a, a_scale), (b, b_scale) = self.operand(tensors, node.input[0]), self.operand(tensors, node.input[1])
+            if op == "Mul":
+                result, scale = interval_product(a, b), a_scale + b_scale
+            elif op == "Add":
+                result, scale = (a[0] + b[0], a[1] + b[1]), max(a_scale, b_scale)
+            elif op == "Sub":
+                result, scale = (a[0] - b[1], a[1] - b[0]), max(a_scale, b_scale)
+            else:
+                if np.any((b[0] <= 0) & (b[1] >= 0)):
+                    raise ValueError(f"Denominator of {node.name} may be zero")
+                result, scale = interval_product(a, monotone(np.reciprocal, b, increasing=False)), a_scale + b_scale
+            return result, scale, int(np.size(result[0]))
+
+        (low, high), scale = tensors[node.input[0]]
+        if op == "Div":
+            denominator = constant_denominator(node, self.graph.constants)
+            result = interval_product((low, high), monotone(np.reciprocal, (denominator, denominator)))
+        elif op == "Neg":
+            result = (-high, -low)
+        elif op == "Relu":
+            result = (np.maximum(low, 0.0), np.maximum(high, 0.0))
+        elif op == "Clip":
+            names = list(node.input[1:3]) + ["", ""]
+            floor, ceiling = (self.graph.constants[name] if name else None for name in names[:2])
+            result = (np.clip(low, floor, ceiling), np.clip(high, floor, ceiling))
+        elif op == "Exp":
+            result = monotone(np.exp, (low, high))
+        elif op == "Reciprocal":
+            if np.any((low <= 0) & (high >= 0)):
+                raise ValueError(f"Input of {node.name} may be zero")
+            result = monotone(np.reciprocal, (low, high), increasing=False)
+        elif op == "Sigmoid":
+            result = monotone(lambda x: 1.0 / (1.0 + np.exp(-x)), (low, high))
+        elif op == "HardSigmoid":
+            attributes = {attr.name: attr.f for attr in node.attribute}
+            alpha, beta = attributes.get("alpha", 0.2), attributes.get("beta", 0.5)
+            result = monotone(lambda x: np.clip(alpha * x + beta, 0.0, 1.0), (low, high), increasing=alpha >= 0)
+        else:
+            raise ValueError(f"Unsupported op for cost estimation: {op}")
+        return result, scale, int(np.size(result[0]))
+
+
+def model_input_shape(model_path, batch_size=None):
+    """Shape of the model's first input, with a dynamic batch axis set to batch_size (default 1)."""
+    import onnx
+
+    model = onnx.load(model_path, load_external_data=False)
+    dims = model.graph.input[0].type.tensor_type.shape.dim
+    return [dim.dim_value or batch_size or 1 for dim in dims]
+
+
+def load_history(history_path):
+    if not history_path or not os.path.exists(history_path):
+        return []
+    with open(history_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def fit_log2(history, key):
+    """Fit log2(history[key]) = a + b * logrows; None without any measurements.
+
+    A single run, or runs that all share one logrows, can't give a slope,
+    so cost is assumed to double with every extra logrow.
+    """
+    points = [(run["logrows"], math.log2(run[key])) for run in history if run.get(key)]
+    if not points:
+        return None
+    x, y = np.array(points).T
+    if np.unique(x).size < 2:
+        return float(y.mean() - x.mean()), 1.0
+    slope, intercept = np.polyfit(x, y, 1)
+    return float(intercept), float(slope)
+
+
+def predict(history, logrows):
+    predictions = {}
+    for key in ("pk_bytes", "prove_seconds"):
+        fit = fit_log2(history, key)
+        predictions[key] = None if fit is None else 2.0 ** (fit[0] + fit[1] * logrows)
+    return predictions
+
+
+def record_run(history_path, run_dir, estimate, prove_seconds=None):
+    """Append the measured logrows, pk.key size and proving time of run_dir to the history."""
+    with open(os.path.join(run_dir, "settings.json")) as f:
+        logrows = int(json.load(f)["run_args"]["logrows"])
+    run = {
+        "logrows": logrows,
+        "estimated_logrows": estimate["logrows"],
+        "rows": estimate["rows"],
+        "lookups": estimate["lookups"],
+        "pk_bytes": os.path.getsize(os.path.join(run_dir, "pk.key")),
+        "prove_seconds": prove_seconds,
+    }
+    with open(history_path, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    return run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("model", help="ONNX model to estimate, e.g. proof_generation/credit_model.onnx")
+    parser.add_argument("--settings", help="take the scales from an existing settings.json")
+    parser.add_argument("--input-scale", type=int, default=7)
+    parser.add_argument("--param-scale", type=int, default=7)
+    parser.add_argument("--scale-rebase-multiplier", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, help="rows per proof for a dynamic batch axis (default 1)")
+    parser.add_argument("--num-inner-cols", type=int, default=NUM_INNER_COLS)
+    parser.add_argument("--history", help="JSONL of measured runs used to predict pk.key size and proving time")
+    parser.add_argument("--record", metavar="RUN_DIR",
+                        help="append the settings.json and pk.key measured in RUN_DIR to --history")
+    parser.add_argument("--prove-seconds", type=float, help="measured proving time to store with --record")
+    parser.add_argument("--max-logrows", type=int, help="exit with status 1 if the estimate exceeds this")
+    parser.add_argument("--verbose", action="store_true", help="include the per-op breakdown")
+    args = parser.parse_args(argv)
+    if args.record and not args.history:
+        parser.error("--record requires --history")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    if args.settings:
+        from fixed_point import load_settings
+        settings = load_settings(args.settings)
+        args.input_scale, args.param_scale = settings["input_scale"], settings["param_scale"]
+        args.scale_rebase_multiplier = settings["scale_rebase_multiplier"]
+
+    estimator = CostEstimator(args.model, args.input_scale, args.param_scale,
+                              args.scale_rebase_multiplier, args.num_inner_cols)
+    estimate = estimator.estimate(model_input_shape(args.model, args.batch_size))
+    if args.record:
+        record_run(args.history, args.record, estimate, args.prove_seconds)
+    estimate["predicted"] = predict(load_history(args.history), estimate["logrows"])
+    if not args.verbose:
+        del estimate["ops"]
+    print(json.dumps(estimate, indent=2))
+
+    if args.max_logrows is not None and estimate["logrows"] > args.max_logrows:
+        print(f"Estimated logrows {estimate['logrows']} exceeds {args.max_logrows}", file=sys.stderr)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
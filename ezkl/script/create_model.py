@@ -1,138 +1,411 @@
+import argparse
+import contextlib
 import json
+import multiprocessing
 import numpy as np
-import torch
-import torch.nn as nn
-from torch.onnx import export
 import time
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor
 
-# Get and validate command line arguments
-if len(sys.argv) < 5:
+from credit_model import (
+    COLUMNAR_FORMATS, EXPORTERS, FSYNC_GROUP_SIZE, HEADS, LAYOUTS, MODEL_WEIGHTS, NUM_FEATURES,
+    WRITE_CHUNK_SIZE, WRITER_THREADS, ArtifactWriter, GroupCommit, address_dir, drop_duplicate_addresses,
+    export_onnx, materialize_inputs, open_layout, read_records, score_batch, tier_of, validate_features, write_batched_ezkl_inputs,
+    write_columnar_scores, write_ezkl_inputs,
+)
+
+# Duplicate records named individually before the rest are only counted
+MAX_DUPLICATES_SHOWN = 10
+
+
+def export_model(model_path, features, export_options=None):
+    """Export the model with export_onnx, report the export and return its SHA-256."""
+    print(f"Generating model file: {model_path}")
+    manifest, reused = export_onnx(model_path, features, **(export_options or {}))
+    if reused:
+        print(f"Reusing cached model export {model_path} (key {manifest['cache_key'][:12]})")
+    if "graph_nodes" in manifest:
+        print(f"Graph nodes: {manifest['graph_nodes']}")
+    print(f"Model SHA-256: {manifest['model_sha256']}")
+    return manifest["model_sha256"]
+
+
+def run_single(output_dir, address, features, generate_model, export_options=None, write_options=None):
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Score with the head that will be exported so the inputs match the circuit
+    head = (export_options or {}).get("head", "sigmoid")
+    score = float(score_batch([features], head)[0])
+    tier = str(tier_of(score))
+
+    print(f"Address: {address}")
+    print(f"Features: {features}")
+    print(f"Calculated score: {score:.4f}")
+    print(f"Credit tier: {tier}")
+    print(f"Threshold for favorable rate: 0.5")
+    print(f"Qualifies for favorable rate (100% collateral): {score > 0.5}")
+
+    # Export to ONNX if requested
+    model_path = os.path.join(output_dir, "credit_model.onnx")
+    model_sha256 = None
+    if generate_model:
+        model_sha256 = export_model(model_path, features, export_options)
+    else:
+        print("Skipping model generation as per flag")
+
+    print(f"Scaled score (0-1000): {int(score * 1000)}")
+
+    write_ezkl_inputs(output_dir, address, features, score, model_sha256=model_sha256, **(write_options or {}))
+
+    if generate_model:
+        print(f"Model converted to ONNX and input prepared for EZKL in {output_dir}")
+    else:
+        print(f"Input prepared for EZKL in {output_dir}")
+    return score
+
+
+def is_complete(artifact_dir):
+    # metadata.json is renamed into place last, so it marks a finished directory
+    return os.path.exists(os.path.join(artifact_dir, "metadata.json"))
+
+
+def write_address_chunk(output_dir, chunk, scores, timestamp, model_sha256, write_options, resume=False,
+                        layout="flat"):
+    for (address, row), score in zip(chunk, scores):
+        path = address_dir(output_dir, address, layout)
+        if resume and is_complete(path):
+            continue
+        write_ezkl_inputs(path, address, row, score, timestamp, model_sha256, **write_options)
+
+
+def write_chunks(output_dir, records, first_index, chunk_size, head, batch_size, timestamp, model_sha256,
+                 write_options, writers=0, resume=False, layout="flat"):
+    """Score records chunk by chunk, write their artifacts and return the scores.
+
+    first_index is the number of the first chunk, so batch_<k> directories get
+    the same names whichever process writes them. A GroupCommit in
+    write_options is committed before returning.
+    """
+    features = np.asarray([row for _, row in records], dtype=np.float32)
+    chunk_scores = []
+    padding_row = [0.0] * NUM_FEATURES
+    padding_score = score_batch([padding_row], head)[0]
+    # Score chunk by chunk while writer threads drain the previous chunks to disk
+    with ArtifactWriter(writers) as writer:
+        for index, begin in enumerate(range(0, len(records), chunk_size), first_index):
+            chunk = records[begin:begin + chunk_size]
+            scores = score_batch(features[begin:begin + chunk_size], head)
+            chunk_scores.append(scores)
+            if batch_size:
+                # One input per fixed-size batch, the last one padded with all-zero rows
+                padding = batch_size - len(chunk)
+                rows = [row for _, row in chunk] + [padding_row] * padding
+                batch_dir = os.path.join(output_dir, f"batch_{index:05d}")
+                if resume and is_complete(batch_dir):
+                    continue
+                writer.submit(write_batched_ezkl_inputs, batch_dir, [address for address, _ in chunk], rows,
+                              list(scores) + [padding_score] * padding, timestamp, model_sha256,
+                              **write_options)
+            else:
+                writer.submit(write_address_chunk, output_dir, chunk, scores, timestamp, model_sha256,
+                              write_options, resume, layout)
+    if isinstance(write_options.get("fsync"), GroupCommit):
+        write_options["fsync"].commit()
+    return np.concatenate(chunk_scores)
+
+
+def write_chunks_in_processes(workers, output_dir, records, chunk_size, *args):
+    """Split records into contiguous runs of whole chunks, one per worker process.
+
+    Each worker scores and writes its own run; the scores come back in input
+    order, so the output is the same as from a single process.
+    """
+    chunk_count = -(-len(records) // chunk_size)
+    parts = np.array_split(np.arange(chunk_count), min(workers, chunk_count))
+    # spawn: the parent may have imported torch for the export, which does not survive fork
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(parts), mp_context=context) as pool:
+        futures = [
+            pool.submit(write_chunks, output_dir, records[part[0] * chunk_size:(part[-1] + 1) * chunk_size],
+                        int(part[0]), chunk_size, *args)
+            for part in parts
+        ]
+        return np.concatenate([future.result() for future in futures])
+
+
+def run_batch(records_path, output_dir, generate_model, export_options=None, output_format="dirs",
+              write_options=None, writers=0, resume=False, layout=None, workers=1):
+    start = time.time()
+    try:
+        records = read_records(records_path)
+        layout = open_layout(output_dir, layout)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if not records:
+        print("Error: No records found in batch input")
+        sys.exit(1)
+    # A repeated address would write its directory twice, possibly from two writers at once
+    records, duplicates = drop_duplicate_addresses(records)
+    for number, address, first in duplicates[:MAX_DUPLICATES_SHOWN]:
+        print(f"Skipping record {number}: {address} repeats record {first}")
+    if len(duplicates) > MAX_DUPLICATES_SHOWN:
+        print(f"Skipping {len(duplicates) - MAX_DUPLICATES_SHOWN} more duplicate records")
+
+    os.makedirs(output_dir, exist_ok=True)
+    addresses = [address for address, _ in records]
+    write_options = write_options or {}
+
+    head = (export_options or {}).get("head", "sigmoid")
+    batch_size = (export_options or {}).get("batch_size")
+
+    model_sha256 = None
+    if generate_model:
+        model_path = os.path.join(output_dir, "credit_model.onnx")
+        model_sha256 = export_model(model_path, records[0][1], export_options)
+
+    timestamp = int(time.time())
+    if output_format in COLUMNAR_FORMATS:
+        # One scores file for the whole run; per-address inputs come later from --materialize
+        scores = score_batch(np.asarray([row for _, row in records], dtype=np.float32), head)
+        scores_path = os.path.join(output_dir, f"scores.{output_format}")
+        write_columnar_scores(scores_path, addresses, [row for _, row in records], scores, timestamp, model_sha256)
+        print(f"Scores written to {scores_path}")
+    else:
+        chunk_size = batch_size or WRITE_CHUNK_SIZE
+        options = (head, batch_size, timestamp, model_sha256, write_options, writers, resume, layout)
+        if workers > 1:
+            scores = write_chunks_in_processes(workers, output_dir, records, chunk_size, *options)
+        else:
+            scores = write_chunks(output_dir, records, 0, chunk_size, *options)
+    tiers = tier_of(scores)
+
+    processes = f" with {workers} worker processes" if workers > 1 else ""
+    skipped = f" ({len(duplicates)} duplicates skipped)" if duplicates else ""
+    print(f"Scored {len(addresses)} addresses in {time.time() - start:.2f}s{processes}{skipped}")
+    for tier in ("LOW", "MEDIUM", "HIGH"):
+        print(f"  {tier}: {int(np.count_nonzero(tiers == tier))}")
+    print(f"  Qualify for favorable rate: {int(np.count_nonzero(scores > 0.5))}")
+    print(f"Inputs prepared for EZKL in {output_dir}")
+
+
+def run_materialize(scores_path, output_dir, addresses, layout=None):
+    try:
+        written = materialize_inputs(scores_path, output_dir, addresses or None, layout)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"Materialized inputs for {len(written)} addresses in {output_dir}")
+
+
+def score_response(score):
+    score = float(score)
+    return {
+        "ok": True,
+        "score": score,
+        "scaled_score": int(score * 1000),
+        "tier": str(tier_of(score)),
+        "eligible": score > 0.5
+    }
+
+
+def handle_request(request, export_options=None):
+    op = request.get("op")
+    if op == "ping":
+        return {"ok": True}
+    if op == "score":
+        features = validate_features(request.get("features"))
+        head = (export_options or {}).get("head", "sigmoid")
+        return score_response(score_batch([features], head)[0])
+    if op == "export":
+        features = validate_features(request.get("features"))
+        score = run_single(
+            str(request["output_dir"]),
+            str(request["address"]),
+            features,
+            bool(request.get("generate_model", False)),
+            export_options
+        )
+        return score_response(score)
+    raise ValueError(f"Unknown op: {op!r}")
+
+
+def serve(requests=sys.stdin, responses=sys.stdout, export_options=None):
+    """Answer line-delimited JSON requests until "shutdown" or end of input.
+
+    Requests are {"op": "ping" | "score" | "export" | "shutdown", ...}; every
+    request gets exactly one JSON response line. Progress output goes to
+    stderr so stdout only carries responses.
+    """
+    for line in requests:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            if request.get("op") == "shutdown":
+                responses.write(json.dumps({"ok": True}) + "\n")
+                responses.flush()
+                break
+            with contextlib.redirect_stdout(sys.stderr):
+                response = handle_request(request, export_options)
+        except Exception as e:
+            # Any failure, e.g. a torch or onnx error during export, fails only this
+            # request; the worker stays up for the next one
+            response = {"ok": False, "error": str(e) or type(e).__name__}
+        responses.write(json.dumps(response) + "\n")
+        responses.flush()
+
+
+def write_head_report(report_path):
+    from heads import head_report
+
+    report = head_report(MODEL_WEIGHTS)
+    print(f"Head accuracy against the exact model over {report['grid_points']} grid points:")
+    print(f"  {'head':<14}{'max error':>12}{'mean error':>12}{'tier flips':>12}{'eligibility':>13}")
+    for head, stats in report["heads"].items():
+        print(f"  {head:<14}{stats['max_abs_error']:>12.5f}{stats['mean_abs_error']:>12.5f}"
+              f"{stats['tier_flips']:>12}{stats['eligibility_flips']:>13}")
+
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {report_path}")
+
+
+def print_usage():
     print("Usage: python3 ./script/create_model.py <output_dir> <address> <features> <generate_model_flag>")
+    print("   or: python3 ./script/create_model.py --batch <records.jsonl|records.csv|-> <output_dir> [--generate-model]")
+    print("   or: python3 ./script/create_model.py --materialize <scores.npz|scores.jsonl> <output_dir> [address ...]")
+    print("   or: python3 ./script/create_model.py --serve")
+    print("   or: python3 ./script/create_model.py --head-report <report.json>")
     print("where generate_model_flag is 1 to generate model or 0 to skip model generation")
-    sys.exit(1)
-
-output_dir = sys.argv[1]
-address = sys.argv[2]
-try:
-    features = json.loads(sys.argv[3])
-    generate_model = sys.argv[4] == "1"
-    if not isinstance(features, list) or len(features) != 4:
-        raise ValueError("Features must be a list of 4 numbers")
-except json.JSONDecodeError:
-    print("Error: Features must be a valid JSON array")
-    sys.exit(1)
-except ValueError as e:
-    print(f"Error: {e}")
-    sys.exit(1)
-
-os.makedirs(output_dir, exist_ok=True)
-
-# Define model that matches Rust implementation
-class CreditScoreModel(nn.Module):
-    def __init__(self):
-        super(CreditScoreModel, self).__init__()
-        # Match Rust weights [0.3, 0.2, 0.2, 0.3]
-        self.weights = nn.Parameter(torch.tensor([[0.3, 0.2, 0.2, 0.3]]).float())
-        
-    def forward(self, x):
-        # Linear combination of features
-        raw_score = torch.matmul(x, self.weights.t())
-        # Apply the same transformation as Rust: sigmoid(10.0 * x - 5.0)
-        # Fix the order of operations to match Rust
-        scaled_input = 10.0 * raw_score - 5.0
-        scaled_score = 1.0 / (1.0 + torch.exp(-scaled_input))
-        return scaled_score
-
-# Create and evaluate model
-model = CreditScoreModel()
-model.eval()
-
-# Calculate score
-input_tensor = torch.tensor([features], dtype=torch.float32)
-with torch.no_grad():
-    score = model(input_tensor).item()
-
-print(f"Address: {address}")
-print(f"Features: {features}")
-print(f"Calculated score: {score:.4f}")
-
-# Calculate tier based on score
-if score < 0.4:
-    tier = "LOW"
-elif score < 0.7:
-    tier = "MEDIUM"
-else:
-    tier = "HIGH"
-
-print(f"Credit tier: {tier}")
-print(f"Threshold for favorable rate: 0.5")
-print(f"Qualifies for favorable rate (100% collateral): {score > 0.5}")
-
-# Export to ONNX if requested
-model_path = os.path.join(output_dir, "credit_model.onnx")
-if generate_model:
-    print(f"Generating model file: {model_path}")
-    export(
-        model,
-        input_tensor,
-        model_path,
-        input_names=["input"],
-        output_names=["output"],
-        dynamic_axes={"input": {0: "batch_size"}, "output": {0: "batch_size"}}
-    )
-else:
-    print("Skipping model generation as per flag")
-
-# Scale score for EZKL (0-1000 range)
-scaled_score = int(score * 1000)
-print(f"Scaled score (0-1000): {scaled_score}")
-
-# Prepare EZKL input
-ezkl_input = {
-    "input_shapes": [[4]],
-    "input_data": [features],
-    "output_data": [[score]],
-    "public_output_idxs": [[0, 0]]
-}
-
-# Save EZKL input
-input_path = os.path.join(output_dir, "input.json")
-with open(input_path, "w") as f:
-    json.dump(ezkl_input, f, indent=2)
-
-# Save debug information
-debug_info = {
-    "address": address,
-    "features": features,
-    "original_score": score,
-    "scaled_score": scaled_score,
-    "credit_tier": tier,
-    "favorable_rate_eligible": score > 0.5,
-    "model_weights": model.weights.tolist()[0],
-    "timestamp": int(time.time())
-}
-
-debug_path = os.path.join(output_dir, "scaling_debug.json")
-with open(debug_path, "w") as f:
-    json.dump(debug_info, f, indent=2)
-
-# Save metadata
-metadata = {
-    "address": address,
-    "features": features,
-    "score": score,
-    "scaled_score": scaled_score,
-    "timestamp": int(time.time()),
-    "model_version": "1.0.0"
-}
-
-metadata_path = os.path.join(output_dir, "metadata.json")
-with open(metadata_path, "w") as f:
-    json.dump(metadata, f, indent=2)
-
-if generate_model:
-    print(f"Model converted to ONNX and input prepared for EZKL in {output_dir}")
-else:
-    print(f"Input prepared for EZKL in {output_dir}")
+    print("Options: --no-export-cache  re-export the model even if credit_model.manifest.json matches")
+    print("         --exporter torch|onnx  trace with torch.onnx.export (default) or build the graph with onnx.helper")
+    print("         --canonical  write a byte-stable, self-contained model file")
+    print("         --graph standard|folded  folded emits one Gemm plus Sigmoid (requires --exporter onnx)")
+    print("         --head sigmoid|hard_sigmoid|pwl_sigmoid|poly  activation head of the folded graph")
+    print("         --batch-size N  with --batch: export a model for exactly N rows and write one input per N addresses")
+    print("         --format dirs|npz|jsonl  with --batch: per-address directories (default) or one scores file")
+    print(f"         --writers N  with --batch: background writer threads (default {WRITER_THREADS} with --fsync file or group,")
+    print("                     otherwise 0, which writes inline)")
+    print("         --workers N  with --batch: split the records across N processes that score and write")
+    print("                     whole chunks each (default 1)")
+    print("         --compact  write JSON without indentation")
+    print("         --fsync none|file|group  make artifacts durable file by file, or in groups (default none)")
+    print(f"         --fsync-every N  with --fsync group: files per group commit (default {FSYNC_GROUP_SIZE})")
+    print("         --resume  with --batch: skip directories whose metadata.json is already in place")
+    print("         --layout flat|sharded  per-address directories under <output_dir>/ or <output_dir>/ab/cd/")
+    print("                     (default: the layout already recorded in <output_dir>, else flat)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("-h", "--help", action="store_true")
+    parser.add_argument("--batch", metavar="RECORDS")
+    parser.add_argument("--generate-model", action="store_true")
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--no-export-cache", action="store_true")
+    parser.add_argument("--exporter", choices=EXPORTERS, default="torch")
+    parser.add_argument("--canonical", action="store_true")
+    parser.add_argument("--graph", choices=("standard", "folded"), default="standard")
+    parser.add_argument("--head", choices=HEADS, default="sigmoid")
+    parser.add_argument("--head-report", metavar="REPORT_JSON")
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--format", choices=("dirs",) + COLUMNAR_FORMATS, default="dirs")
+    parser.add_argument("--materialize", metavar="SCORES")
+    parser.add_argument("--writers", type=int)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--compact", action="store_true")
+    parser.add_argument("--fsync", choices=("none", "file", "group"), default="none")
+    parser.add_argument("--fsync-every", type=int, default=FSYNC_GROUP_SIZE)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--layout", choices=LAYOUTS)
+    parser.add_argument("positional", nargs="*")
+    args = parser.parse_intermixed_args(argv)
+    export_options = {"use_cache": not args.no_export_cache, "exporter": args.exporter,
+                      "canonical": args.canonical, "graph": args.graph, "head": args.head,
+                      "batch_size": args.batch_size}
+    group_commit = GroupCommit(args.fsync_every) if args.fsync == "group" else None
+    write_options = {"indent": None if args.compact else 2, "fsync": group_commit or args.fsync == "file"}
+    if args.graph != "standard" and args.exporter != "onnx":
+        print(f"Error: --graph {args.graph} requires --exporter onnx")
+        sys.exit(1)
+    if args.batch_size is not None and (args.batch is None or args.batch_size < 1):
+        print("Error: --batch-size must be a positive number and needs --batch")
+        sys.exit(1)
+    if args.writers is None:
+        args.writers = WRITER_THREADS if args.fsync != "none" else 0
+    if args.fsync_every < 1:
+        print("Error: --fsync-every must be a positive number")
+        sys.exit(1)
+    if args.resume and args.batch is None:
+        print("Error: --resume needs --batch")
+        sys.exit(1)
+    if args.workers < 1 or (args.workers > 1 and (args.batch is None or args.format != "dirs")):
+        print("Error: --workers must be a positive number; more than 1 needs --batch with --format dirs")
+        sys.exit(1)
+    if args.writers < 0:
+        print("Error: --writers must be 0 or more")
+        sys.exit(1)
+    if args.format != "dirs" and (args.batch is None or args.batch_size is not None):
+        print(f"Error: --format {args.format} needs --batch and cannot be combined with --batch-size")
+        sys.exit(1)
+    if args.head != "sigmoid" and args.graph != "folded":
+        print(f"Error: --head {args.head} requires --exporter onnx --graph folded")
+        sys.exit(1)
+
+    if args.help:
+        print_usage()
+        return
+
+    if args.head_report is not None:
+        write_head_report(args.head_report)
+        return
+
+    if args.serve:
+        # Worker mode: keep the model loaded and answer JSON lines on stdin
+        serve(export_options=export_options)
+        return
+
+    if args.batch is not None:
+        # Batch mode: one interpreter scores and writes inputs for every record
+        if len(args.positional) != 1:
+            print_usage()
+            sys.exit(1)
+        run_batch(args.batch, args.positional[0], args.generate_model, export_options, args.format,
+                  write_options, args.writers, args.resume, args.layout, args.workers)
+        return
+
+    if args.materialize is not None:
+        # Write per-address inputs only for the addresses that go to the prover
+        if not args.positional:
+            print_usage()
+            sys.exit(1)
+        run_materialize(args.materialize, args.positional[0], args.positional[1:], args.layout)
+        return
+
+    # Get and validate command line arguments
+    if len(args.positional) < 4:
+        print_usage()
+        sys.exit(1)
+
+    output_dir, address = args.positional[0], args.positional[1]
+    try:
+        features = validate_features(json.loads(args.positional[2]))
+        generate_model = args.positional[3] == "1"
+    except json.JSONDecodeError:
+        print("Error: Features must be a valid JSON array")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    run_single(output_dir, address, features, generate_model, export_options, write_options)
+    if group_commit is not None:
+        group_commit.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,710 @@
+"""Importable credit scoring, ONNX export and EZKL input writers.
+
+create_model.py is the command-line wrapper around this module. Other
+Python code can import it to score in-process without a subprocess:
+
+    from credit_model import score_batch, tier_of
+    tiers = tier_of(score_batch(features))
+
+Scoring is pure NumPy; torch and onnx are imported only when exporting.
+"""
+import csv
+import hashlib
+import json
+import numpy as np
+import time
+import sys
+import os
+import queue
+import tempfile
+import threading
+
+from heads import HEADS, apply_head
+
+# Match Rust weights [0.3, 0.2, 0.2, 0.3]
+MODEL_WEIGHTS = [0.3, 0.2, 0.2, 0.3]
+MODEL_VERSION = "1.0.0"
+NUM_FEATURES = len(MODEL_WEIGHTS)
+ONNX_OPSET = 17
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WEIGHTS = np.asarray(MODEL_WEIGHTS, dtype=np.float32)
+
+_model = None
+
+
+def get_model():
+    # torch is only needed to export the model, so it is imported on first use
+    global _model
+    if _model is None:
+        from torch_model import CreditScoreModel
+        _model = CreditScoreModel(MODEL_WEIGHTS)
+        _model.eval()
+    return _model
+
+
+def score_batch(features, head="sigmoid"):
+    """Score an (N, 4) feature matrix and return N float32 scores.
+
+    Mirrors CreditScoreModel.forward op for op in float32 with NumPy, so
+    scoring never has to import torch. A non-default head scores with the
+    matching approximation from heads.py instead of the exact logistic.
+    """
+    features = np.asarray(features, dtype=np.float32).reshape(-1, NUM_FEATURES)
+    raw_score = features @ WEIGHTS
+    scaled_input = np.float32(10.0) * raw_score - np.float32(5.0)
+    if head != "sigmoid":
+        return apply_head(head, scaled_input, MODEL_WEIGHTS)
+    return np.float32(1.0) / (np.float32(1.0) + np.exp(-scaled_input))
+
+
+def tier_of(scores):
+    """Map scores to LOW (< 0.4), MEDIUM (< 0.7) or HIGH credit tiers."""
+    scores = np.asarray(scores)
+    return np.where(scores < 0.4, "LOW", np.where(scores < 0.7, "MEDIUM", "HIGH"))
+
+
+def address_to_filename(address):
+    # Same directory naming as address_to_filename in ezkl/src/utils.rs
+    while address.startswith("0x"):
+        address = address[2:]
+    return address
+
+
+# Per-address artifacts live in <root>/<address>/ (flat) or <root>/ab/cd/<address>/
+# (sharded), where abcd starts the SHA-256 of the lowercase address without 0x.
+# The root's layout file names its layout; a root without one is flat.
+LAYOUTS = ("flat", "sharded")
+LAYOUT_FILE = "layout"
+
+
+def read_layout(root):
+    try:
+        with open(os.path.join(root, LAYOUT_FILE)) as f:
+            layout = f.read().strip()
+    except FileNotFoundError:
+        return "flat"
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout {layout!r} in {os.path.join(root, LAYOUT_FILE)}")
+    return layout
+
+
+def write_layout(root, layout):
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, LAYOUT_FILE)
+    with open_temp(path) as f:
+        f.write(layout + "\n")
+    os.replace(f.name, path)
+
+
+def open_layout(root, layout=None):
+    """The layout of root, recording layout for a root that has none yet.
+
+    Raises ValueError if root already uses a different layout; migrate it
+    with migrate_layout.py first.
+    """
+    current = read_layout(root)
+    if layout is None or layout == current:
+        return current
+    if os.path.exists(os.path.join(root, LAYOUT_FILE)):
+        raise ValueError(f"{root} uses the {current} layout; run migrate_layout.py to switch it to {layout}")
+    write_layout(root, layout)
+    return layout
+
+
+def shard_dir(root, address, layout="flat"):
+    """The directory holding an address's entry: root itself, or its shard under root."""
+    if layout == "flat":
+        return root
+    digest = hashlib.sha256(address_to_filename(address).lower().encode()).hexdigest()
+    return os.path.join(root, digest[:2], digest[2:4])
+
+
+def address_dir(root, address, layout="flat"):
+    # Same path as address_dir in ezkl/src/utils.rs
+    return os.path.join(shard_dir(root, address, layout), address_to_filename(address))
+
+
+def validate_features(features):
+    if not isinstance(features, list) or len(features) != NUM_FEATURES:
+        raise ValueError(f"Features must be a list of {NUM_FEATURES} numbers")
+    for value in features:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Features must be a list of {NUM_FEATURES} numbers")
+    return features
+
+
+def validate_address(address):
+    # Addresses become directory names (without 0x) and the ASCII address column of .npz
+    # scores, so the name must stay inside the output root: no separators, no . or ..
+    name = address_to_filename(address)
+    if not address.isascii() or "/" in name or "\\" in name or name in ("", ".", ".."):
+        raise ValueError(f"Address must be ASCII and name a directory (not empty, . or .., "
+                         f"without path separators) once 0x is removed: {address!r}")
+    return address
+
+
+EXPORTERS = ("torch", "onnx")
+
+# Source file that defines the exported graph for each exporter
+EXPORTER_SOURCES = {"torch": "torch_model.py", "onnx": "onnx_graph.py"}
+
+
+def export_cache_key(exporter="torch", canonical=False, graph="standard", head="sigmoid", batch_size=None):
+    """Hash everything the exported graph depends on: weights, graph code, opset and toolchain."""
+    from importlib import metadata
+
+    with open(os.path.join(SCRIPT_DIR, EXPORTER_SOURCES[exporter]), "rb") as f:
+        graph_source = f.read()
+    inputs = {
+        "weights": MODEL_WEIGHTS,
+        "exporter": exporter,
+        "graph": graph,
+        "head": head,
+        "batch_size": batch_size,
+        "graph_sha256": hashlib.sha256(graph_source).hexdigest(),
+        "opset": ONNX_OPSET,
+        f"{exporter}_version": metadata.version(exporter),
+    }
+    if head != "sigmoid":
+        with open(os.path.join(SCRIPT_DIR, "heads.py"), "rb") as f:
+            inputs["heads_sha256"] = hashlib.sha256(f.read()).hexdigest()
+    if canonical:
+        with open(os.path.join(SCRIPT_DIR, "onnx_graph.py"), "rb") as f:
+            inputs["canonicalizer_sha256"] = hashlib.sha256(f.read()).hexdigest()
+        inputs["onnx_version"] = metadata.version("onnx")
+    key = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+    return key, inputs
+
+
+def manifest_path_for(model_path):
+    return os.path.splitext(model_path)[0] + ".manifest.json"
+
+
+def hash_model_files(model_path):
+    # torch may store initializers next to the graph in <model>.data
+    files = {}
+    for path in (model_path, model_path + ".data"):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                files[os.path.basename(path)] = hashlib.sha256(f.read()).hexdigest()
+    return files
+
+
+def load_cached_export(model_path, key):
+    """Return the manifest if model_path is an intact export for this cache key."""
+    try:
+        with open(manifest_path_for(model_path)) as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if manifest.get("cache_key") != key or not os.path.exists(model_path):
+        return None
+    if manifest.get("files") != hash_model_files(model_path):
+        return None
+    return manifest
+
+
+def export_onnx(model_path, sample_features, use_cache=True, exporter="torch", canonical=False,
+                graph="standard", head="sigmoid", batch_size=None):
+    """Export the model to ONNX, reusing an unchanged previous export.
+
+    exporter="torch" traces CreditScoreModel with torch.onnx.export;
+    exporter="onnx" writes the same graph from the weights with onnx.helper.
+    canonical=True rewrites the result into a byte-stable single file (see
+    onnx_graph.canonicalize) so identical models hash identically on any host.
+    graph="folded" emits a single Gemm plus Sigmoid instead of the traced
+    op sequence and is only available with the onnx exporter. head selects
+    a circuit-friendly replacement for that Sigmoid (see heads.py) and
+    needs the folded graph. batch_size fixes the leading axis to that many
+    rows instead of leaving it dynamic, so one proof covers a whole batch.
+    Returns (manifest, reused) where reused is True for a cache hit. For a
+    graph other than "standard" the manifest's graph_nodes compares its
+    nodes with the standard graph's.
+    """
+    if graph != "standard" and exporter != "onnx":
+        raise ValueError(f"The {graph} graph is built with onnx.helper; use exporter='onnx'")
+    if head != "sigmoid" and graph != "folded":
+        raise ValueError(f"The {head} head is only available on the folded graph")
+    key, inputs = export_cache_key(exporter, canonical, graph, head, batch_size)
+    if use_cache:
+        manifest = load_cached_export(model_path, key)
+        if manifest is not None:
+            return manifest, True
+
+    # Drop external data left by an earlier export so it is not hashed as part of this one
+    if os.path.exists(model_path + ".data"):
+        os.remove(model_path + ".data")
+
+    graph_nodes = None
+    if exporter == "onnx":
+        import onnx
+        from onnx_graph import build_credit_model, build_folded_credit_model, describe_nodes
+
+        if graph == "folded":
+            model = build_folded_credit_model(MODEL_WEIGHTS, ONNX_OPSET, head, batch_size)
+        else:
+            model = build_credit_model(MODEL_WEIGHTS, ONNX_OPSET, batch_size)
+        if graph != "standard":
+            before = describe_nodes(build_credit_model(MODEL_WEIGHTS, ONNX_OPSET))
+            graph_nodes = f"{before} -> {describe_nodes(model)}"
+        if not canonical:
+            onnx.save(model, model_path)
+    else:
+        import torch
+        from torch.onnx import export
+
+        sample = torch.tensor([sample_features] * (batch_size or 1), dtype=torch.float32)
+        dynamic_axes = None
+        if batch_size is None:
+            dynamic_axes = {"input": {0: "batch_size"}, "output": {0: "batch_size"}}
+        export(
+            get_model(),
+            sample,
+            model_path,
+            input_names=["input"],
+            output_names=["output"],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET
+        )
+        if canonical:
+            import onnx
+            model = onnx.load(model_path)
+            if os.path.exists(model_path + ".data"):
+                os.remove(model_path + ".data")
+
+    if canonical:
+        from onnx_graph import canonical_bytes
+        with open(model_path, "wb") as f:
+            f.write(canonical_bytes(model))
+
+    files = hash_model_files(model_path)
+    manifest = {
+        "cache_key": key,
+        "model_sha256": files[os.path.basename(model_path)],
+        "canonical": canonical,
+        "files": files,
+        "inputs": inputs,
+        "timestamp": int(time.time())
+    }
+    if graph_nodes is not None:
+        manifest["graph_nodes"] = graph_nodes
+    with open(manifest_path_for(model_path), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest, False
+
+
+# Read once at import, while no other thread can observe the temporary change
+UMASK = os.umask(0o022)
+os.umask(UMASK)
+
+
+def open_temp(path):
+    """Open a new, uniquely named <name>.<random>.tmp file next to path for writing.
+
+    Every write gets its own temporary file, so threads or processes writing
+    the same path never share one. The file gets the permissions a plain
+    open() would give it rather than NamedTemporaryFile's 0600.
+    """
+    directory, name = os.path.split(path)
+    f = tempfile.NamedTemporaryFile("w", dir=directory or ".", prefix=f"{name}.", suffix=".tmp", delete=False)
+    os.chmod(f.name, 0o666 & ~UMASK)
+    return f
+
+
+def fsync_path(path):
+    """fsync a file or directory by path."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Files per group commit: 85 addresses of input.json, scaling_debug.json and metadata.json
+FSYNC_GROUP_SIZE = 256
+
+
+class GroupCommit:
+    """Make written files durable in groups instead of one at a time.
+
+    write_json leaves each file under a temporary name and registers it here.
+    Every `every` files the group is fsynced, renamed into place in write
+    order and each touched directory (plus its parent, for new directories)
+    is fsynced once. After a crash a final name therefore always holds a
+    complete, durable file; the files of the last unfinished group are
+    either absent or left behind as *.tmp. Call commit() once the run is
+    done to flush the last group. Safe to share between writer threads.
+    """
+
+    def __init__(self, every=FSYNC_GROUP_SIZE):
+        self.every = every
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def __reduce__(self):
+        # A copy sent to a worker process starts an empty group of its own
+        return GroupCommit, (self.every,)
+
+    def add(self, tmp_path, path):
+        with self.lock:
+            self.pending.append((tmp_path, path))
+            if len(self.pending) >= self.every:
+                self._commit()
+
+    def commit(self):
+        with self.lock:
+            self._commit()
+
+    def _commit(self):
+        for tmp_path, _ in self.pending:
+            fsync_path(tmp_path)
+        directories = set()
+        for tmp_path, path in self.pending:
+            os.replace(tmp_path, path)
+            directories.add(os.path.dirname(os.path.abspath(path)))
+        for directory in sorted(directories | {os.path.dirname(d) for d in directories}):
+            fsync_path(directory)
+        self.pending.clear()
+
+
+def write_json(path, data, indent=2, fsync=False):
+    """Write data as JSON through a temporary file renamed into place.
+
+    Readers never see a truncated file under path, even if the writer dies
+    mid-write. indent=None writes compact JSON without spaces. fsync=True
+    makes the file and its directory entry durable before returning; a
+    GroupCommit defers both, and the rename, to the group's next commit.
+    """
+    group = fsync if isinstance(fsync, GroupCommit) else None
+    with open_temp(path) as f:
+        tmp_path = f.name
+        if indent is None:
+            json.dump(data, f, separators=(",", ":"))
+        else:
+            json.dump(data, f, indent=indent)
+        if fsync and group is None:
+            f.flush()
+            os.fsync(f.fileno())
+    if group is not None:
+        group.add(tmp_path, path)
+        return
+    os.replace(tmp_path, path)
+    if fsync:
+        fsync_path(os.path.dirname(os.path.abspath(path)))
+
+
+def write_ezkl_inputs(output_dir, address, features, score, timestamp=None, model_sha256=None,
+                      indent=2, fsync=False):
+    """Write input.json, scaling_debug.json and metadata.json for one address.
+
+    model_sha256 identifies the exported model the inputs were prepared for
+    and is recorded in metadata.json when given. indent and fsync are passed
+    to write_json for every file. metadata.json is written last, so its
+    presence means the address is complete.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    score = float(score)
+    if timestamp is None:
+        timestamp = int(time.time())
+
+    # Scale score for EZKL (0-1000 range)
+    scaled_score = int(score * 1000)
+    tier = str(tier_of(score))
+
+    # Prepare EZKL input
+    ezkl_input = {
+        "input_shapes": [[NUM_FEATURES]],
+        "input_data": [features],
+        "output_data": [[score]],
+        "public_output_idxs": [[0, 0]]
+    }
+
+    input_path = os.path.join(output_dir, "input.json")
+    write_json(input_path, ezkl_input, indent, fsync)
+
+    # Save debug information
+    debug_info = {
+        "address": address,
+        "features": features,
+        "original_score": score,
+        "scaled_score": scaled_score,
+        "credit_tier": tier,
+        "favorable_rate_eligible": score > 0.5,
+        "model_weights": WEIGHTS.tolist(),
+        "timestamp": timestamp
+    }
+
+    debug_path = os.path.join(output_dir, "scaling_debug.json")
+    write_json(debug_path, debug_info, indent, fsync)
+
+    # Save metadata
+    metadata = {
+        "address": address,
+        "features": features,
+        "score": score,
+        "scaled_score": scaled_score,
+        "timestamp": timestamp,
+        "model_version": MODEL_VERSION
+    }
+    if model_sha256 is not None:
+        metadata["model_sha256"] = model_sha256
+
+    metadata_path = os.path.join(output_dir, "metadata.json")
+    write_json(metadata_path, metadata, indent, fsync)
+
+
+def write_batched_ezkl_inputs(output_dir, addresses, rows, scores, timestamp=None, model_sha256=None,
+                              indent=2, fsync=False):
+    """Write one input.json and metadata.json covering a fixed-size batch.
+
+    rows and scores hold exactly batch_size entries; when there are fewer
+    addresses than rows the trailing rows are padding and are left out of
+    the per-address metadata.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    scores = [float(score) for score in scores]
+    if timestamp is None:
+        timestamp = int(time.time())
+    batch_size = len(rows)
+    count = len(addresses)
+
+    # EZKL takes each input flattened, with its shape alongside
+    ezkl_input = {
+        "input_shapes": [[batch_size, NUM_FEATURES]],
+        "input_data": [[value for row in rows for value in row]],
+        "output_data": [scores],
+        "public_output_idxs": [[0, i] for i in range(batch_size)]
+    }
+
+    input_path = os.path.join(output_dir, "input.json")
+    write_json(input_path, ezkl_input, indent, fsync)
+
+    metadata = {
+        "addresses": list(addresses),
+        "features": [list(row) for row in rows[:count]],
+        "scores": scores[:count],
+        "scaled_scores": [int(score * 1000) for score in scores[:count]],
+        "credit_tiers": tier_of(scores[:count]).tolist(),
+        "favorable_rate_eligible": [score > 0.5 for score in scores[:count]],
+        "batch_size": batch_size,
+        "padding": batch_size - count,
+        "timestamp": timestamp,
+        "model_version": MODEL_VERSION
+    }
+    if model_sha256 is not None:
+        metadata["model_sha256"] = model_sha256
+
+    metadata_path = os.path.join(output_dir, "metadata.json")
+    write_json(metadata_path, metadata, indent, fsync)
+
+
+# Writer threads overlap fsync waits with scoring. Without fsync the writes are
+# mostly JSON encoding under the GIL, so batch mode then writes inline by default
+WRITER_THREADS = 4
+WRITER_QUEUE_SIZE = 16
+WRITE_CHUNK_SIZE = 256
+
+
+class ArtifactWriter:
+    """Write artifacts on background threads fed by a bounded queue.
+
+    submit() blocks while max_pending tasks are waiting, so a fast producer
+    cannot run ahead of the disk without bound. The first exception raised by
+    a task is re-raised by the next submit() or by close(). With threads=0
+    tasks run inline in submit().
+    """
+
+    def __init__(self, threads=WRITER_THREADS, max_pending=WRITER_QUEUE_SIZE):
+        self.queue = queue.Queue(max_pending)
+        self.errors = []
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(threads)]
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self):
+        while True:
+            task = self.queue.get()
+            if task is None:
+                return
+            function, args, kwargs = task
+            try:
+                function(*args, **kwargs)
+            except Exception as e:
+                self.errors.append(e)
+
+    def submit(self, function, *args, **kwargs):
+        if self.errors:
+            raise self.errors[0]
+        if not self.threads:
+            function(*args, **kwargs)
+            return
+        self.queue.put((function, args, kwargs))
+
+    def close(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        # Already failing: stop the threads but keep the original exception
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def read_records(path):
+    """Read (address, features) records from a JSONL or CSV file, or stdin for "-".
+
+    JSONL lines look like {"address": "0x..", "features": [f1, f2, f3, f4]}.
+    CSV rows are address,f1,f2,f3,f4 with an optional header row.
+    """
+    stream = sys.stdin if path == "-" else open(path, newline="")
+    try:
+        lines = [line for line in stream if line.strip()]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    records = []
+    if lines and lines[0].lstrip().startswith("{"):
+        for line_no, line in enumerate(lines, start=1):
+            try:
+                record = json.loads(line)
+                records.append((validate_address(str(record["address"])), validate_features(record["features"])))
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Invalid record on line {line_no}: {e}")
+        return records
+
+    for line_no, row in enumerate(csv.reader(lines), start=1):
+        if len(row) != NUM_FEATURES + 1:
+            raise ValueError(f"Invalid record on line {line_no}: expected address and {NUM_FEATURES} features")
+        try:
+            features = [float(value) for value in row[1:]]
+        except ValueError:
+            if line_no == 1:
+                continue  # header row
+            raise ValueError(f"Invalid record on line {line_no}: features must be numbers")
+        try:
+            records.append((validate_address(row[0].strip()), features))
+        except ValueError as e:
+            raise ValueError(f"Invalid record on line {line_no}: {e}")
+    return records
+
+
+def drop_duplicate_addresses(records):
+    """Keep the first record of every address; return (records, duplicates).
+
+    Addresses are compared without 0x and checksum casing, like their
+    directories and shards, so no two kept records write one directory.
+    duplicates lists (record number, address, first record number), numbered
+    from 1, for every record dropped.
+    """
+    first_numbers = {}
+    unique, duplicates = [], []
+    for number, (address, features) in enumerate(records, start=1):
+        key = address_to_filename(address).lower()
+        if key in first_numbers:
+            duplicates.append((number, address, first_numbers[key]))
+            continue
+        first_numbers[key] = number
+        unique.append((address, features))
+    return unique, duplicates
+
+
+COLUMNAR_FORMATS = ("npz", "jsonl")
+
+
+def write_columnar_scores(path, addresses, features, scores, timestamp=None, model_sha256=None):
+    """Write one scores file for a whole batch instead of three files per address.
+
+    A .npz file holds the columns address, features, score, scaled_score,
+    tier and eligible as arrays. A .jsonl file holds one compact record per
+    address with the same fields. Either can later be turned into per-address
+    EZKL inputs with materialize_inputs.
+    """
+    # Features stay float64 so materialized input.json files match direct writes
+    features = np.asarray(features, dtype=np.float64).reshape(-1, NUM_FEATURES)
+    scores = np.asarray(scores, dtype=np.float32)
+    if timestamp is None:
+        timestamp = int(time.time())
+    columns = {
+        "address": np.asarray(addresses, dtype=str),
+        "features": features,
+        "score": scores,
+        "scaled_score": (scores * 1000).astype(np.int64),
+        "tier": tier_of(scores),
+        "eligible": scores > 0.5,
+    }
+
+    if path.endswith(".npz"):
+        # read_records only accepts ASCII addresses; bytes take a quarter of the space
+        # of numpy's UTF-32 strings
+        columns["address"] = np.char.encode(columns["address"], "ascii")
+        np.savez(path, **columns, timestamp=np.int64(timestamp), model_version=MODEL_VERSION,
+                 model_sha256=model_sha256 or "")
+        return
+    with open(path, "w") as f:
+        for i in range(len(scores)):
+            record = {name: column[i].tolist() for name, column in columns.items()}
+            record.update(timestamp=timestamp, model_version=MODEL_VERSION)
+            if model_sha256 is not None:
+                record["model_sha256"] = model_sha256
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+def read_columnar_scores(path):
+    """Read a file written by write_columnar_scores as a dict of columns."""
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            columns = {name: data[name] for name in data.files}
+        columns["address"] = np.char.decode(columns["address"], "ascii")
+        columns["timestamp"] = int(columns["timestamp"])
+        columns["model_sha256"] = str(columns["model_sha256"]) or None
+        return columns
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return {
+        "address": np.asarray([r["address"] for r in records], dtype=str),
+        "features": np.asarray([r["features"] for r in records], dtype=np.float64).reshape(-1, NUM_FEATURES),
+        "score": np.asarray([r["score"] for r in records], dtype=np.float32),
+        "timestamp": records[0]["timestamp"] if records else None,
+        "model_sha256": records[0].get("model_sha256") if records else None,
+    }
+
+
+def materialize_inputs(scores_path, output_dir, addresses=None, layout=None):
+    """Write per-address EZKL inputs from a scores file, for addresses headed to the prover.
+
+    addresses defaults to every address in the file. layout is passed to
+    open_layout for output_dir. Returns the directories written.
+    """
+    layout = open_layout(output_dir, layout)
+    columns = read_columnar_scores(scores_path)
+    index = {address: i for i, address in enumerate(columns["address"].tolist())}
+    if addresses is None:
+        addresses = list(index)
+    missing = [address for address in addresses if address not in index]
+    if missing:
+        raise ValueError(f"Addresses not found in {scores_path}: {', '.join(missing)}")
+
+    written = []
+    for address in addresses:
+        i = index[address]
+        path = address_dir(output_dir, address, layout)
+        write_ezkl_inputs(path, address, columns["features"][i].tolist(), columns["score"][i],
+                          columns["timestamp"], columns["model_sha256"])
+        written.append(path)
+    return written
@@ -0,0 +1,289 @@
+"""Estimate EZKL's fixed-point forward pass of credit_model.onnx in NumPy.
+
+The estimator walks the ONNX graph and applies its model of EZKL's
+quantization rules to a whole batch at once:
+
+- inputs are quantized at input_scale and constants at param_scale, as
+  round(x * 2^scale) with halves rounded away from zero;
+- MatMul, Gemm and Mul add their operands' scales; Add and Sub first lift
+  the lower-scale operand to the higher scale;
+- an op whose output scale exceeds input_scale * scale_rebase_multiplier is
+  divided back down to input_scale (rounded), like EZKL's RebaseScale;
+- non-linear ops (Exp, Sigmoid, Reciprocal, ...) are lookups that keep
+  their input scale: round(f(x / 2^s) * 2^s);
+- a Div by a constant is a lookup of round(x / d) on the numerator, at the
+  numerator's scale, and a Div by a variable is a Reciprocal lookup times
+  the numerator.
+
+Scores and tiers can then be pre-screened for millions of addresses without
+running ezkl gen-witness. This is an estimate, not a witness generator: the
+rules have not been checked bit for bit against a witness from ezkl
+gen-witness, so use --witness to compare it with a real witness.json before
+trusting it for a new model or new scales.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+# Ops evaluated through a lookup table. Relu and Clip are linear clamps, and Div
+# is a lookup on its numerator (constant denominator) or a Reciprocal lookup
+# times the numerator (variable denominator). circuit_cost.py counts lookups from
+# this same list.
+LOOKUP_OPS = ("Exp", "Reciprocal", "Sigmoid", "HardSigmoid")
+
+# Scalar field of BN254, which EZKL's Halo2 circuits work over
+BN254_MODULUS = 21888242871839275222246405745257275088548364400416034343698204186575808495617
+
+
+def round_half_away(x):
+    # Rust's f64::round; numpy.round would round halves to even
+    return np.sign(x) * np.floor(np.abs(x) + 0.5)
+
+
+def quantize(values, scale):
+    return round_half_away(np.asarray(values, dtype=np.float64) * 2.0 ** scale).astype(np.int64)
+
+
+def dequantize(values, scale):
+    return np.asarray(values, dtype=np.float64) / 2.0 ** scale
+
+
+def load_settings(settings_path):
+    """Return the run_args that drive quantization from an EZKL settings.json."""
+    with open(settings_path) as f:
+        settings = json.load(f)
+    run_args = settings["run_args"]
+    return {
+        "input_scale": int(run_args["input_scale"]),
+        "param_scale": int(run_args["param_scale"]),
+        "scale_rebase_multiplier": int(run_args.get("scale_rebase_multiplier", 1)),
+        "model_output_scales": settings.get("model_output_scales"),
+    }
+
+
+def lookup(function, value, scale):
+    return quantize(function(dequantize(value, scale)), scale)
+
+
+class FixedPointModel:
+    """The quantized forward pass of one ONNX model at fixed scales."""
+
+    def __init__(self, model_path, input_scale, param_scale, scale_rebase_multiplier=1):
+        import onnx
+        from onnx import numpy_helper
+
+        model = onnx.load(model_path)
+        self.nodes = list(model.graph.node)
+        self.constants = {t.name: numpy_helper.to_array(t).astype(np.float64) for t in model.graph.initializer}
+        for node in self.nodes:
+            if node.op_type == "Constant":
+                value = onnx_attribute(node.attribute[0])
+                if isinstance(value, onnx.TensorProto):
+                    value = numpy_helper.to_array(value)
+                self.constants[node.output[0]] = np.asarray(value, dtype=np.float64)
+        self.input_name = model.graph.input[0].name
+        self.output_name = model.graph.output[0].name
+        self.input_scale = input_scale
+        self.param_scale = param_scale
+        self.scale_rebase_multiplier = scale_rebase_multiplier
+        self.lookup_extent = (0, 0)
+        self.lookups = 0
+
+    @classmethod
+    def from_settings(cls, model_path, settings_path):
+        settings = load_settings(settings_path)
+        return cls(model_path, settings["input_scale"], settings["param_scale"],
+                   settings["scale_rebase_multiplier"])
+
+    def rebase(self, value, scale):
+        if scale > self.input_scale * self.scale_rebase_multiplier:
+            divisor = 2.0 ** (scale - self.input_scale)
+            return round_half_away(value / divisor).astype(np.int64), self.input_scale
+        return value, scale
+
+    def operand(self, values, name):
+        # Variables carry (int tensor, scale); constants are quantized at param_scale
+        if name in values:
+            return values[name]
+        return quantize(self.constants[name], self.param_scale), self.param_scale
+
+    def lookup(self, function, value, scale):
+        # Every lookup input must fit in the circuit's run_args.lookup_range
+        low, high = int(value.min()), int(value.max())
+        self.lookup_extent = (min(self.lookup_extent[0], low), max(self.lookup_extent[1], high))
+        self.lookups += value.size
+        return lookup(function, value, scale)
+
+    def run(self, features):
+        """Return (quantized outputs, output scale) for an (N, F) feature batch.
+
+        The smallest and largest lookup inputs seen are left in lookup_extent, and
+        the number of looked-up elements in lookups.
+        """
+        self.lookup_extent = (0, 0)
+        self.lookups = 0
+        values = {self.input_name: (quantize(features, self.input_scale), self.input_scale)}
+        for node in self.nodes:
+            if node.op_type == "Constant":
+                continue
+            value, scale = self.apply(node, values)
+            values[node.output[0]] = self.rebase(value, scale)
+        return values[self.output_name]
+
+    def apply(self, node, values):
+        op = node.op_type
+        attributes = {a.name: onnx_attribute(a) for a in node.attribute}
+
+        if op in ("MatMul", "Gemm"):
+            (a, a_scale), (b, b_scale) = self.operand(values, node.input[0]), self.operand(values, node.input[1])
+            if attributes.get("transA"):
+                a = a.T
+            if attributes.get("transB"):
+                b = b.T
+            if attributes.get("alpha", 1.0) != 1.0 or attributes.get("beta", 1.0) != 1.0:
+                raise ValueError("Gemm with alpha/beta other than 1 is not supported")
+            value, scale = a @ b, a_scale + b_scale
+            if op == "Gemm" and len(node.input) > 2:
+                # The bias is quantized straight at the product's scale
+                value = value + quantize(self.constants[node.input[2]], scale)
+            return value, scale
+        if op == "Mul":
+            (a, a_scale), (b, b_scale) = self.operand(values, node.input[0]), self.operand(values, node.input[1])
+            return a * b, a_scale + b_scale
+        if op in ("Add", "Sub"):
+            (a, a_scale), (b, b_scale) = self.operand(values, node.input[0]), self.operand(values, node.input[1])
+            scale = max(a_scale, b_scale)
+            a, b = a * 2 ** (scale - a_scale), b * 2 ** (scale - b_scale)
+            return (a + b if op == "Add" else a - b), scale
+        if op == "Div" and node.input[1] in self.constants:
+            value, scale = self.operand(values, node.input[0])
+            denominator = constant_denominator(node, self.constants)
+            return self.lookup(lambda x: x / denominator, value, scale), scale
+        if op == "Div":
+            # Variable denominators become a reciprocal lookup times the numerator
+            (a, a_scale), (b, b_scale) = self.operand(values, node.input[0]), values[node.input[1]]
+            return a * self.lookup(np.reciprocal, b, b_scale), a_scale + b_scale
+
+        value, scale = values[node.input[0]]
+        if op == "Neg":
+            return -value, scale
+        if op == "Relu":
+            return np.maximum(value, 0), scale
+        if op == "Clip":
+            low = quantize(self.constants[node.input[1]], scale) if len(node.input) > 1 and node.input[1] else None
+            high = quantize(self.constants[node.input[2]], scale) if len(node.input) > 2 and node.input[2] else None
+            return np.clip(value, low, high), scale
+        if op in LOOKUP_OPS:
+            return self.lookup(lookup_function(op, attributes), value, scale), scale
+        raise ValueError(f"Unsupported op for the fixed-point estimate: {op}")
+
+    def scores(self, features):
+        """Dequantized (N,) scores for an (N, F) feature batch."""
+        value, scale = self.run(np.asarray(features, dtype=np.float64))
+        return dequantize(value, scale).reshape(len(features), -1)[:, 0]
+
+
+def constant_denominator(node, constants):
+    """The scalar a Div node divides by; ezkl only divides by scalar constants."""
+    denominator = constants[node.input[1]]
+    if denominator.size != 1:
+        raise ValueError(f"Div {node.name} by a non-scalar constant is not supported")
+    return float(denominator.reshape(-1)[0])
+
+
+def lookup_function(op, attributes):
+    """The float function a LOOKUP_OPS node tabulates."""
+    if op == "Exp":
+        return np.exp
+    if op == "Reciprocal":
+        return np.reciprocal
+    if op == "Sigmoid":
+        return lambda x: 1.0 / (1.0 + np.exp(-x))
+    alpha, beta = attributes.get("alpha", 0.2), attributes.get("beta", 0.5)
+    return lambda x: np.clip(alpha * x + beta, 0.0, 1.0)
+
+
+def onnx_attribute(attribute):
+    from onnx import helper
+    return helper.get_attribute_value(attribute)
+
+
+def felt_to_int(value):
+    """Decode a witness field element (little-endian hex, decimal string or int) to a signed int."""
+    if isinstance(value, str) and value.startswith("0x"):
+        value = int.from_bytes(bytes.fromhex(value[2:]), "little")
+    value = int(value) % BN254_MODULUS
+    return value - BN254_MODULUS if value > BN254_MODULUS // 2 else value
+
+
+def witness_outputs(witness_path):
+    with open(witness_path) as f:
+        witness = json.load(f)
+    return np.array([felt_to_int(v) for output in witness["outputs"] for v in output], dtype=np.int64)
+
+
+def input_features(input_path):
+    """Feature rows of an EZKL input.json, single-row or batched."""
+    with open(input_path) as f:
+        ezkl_input = json.load(f)
+    flat = np.asarray(ezkl_input["input_data"][0], dtype=np.float64)
+    return flat.reshape(-1, ezkl_input["input_shapes"][0][-1])
+
+
+def compare_with_witness(model, input_path, witness_path):
+    """Return (estimated, witness) quantized outputs for one input/witness pair."""
+    estimated, _ = model.run(input_features(input_path))
+    return estimated.reshape(-1), witness_outputs(witness_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("model", help="credit_model.onnx")
+    parser.add_argument("settings", help="settings.json produced by ezkl gen-settings/calibrate-settings")
+    parser.add_argument("--input", help="EZKL input.json to estimate the outputs for")
+    parser.add_argument("--witness", help="witness.json from ezkl gen-witness on --input; exits 1 if any "
+                        "estimated output differs from it")
+    parser.add_argument("--records", help="JSONL/CSV address records (or - for stdin) to pre-screen")
+    parser.add_argument("--output", help="write one JSON line per record here instead of stdout")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from credit_model import read_records, tier_of
+
+    model = FixedPointModel.from_settings(args.model, args.settings)
+    settings = load_settings(args.settings)
+
+    if args.input:
+        value, scale = model.run(input_features(args.input))
+        expected_scales = settings["model_output_scales"]
+        if expected_scales and scale != expected_scales[0]:
+            print(f"Warning: estimated output scale {scale} differs from settings ({expected_scales[0]})")
+        print(f"Estimated outputs (scale {scale}): {value.reshape(-1).tolist()}")
+        print(f"Estimated scores: {dequantize(value, scale).reshape(-1).tolist()}")
+        if args.witness:
+            estimated, proven = compare_with_witness(model, args.input, args.witness)
+            mismatches = int(np.count_nonzero(estimated != proven))
+            print(f"Witness outputs: {proven.tolist()}")
+            print(f"{mismatches} of {proven.size} outputs differ from the witness")
+            if mismatches:
+                sys.exit(1)
+
+    if args.records:
+        records = read_records(args.records)
+        features = np.asarray([row for _, row in records], dtype=np.float64)
+        scores = model.scores(features)
+        tiers = tier_of(scores)
+        out = open(args.output, "w") if args.output else sys.stdout
+        try:
+            for (address, _), score, tier in zip(records, scores, tiers):
+                out.write(json.dumps({"address": address, "score": float(score), "tier": str(tier)}) + "\n")
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+
+if __name__ == "__main__":
+    main()
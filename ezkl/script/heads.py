@@ -0,0 +1,104 @@
+"""Circuit-friendly replacements for the credit model's logistic head.
+
+Every head maps the model's logit z = 10 * (x . w) - 5 to a score. The exact
+logistic needs Exp and reciprocal lookups in a Halo2 circuit; the
+alternatives here are cheaper and report how far they move scores and tiers.
+"""
+import numpy as np
+
+HEADS = ("sigmoid", "hard_sigmoid", "pwl_sigmoid", "poly")
+
+TIER_THRESHOLDS = (0.4, 0.7)
+ELIGIBILITY_THRESHOLD = 0.5
+
+# Weights sum to one and features lie in [0, 1], so logits lie in [-5, 5]
+LOGIT_RANGE = (-5.0, 5.0)
+
+# ONNX HardSigmoid defaults: clip(0.2 * z + 0.5, 0, 1)
+HARD_SIGMOID_ALPHA = 0.2
+HARD_SIGMOID_BETA = 0.5
+
+POLY_DEGREE = 3
+POLY_FIT_STEPS = 11
+
+
+def feature_grid(steps, num_features=4):
+    """All points of a regular grid over [0, 1]^num_features."""
+    axis = np.linspace(0.0, 1.0, steps, dtype=np.float32)
+    mesh = np.meshgrid(*([axis] * num_features), indexing="ij")
+    return np.stack(mesh, axis=-1).reshape(-1, num_features)
+
+
+def logits(features, weights):
+    weights = np.asarray(weights, dtype=np.float32)
+    return np.float32(10.0) * (np.asarray(features, dtype=np.float32) @ weights) - np.float32(5.0)
+
+
+def sigmoid(z):
+    z = np.asarray(z, dtype=np.float32)
+    return np.float32(1.0) / (np.float32(1.0) + np.exp(-z))
+
+
+def pwl_knots():
+    """Knots of the piecewise-linear sigmoid.
+
+    Besides the range ends and +-2.5, the knots sit exactly where the
+    logistic crosses the tier (0.4, 0.7) and eligibility (0.5) thresholds,
+    so the interpolant preserves every tier and eligibility decision.
+    """
+    thresholds = np.array(TIER_THRESHOLDS + (ELIGIBILITY_THRESHOLD,))
+    boundaries = np.log(thresholds / (1.0 - thresholds))
+    knots = np.unique(np.concatenate([LOGIT_RANGE, [-2.5, 2.5], boundaries]))
+    values = 1.0 / (1.0 + np.exp(-knots))
+    return knots.astype(np.float32), values.astype(np.float32)
+
+
+def poly_coefficients(weights):
+    """Least-squares cubic in z fitted to the logistic over a grid on [0, 1]^4.
+
+    Coefficients are returned highest degree first, as numpy.polyfit does.
+    """
+    z = logits(feature_grid(POLY_FIT_STEPS, len(weights)), weights).astype(np.float64)
+    return np.polyfit(z, 1.0 / (1.0 + np.exp(-z)), POLY_DEGREE).astype(np.float32)
+
+
+def apply_head(head, z, weights):
+    """Score logits z with the given head, in float32."""
+    z = np.asarray(z, dtype=np.float32)
+    if head == "sigmoid":
+        return sigmoid(z)
+    if head == "hard_sigmoid":
+        alpha, beta = np.float32(HARD_SIGMOID_ALPHA), np.float32(HARD_SIGMOID_BETA)
+        return np.clip(alpha * z + beta, np.float32(0.0), np.float32(1.0))
+    if head == "pwl_sigmoid":
+        knots, values = pwl_knots()
+        return np.interp(z, knots, values).astype(np.float32)
+    if head == "poly":
+        scores = np.polyval(poly_coefficients(weights), z)
+        return np.clip(scores, np.float32(0.0), np.float32(1.0)).astype(np.float32)
+    raise ValueError(f"Unknown head: {head!r}")
+
+
+def tier_index(scores):
+    # 0 = LOW, 1 = MEDIUM, 2 = HIGH, with the same boundaries as tier_of
+    return np.digitize(scores, TIER_THRESHOLDS)
+
+
+def head_report(weights, steps=21):
+    """Compare every head with the exact logistic over a dense [0, 1]^4 grid."""
+    z = logits(feature_grid(steps, len(weights)), weights)
+    exact = sigmoid(z)
+    exact_tiers = tier_index(exact)
+
+    report = {"grid_steps": steps, "grid_points": int(z.size), "heads": {}}
+    for head in HEADS:
+        scores = apply_head(head, z, weights)
+        error = np.abs(scores.astype(np.float64) - exact.astype(np.float64))
+        report["heads"][head] = {
+            "max_abs_error": float(error.max()),
+            "mean_abs_error": float(error.mean()),
+            "tier_flips": int(np.count_nonzero(tier_index(scores) != exact_tiers)),
+            "eligibility_flips": int(np.count_nonzero(
+                (scores > ELIGIBILITY_THRESHOLD) != (exact > ELIGIBILITY_THRESHOLD))),
+        }
+    return report
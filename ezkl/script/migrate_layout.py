@@ -0,0 +1,94 @@
+"""Move per-address artifacts between the flat and sharded layouts, or look one up.
+
+    python3 ./script/migrate_layout.py proof_generation sharded
+    python3 ./script/migrate_layout.py proof_registry sharded
+    python3 ./script/migrate_layout.py proof_generation --lookup 0x4444...
+
+An entry is a directory or file named after an address (40 hex digits, with
+or without 0x, plus an optional extension such as .json): the per-address
+directories of proof_generation/ and the <address>.json files of
+proof_registry/. Every entry moves with a single rename, so an interrupted
+migration leaves each entry whole in either its old or its new place, and
+running it again finishes the job. The root's layout file is switched last;
+stop the pipeline while a root is being migrated.
+"""
+import argparse
+import os
+import re
+
+from credit_model import LAYOUTS, address_dir, read_layout, shard_dir, write_layout
+
+ADDRESS_NAME = re.compile(r"^(0x)?[0-9a-fA-F]{40}(\.[A-Za-z]+)?$")
+SHARD_NAME = re.compile(r"^[0-9a-f]{2}$")
+
+
+def address_entries(root):
+    """Paths of every address entry under root, whether flat or sharded."""
+    paths = []
+    for entry in os.scandir(root):
+        if ADDRESS_NAME.match(entry.name):
+            paths.append(entry.path)
+        elif entry.is_dir() and SHARD_NAME.match(entry.name):
+            for shard in os.scandir(entry.path):
+                if shard.is_dir() and SHARD_NAME.match(shard.name):
+                    paths.extend(leaf.path for leaf in os.scandir(shard.path) if ADDRESS_NAME.match(leaf.name))
+    return paths
+
+
+def planned_moves(root, layout):
+    moves = []
+    for path in address_entries(root):
+        name = os.path.basename(path)
+        target = os.path.join(shard_dir(root, name.split(".")[0], layout), name)
+        if path != target:
+            moves.append((path, target))
+    return moves
+
+
+def migrate(root, layout, dry_run=False):
+    """Move every address entry under root to its place in layout; return the moves."""
+    moves = planned_moves(root, layout)
+    if dry_run:
+        return moves
+    for path, target in moves:
+        if os.path.exists(target):
+            raise FileExistsError(f"Cannot move {path}: {target} already exists")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.rename(path, target)
+        if layout == "flat":
+            # Drop shard directories as they empty; never the root itself
+            for directory in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+    write_layout(root, layout)
+    return moves
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("root", help="proof_generation, proof_registry or another per-address root")
+    parser.add_argument("layout", nargs="?", choices=LAYOUTS, help="layout to migrate the root to")
+    parser.add_argument("--lookup", metavar="ADDRESS", nargs="+",
+                        help="print the directory of each address under the root's current layout")
+    parser.add_argument("--dry-run", action="store_true", help="list the moves without making them")
+    args = parser.parse_args(argv)
+    if (args.layout is None) == (args.lookup is None):
+        parser.error("give either a layout to migrate to or --lookup")
+
+    if args.lookup:
+        layout = read_layout(args.root)
+        for address in args.lookup:
+            print(address_dir(args.root, address, layout))
+        return
+
+    moves = migrate(args.root, args.layout, args.dry_run)
+    for path, target in moves if args.dry_run else ():
+        print(f"{path} -> {target}")
+    print(f"{'Would move' if args.dry_run else 'Moved'} {len(moves)} entries in {args.root} "
+          f"to the {args.layout} layout")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Build the credit model's ONNX graph directly from its weights.
+
+The graph computes the same ops as CreditScoreModel.forward, so it can
+stand in for torch.onnx.export without importing torch.
+"""
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+
+PRODUCER_NAME = "loan-zkml"
+
+
+def scalar(name, value):
+    return numpy_helper.from_array(np.array(value, dtype=np.float32), name)
+
+
+def make_model(nodes, initializers, num_features, opset, batch_size=None):
+    # A fixed batch size pins the leading axis; otherwise it stays dynamic
+    batch = batch_size or "batch_size"
+    graph = helper.make_graph(
+        nodes,
+        "credit_model",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, [batch, num_features])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, [batch, 1])],
+        initializer=initializers,
+    )
+    model = helper.make_model(
+        graph,
+        opset_imports=[helper.make_opsetid("", opset)],
+        producer_name=PRODUCER_NAME,
+    )
+    onnx.checker.check_model(model)
+    return model
+
+
+def build_credit_model(weights, opset, batch_size=None):
+    """sigmoid(10 * (input @ weights) - 5) with the same node sequence as the traced model."""
+    weights = np.asarray(weights, dtype=np.float32).reshape(-1, 1)
+    initializers = [
+        numpy_helper.from_array(weights, "weights"),
+        scalar("scale", 10.0),
+        scalar("offset", 5.0),
+        scalar("one", 1.0),
+    ]
+    nodes = [
+        helper.make_node("MatMul", ["input", "weights"], ["raw_score"], name="MatMul_0"),
+        helper.make_node("Mul", ["raw_score", "scale"], ["scaled"], name="Mul_1"),
+        helper.make_node("Sub", ["scaled", "offset"], ["scaled_input"], name="Sub_2"),
+        helper.make_node("Neg", ["scaled_input"], ["negated"], name="Neg_3"),
+        helper.make_node("Exp", ["negated"], ["exp"], name="Exp_4"),
+        helper.make_node("Add", ["one", "exp"], ["denominator"], name="Add_5"),
+        helper.make_node("Div", ["one", "denominator"], ["output"], name="Div_6"),
+    ]
+    return make_model(nodes, initializers, weights.shape[0], opset, batch_size)
+
+
+def build_folded_credit_model(weights, opset, head="sigmoid", batch_size=None):
+    """The same model with the affine transform folded into one Gemm plus a head.
+
+    10 * (x @ w) - 5 == x @ (10 * w) + (-5), so the Mul and Sub nodes become
+    Gemm's weights and bias. The default head is a native Sigmoid in place of
+    Neg/Exp/Add/Div; the other heads are the approximations in heads.py.
+    """
+    weights = np.asarray(weights, dtype=np.float32).reshape(-1, 1)
+    initializers = [
+        numpy_helper.from_array(np.float32(10.0) * weights, "weights"),
+        numpy_helper.from_array(np.array([-5.0], dtype=np.float32), "bias"),
+    ]
+    nodes = [helper.make_node("Gemm", ["input", "weights", "bias"], ["logit"], name="Gemm_0")]
+    head_nodes(head, weights[:, 0], nodes, initializers)
+    return make_model(nodes, initializers, weights.shape[0], opset, batch_size)
+
+
+def head_nodes(head, weights, nodes, initializers):
+    """Append the nodes mapping "logit" to "output" for one of heads.HEADS."""
+    from heads import HARD_SIGMOID_ALPHA, HARD_SIGMOID_BETA, poly_coefficients, pwl_knots
+
+    def add(op_type, inputs, output=None, **attributes):
+        output = output or f"{op_type.lower()}_{len(nodes)}"
+        nodes.append(helper.make_node(op_type, inputs, [output], name=f"{op_type}_{len(nodes)}", **attributes))
+        return output
+
+    def constant(value):
+        name = f"c_{len(initializers)}"
+        initializers.append(scalar(name, value))
+        return name
+
+    if head == "sigmoid":
+        add("Sigmoid", ["logit"], "output")
+    elif head == "hard_sigmoid":
+        add("HardSigmoid", ["logit"], "output", alpha=HARD_SIGMOID_ALPHA, beta=HARD_SIGMOID_BETA)
+    elif head == "pwl_sigmoid":
+        # values[0] + slopes[0] * (z - knots[0]) + sum_k (slopes[k] - slopes[k-1]) * relu(z - knots[k]),
+        # clipped to the end values so the curve is flat outside the knots
+        knots, values = pwl_knots()
+        slopes = np.diff(values) / np.diff(knots)
+        total = add("Add", [add("Mul", ["logit", constant(slopes[0])]),
+                            constant(values[0] - slopes[0] * knots[0])])
+        for k in range(1, len(slopes)):
+            hinge = add("Relu", [add("Sub", ["logit", constant(knots[k])])])
+            total = add("Add", [total, add("Mul", [hinge, constant(slopes[k] - slopes[k - 1])])])
+        add("Clip", [total, constant(values[0]), constant(values[-1])], "output")
+    elif head == "poly":
+        # Horner evaluation, clipped to [0, 1]
+        coefficients = poly_coefficients(weights)
+        total = add("Mul", ["logit", constant(coefficients[0])])
+        for coefficient in coefficients[1:-1]:
+            total = add("Mul", [add("Add", [total, constant(coefficient)]), "logit"])
+        total = add("Add", [total, constant(coefficients[-1])])
+        add("Clip", [total, constant(0.0), constant(1.0)], "output")
+    else:
+        raise ValueError(f"Unknown head: {head!r}")
+
+
+def node_counts(model):
+    """Count the graph's nodes by op type."""
+    counts = {}
+    for node in model.graph.node:
+        counts[node.op_type] = counts.get(node.op_type, 0) + 1
+    return counts
+
+
+def describe_nodes(model):
+    counts = node_counts(model)
+    ops = ", ".join(f"{op} x{count}" if count > 1 else op for op, count in counts.items())
+    return f"{sum(counts.values())} nodes ({ops})"
+
+
+def clear_fields(message, *names):
+    # Older onnx releases lack some of these fields (e.g. metadata_props on nodes)
+    for name in names:
+        if name in message.DESCRIPTOR.fields_by_name:
+            message.ClearField(name)
+
+
+def canonicalize(model):
+    """Strip everything that varies between otherwise identical exports.
+
+    Producer metadata, doc strings and value_info are dropped, nodes are
+    renamed node_<i> in graph order, and initializers (init_<i>) and
+    intermediate tensors (t_<i>) are renamed and ordered by first use.
+    External data must already be loaded into the model, which onnx.load
+    does by default; the result is a single self-contained file. The model
+    is modified in place.
+    """
+    graph = model.graph
+    clear_fields(model, "producer_name", "producer_version", "domain", "model_version",
+                 "doc_string", "metadata_props")
+    clear_fields(graph, "doc_string", "metadata_props", "value_info")
+    graph.name = "credit_model"
+    model.ir_version = helper.find_min_ir_version_for(list(model.opset_import))
+
+    for tensor in graph.initializer:
+        if tensor.data_location == TensorProto.EXTERNAL:
+            raise ValueError(f"Initializer {tensor.name} has not been loaded from external data")
+        clear_fields(tensor, "doc_string", "metadata_props")
+    for value in list(graph.input) + list(graph.output):
+        clear_fields(value, "doc_string", "metadata_props")
+
+    # Graph inputs and outputs keep their public names
+    renames = {value.name: value.name for value in list(graph.input) + list(graph.output)}
+    initializer_names = {tensor.name for tensor in graph.initializer}
+    for node in graph.node:
+        for name in node.input:
+            if name in initializer_names and name not in renames:
+                renames[name] = f"init_{len(renames) - len(graph.input) - len(graph.output)}"
+    num_initializers = len(renames) - len(graph.input) - len(graph.output)
+    for node in graph.node:
+        for name in node.output:
+            if name not in renames:
+                renames[name] = f"t_{len(renames) - len(graph.input) - len(graph.output) - num_initializers}"
+
+    for index, node in enumerate(graph.node):
+        node.name = f"node_{index}"
+        clear_fields(node, "doc_string", "metadata_props")
+        node.input[:] = [renames.get(name, name) for name in node.input]
+        node.output[:] = [renames[name] for name in node.output]
+
+    # Unused initializers are dropped; the rest become init_0, init_1, ... in order
+    order = {name: index for index, name in enumerate(renames)}
+    initializers = []
+    for tensor in sorted((t for t in graph.initializer if t.name in renames), key=lambda t: order[t.name]):
+        # Re-encode as raw_data so float_data and raw_data exports serialize alike
+        initializers.append(numpy_helper.from_array(numpy_helper.to_array(tensor), renames[tensor.name]))
+    graph.ClearField("initializer")
+    graph.initializer.extend(initializers)
+
+    opsets = [helper.make_opsetid(opset.domain, opset.version)
+              for opset in sorted(model.opset_import, key=lambda opset: opset.domain)]
+    model.ClearField("opset_import")
+    model.opset_import.extend(opsets)
+    return model
+
+
+def canonical_bytes(model):
+    """Serialize a canonicalized model with deterministic map ordering."""
+    return canonicalize(model).SerializeToString(deterministic=True)
@@ -0,0 +1,102 @@
+"""Sweep input/param scales and pick the smallest that keeps every decision.
+
+Each (input_scale, param_scale) pair runs the fixed-point estimate over the
+whole feature sample at once. It records the max and mean score error, the
+tier flips at the 0.4/0.7 boundaries, the eligibility flips at 0.5, and
+the estimated logrows. The recommendation is the pair with neither tier
+nor eligibility flips and the smallest estimated logrows, then the
+smallest scales. Larger scales mean wider lookup tables and more logrows,
+so this keeps the circuit as small as the data allows.
+
+The result is written to scaling_analysis.json, and the Rust pipeline passes
+its recommended scales to ezkl gen-settings.
+"""
+import argparse
+import json
+
+import numpy as np
+
+from calibration_data import corner_rows, load_credit_features
+from circuit_cost import CostEstimator, model_input_shape
+from credit_model import score_batch, tier_of
+from fixed_point import FixedPointModel
+from heads import ELIGIBILITY_THRESHOLD, feature_grid
+
+SCALES = tuple(range(2, 15))
+
+
+def evaluate_scales(model_path, features, exact, input_scale, param_scale, input_shape):
+    model = FixedPointModel(model_path, input_scale, param_scale)
+    scores = model.scores(features)
+    error = np.abs(scores - exact)
+    estimate = CostEstimator(model_path, input_scale, param_scale).estimate(input_shape)
+    return {
+        "input_scale": input_scale,
+        "param_scale": param_scale,
+        "max_abs_error": float(error.max()),
+        "mean_abs_error": float(error.mean()),
+        "tier_flips": int(np.count_nonzero(tier_of(scores) != tier_of(exact))),
+        "eligibility_flips": int(np.count_nonzero(
+            (scores > ELIGIBILITY_THRESHOLD) != (exact > ELIGIBILITY_THRESHOLD))),
+        "lookup_range": estimate["lookup_range"],
+        "estimated_logrows": estimate["logrows"],
+    }
+
+
+def recommend(candidates):
+    """The cheapest candidate without tier or eligibility flips, or None."""
+    valid = [c for c in candidates if c["tier_flips"] == 0 and c["eligibility_flips"] == 0]
+    if not valid:
+        return None
+    return min(valid, key=lambda c: (c["estimated_logrows"], c["input_scale"] + c["param_scale"],
+                                     c["max_abs_error"]))
+
+
+def scaling_analysis(model_path, features, input_scales=SCALES, param_scales=SCALES, batch_size=None):
+    input_shape = model_input_shape(model_path, batch_size)
+    exact = score_batch(features)
+    candidates = [
+        evaluate_scales(model_path, features, exact, input_scale, param_scale, input_shape)
+        for input_scale in input_scales for param_scale in param_scales
+    ]
+    best = recommend(candidates)
+    analysis = {"model": model_path, "samples": len(features), "recommended": best, "candidates": candidates}
+    if best is not None:
+        # How a score becomes the integer the proof attests, at the recommended output scale
+        output_scale = FixedPointModel(model_path, best["input_scale"], best["param_scale"]).run(features[:1])[1]
+        analysis["output_scale"] = output_scale
+        analysis["score_multiplier"] = 2 ** output_scale
+    return analysis
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("model", help="credit_model.onnx")
+    parser.add_argument("data", help="credit_data.json produced by the synthetic_data crate")
+    parser.add_argument("output", help="where to write scaling_analysis.json")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(SCALES),
+                        help="candidate scales for both input_scale and param_scale")
+    parser.add_argument("--grid", type=int, metavar="STEPS",
+                        help="also require a STEPS^4 grid over the feature cube to keep its decisions")
+    parser.add_argument("--batch-size", type=int, help="rows per proof for a dynamic batch axis (default 1)")
+    args = parser.parse_args(argv)
+
+    features = np.concatenate([load_credit_features(args.data), corner_rows()])
+    if args.grid:
+        features = np.concatenate([features, feature_grid(args.grid)])
+    analysis = scaling_analysis(args.model, features, args.scales, args.scales, args.batch_size)
+    with open(args.output, "w") as f:
+        json.dump(analysis, f, indent=2)
+
+    best = analysis["recommended"]
+    if best is None:
+        print(f"No candidate scale keeps every tier and eligibility decision over {len(features)} samples; "
+              f"see {args.output}")
+        raise SystemExit(1)
+    print(f"Recommended input_scale {best['input_scale']}, param_scale {best['param_scale']} "
+          f"(max error {best['max_abs_error']:.4f}, estimated logrows {best['estimated_logrows']}) "
+          f"over {len(features)} samples; written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import calibration_data  # noqa: E402
+import credit_model  # noqa: E402
+
+
+def write_credit_data(path, num_samples=500):
+    features = np.random.default_rng(0).random((num_samples, 4)).round(3)
+    path.write_text(json.dumps({
+        "features": features.tolist(),
+        "scores": [0.0] * num_samples,
+        "feature_names": ["tx_count", "wallet_age", "avg_balance", "repayment"],
+    }))
+
+
+def test_calibration_set_covers_tiers_extremes_and_thresholds(tmp_path):
+    data_path = tmp_path / "credit_data.json"
+    output_path = tmp_path / "calibration.json"
+    write_credit_data(data_path)
+    calibration_data.main([str(data_path), str(output_path), "--rows-per-tier", "4", "--batch-size", "5"])
+
+    calibration = json.loads(output_path.read_text())
+    rows = np.asarray(calibration["input_data"][0], dtype=np.float32).reshape(-1, 4)
+    assert calibration["input_shapes"] == [[len(rows), 4]]
+    assert len(rows) % 5 == 0
+    np.testing.assert_allclose(calibration["output_data"][0], credit_model.score_batch(rows), rtol=0, atol=1e-6)
+
+    tiers = credit_model.tier_of(credit_model.score_batch(rows))
+    assert {"LOW", "MEDIUM", "HIGH"} <= set(tiers.tolist())
+    assert {tuple(corner) for corner in calibration_data.corner_rows()} <= {tuple(row) for row in rows}
+
+    # Rows either side of each threshold land in neighbouring tiers
+    scores = credit_model.score_batch(calibration_data.threshold_rows())
+    for threshold, (below, above) in zip((0.4, 0.5, 0.7), zip(scores[0::2], scores[1::2])):
+        assert below < threshold < above
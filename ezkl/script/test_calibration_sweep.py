@@ -0,0 +1,64 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import calibration_data  # noqa: E402
+import calibration_sweep  # noqa: E402
+import credit_model  # noqa: E402
+
+pytest.importorskip("onnx")
+
+# Stands in for the ezkl binary: settings grow with the calibrated scale
+FAKE_EZKL = """#!{python}
+import json, sys
+args = sys.argv[1:]
+value = lambda flag: args[args.index(flag) + 1]
+path = value("-O")
+if args[0] == "gen-settings":
+    scale = int(value("--input-scale"))
+    settings = {{"run_args": {{"input_scale": scale, "param_scale": scale, "logrows": 17}}, "num_rows": 0}}
+else:
+    settings = json.load(open(path))
+    scale = int(value("--scales"))
+    settings["run_args"]["logrows"] = 8 + scale
+    settings["num_rows"] = 2 ** (7 + scale)
+json.dump(settings, open(path, "w"))
+"""
+
+
+def test_sweep_promotes_cheapest_settings_that_keep_tiers(tmp_path):
+    ezkl = tmp_path / "ezkl"
+    ezkl.write_text(FAKE_EZKL.format(python=sys.executable))
+    ezkl.chmod(0o755)
+
+    model_path = str(tmp_path / "credit_model.onnx")
+    credit_model.export_onnx(model_path, [0.5, 0.5, 0.5, 1.0], exporter="onnx")
+    data_path = tmp_path / "calibration.json"
+    calibration_data.write_calibration_input(str(data_path), np.concatenate([
+        calibration_data.corner_rows(), calibration_data.threshold_rows()]))
+
+    output_path = tmp_path / "settings.json"
+    calibration_sweep.main([model_path, str(data_path), str(output_path), "--ezkl", str(ezkl),
+                            "--scales", "4", "13", "14", "--targets", "resources", "--margins", "2"])
+
+    report = json.loads((tmp_path / "calibration_sweep" / "sweep_report.json").read_text())
+    results = {r["name"]: r for r in report["results"]}
+    # Scale 4 cannot separate the rows placed either side of the tier thresholds
+    assert not results["s4_resources_m2"]["valid"]
+    assert results["s13_resources_m2"]["valid"] and results["s14_resources_m2"]["valid"]
+    assert report["best"] == "s13_resources_m2"
+    assert json.loads(output_path.read_text())["run_args"]["logrows"] == 21
+
+
+def test_failed_calibration_is_reported_not_raised(tmp_path):
+    result = calibration_sweep.run_config(
+        calibration_sweep.sweep_configs([7], ["resources"], [2.0])[0],
+        "missing.onnx", "missing.json", str(tmp_path), np.zeros((1, 4)), ezkl="false")
+    assert result["valid"] is False and "gen-settings failed" in result["error"]
+    assert calibration_sweep.cheapest([result]) is None
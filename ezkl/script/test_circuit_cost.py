@@ -0,0 +1,79 @@
+import json
+import os
+import sys
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import circuit_cost  # noqa: E402
+import credit_model  # noqa: E402
+import fixed_point  # noqa: E402
+from heads import HEADS, feature_grid  # noqa: E402
+
+pytest.importorskip("onnx")
+
+
+def export(tmp_path, graph, head="sigmoid"):
+    path = str(tmp_path / f"{graph}_{head}.onnx")
+    credit_model.export_onnx(path, [0.5, 0.5, 0.5, 1.0], exporter="onnx", graph=graph, head=head)
+    return path
+
+
+@pytest.mark.parametrize("graph", ["standard", "folded"])
+def test_lookup_range_bounds_estimated_lookups(tmp_path, graph):
+    model_path = export(tmp_path, graph)
+    estimate = circuit_cost.CostEstimator(model_path, 7, 7).estimate(circuit_cost.model_input_shape(model_path))
+
+    model = fixed_point.FixedPointModel(model_path, 7, 7)
+    model.run(feature_grid(11))
+    low, high = estimate["lookup_range"]
+    assert low <= model.lookup_extent[0] and model.lookup_extent[1] <= high
+
+
+@pytest.mark.parametrize("head", HEADS)
+def test_lookups_match_fixed_point_estimate_for_every_head(tmp_path, head):
+    # The piecewise heads clamp with Relu and Clip, which are not lookups
+    model_path = export(tmp_path, "folded", head)
+    estimate = circuit_cost.CostEstimator(model_path, 7, 7).estimate(circuit_cost.model_input_shape(model_path))
+
+    model = fixed_point.FixedPointModel(model_path, 7, 7)
+    model.run(feature_grid(11)[:1])
+    assert estimate["lookups"] == model.lookups
+    model.run(feature_grid(11))
+    low, high = estimate["lookup_range"]
+    assert low <= model.lookup_extent[0] and model.lookup_extent[1] <= high
+
+
+def test_folded_graph_is_estimated_cheaper(tmp_path):
+    standard, folded = (
+        circuit_cost.CostEstimator(path, 7, 7).estimate(circuit_cost.model_input_shape(path, 64))
+        for path in (export(tmp_path, "standard"), export(tmp_path, "folded"))
+    )
+    assert standard["input_shape"] == [64, 4]
+    assert folded["rows"] < standard["rows"]
+    assert folded["logrows"] < standard["logrows"]
+
+
+def test_history_predicts_pk_size_and_proving_time(tmp_path):
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+    (run_dir / "settings.json").write_text(json.dumps({"run_args": {"logrows": 10}}))
+    (run_dir / "pk.key").write_bytes(b"\0" * 1024)
+    history_path = str(tmp_path / "history.jsonl")
+    estimate = {"logrows": 11, "rows": 4, "lookups": 1}
+
+    # One run: cost is assumed to double per logrow
+    circuit_cost.record_run(history_path, str(run_dir), estimate, prove_seconds=2.0)
+    predicted = circuit_cost.predict(circuit_cost.load_history(history_path), 12)
+    assert predicted["pk_bytes"] == pytest.approx(4096)
+    assert predicted["prove_seconds"] == pytest.approx(8.0)
+
+    # Two logrows give a fitted slope
+    (run_dir / "settings.json").write_text(json.dumps({"run_args": {"logrows": 12}}))
+    (run_dir / "pk.key").write_bytes(b"\0" * 16384)
+    circuit_cost.record_run(history_path, str(run_dir), estimate, prove_seconds=2.0)
+    predicted = circuit_cost.predict(circuit_cost.load_history(history_path), 14)
+    assert predicted["pk_bytes"] == pytest.approx(2 ** 18)
+    assert predicted["prove_seconds"] == pytest.approx(2.0)
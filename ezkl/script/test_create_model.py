@@ -0,0 +1,460 @@
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import create_model  # noqa: E402
+import credit_model  # noqa: E402
+from heads import feature_grid  # noqa: E402
+
+CREATE_MODEL = os.path.join(SCRIPT_DIR, "create_model.py")
+
+# Scoring without a model export must not pay for importing torch
+STARTUP_BUDGET_SECONDS = 1.0
+
+
+def run_script(*args, **kwargs):
+    return subprocess.run(
+        [sys.executable, CREATE_MODEL, *args],
+        capture_output=True, text=True, **kwargs
+    )
+
+
+def test_tier_boundaries():
+    tiers = credit_model.tier_of(np.array([0.0, 0.399, 0.4, 0.699, 0.7, 1.0]))
+    assert tiers.tolist() == ["LOW", "LOW", "MEDIUM", "MEDIUM", "HIGH", "HIGH"]
+
+
+def test_numpy_scores_match_torch_model():
+    torch = pytest.importorskip("torch")
+    from torch_model import CreditScoreModel
+
+    features = np.concatenate([
+        feature_grid(11),
+        np.random.default_rng(0).random((10000, 4), dtype=np.float32),
+    ])
+    with torch.no_grad():
+        expected = CreditScoreModel(credit_model.MODEL_WEIGHTS)(torch.from_numpy(features)).numpy()[:, 0]
+    scores = credit_model.score_batch(features)
+
+    assert scores.dtype == np.float32
+    # float32 matmul accumulation order may differ by an ulp between backends
+    np.testing.assert_allclose(scores, expected, rtol=0, atol=1e-6)
+    np.testing.assert_array_equal(credit_model.tier_of(scores), credit_model.tier_of(expected))
+    np.testing.assert_array_equal((scores * 1000).astype(int), (expected * 1000).astype(int))
+
+
+def test_scoring_does_not_import_torch(tmp_path):
+    code = (
+        "import runpy, sys; "
+        # Running a script puts its directory on sys.path; runpy does not
+        f"sys.path.insert(0, {SCRIPT_DIR!r}); "
+        f"sys.argv = ['create_model.py', {str(tmp_path)!r}, '0xabc', '[0.5, 0.5, 0.5, 1.0]', '0']; "
+        f"runpy.run_path({CREATE_MODEL!r}, run_name='__main__'); "
+        "assert 'torch' not in sys.modules, 'torch was imported'"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+def test_cold_start_within_budget(tmp_path):
+    start = time.perf_counter()
+    result = run_script(str(tmp_path), "0xabc", "[0.5, 0.5, 0.5, 1.0]", "0")
+    elapsed = time.perf_counter() - start
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert elapsed < STARTUP_BUDGET_SECONDS, f"cold start took {elapsed:.2f}s"
+
+
+def test_batch_matches_single_address_run(tmp_path):
+    records = [
+        ("0x2222222222222222222222222222222222222222", [0.1, 0.2, 0.1, 0.0]),
+        ("0x4444444444444444444444444444444444444444", [0.9, 0.8, 0.9, 1.0]),
+    ]
+    records_path = tmp_path / "records.jsonl"
+    records_path.write_text(
+        "".join(json.dumps({"address": a, "features": f}) + "\n" for a, f in records)
+    )
+
+    result = run_script("--batch", str(records_path), str(tmp_path / "batch"))
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    for address, features in records:
+        single_dir = tmp_path / "single" / address
+        result = run_script(str(single_dir), address, json.dumps(features), "0")
+        assert result.returncode == 0, result.stdout + result.stderr
+
+        batch_dir = tmp_path / "batch" / credit_model.address_to_filename(address)
+        batch_meta = json.loads((batch_dir / "metadata.json").read_text())
+        single_meta = json.loads((single_dir / "metadata.json").read_text())
+        assert batch_meta["score"] == pytest.approx(single_meta["score"], abs=1e-6)
+        assert batch_meta["scaled_score"] == single_meta["scaled_score"]
+        assert json.loads((batch_dir / "input.json").read_text())["input_data"] == [features]
+
+
+def test_batch_reads_csv_from_stdin(tmp_path):
+    csv_input = "address,tx_count,wallet_age,avg_balance,repayment\n0xabc,0.5,0.5,0.5,1\n"
+    result = run_script("--batch", "-", str(tmp_path), input=csv_input)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    debug = json.loads((tmp_path / "abc" / "scaling_debug.json").read_text())
+    assert debug["features"] == [0.5, 0.5, 0.5, 1.0]
+    assert debug["credit_tier"] == "HIGH"
+
+
+def test_batch_rejects_malformed_records(tmp_path):
+    records_path = tmp_path / "records.jsonl"
+    records_path.write_text('{"address": "0xabc", "features": [0.5, 0.5]}\n')
+    result = run_script("--batch", str(records_path), str(tmp_path / "out"))
+    assert result.returncode == 1
+    assert "line 1" in result.stdout
+
+
+def test_batch_rejects_non_ascii_addresses_before_writing(tmp_path):
+    records_path = tmp_path / "records.csv"
+    records_path.write_text("0xabc,0.5,0.5,0.5,1.0\n0xäbc,0.5,0.5,0.5,1.0\n", encoding="utf-8")
+    result = run_script("--batch", str(records_path), str(tmp_path / "out"), "--format", "npz")
+    assert result.returncode == 1
+    assert "line 2" in result.stdout
+    assert not (tmp_path / "out").exists() or not list((tmp_path / "out").glob("*.npz"))
+
+
+@pytest.mark.parametrize("options", [["--fsync", "group"], ["--writers", "4", "--fsync", "file"]])
+def test_batch_writes_a_repeated_address_once(tmp_path, options):
+    records = [{"address": f"0x{i:040x}", "features": [i / 10, 0.5, 0.25, 1.0]} for i in (1, 2, 0xab, 4, 5, 6)]
+    # Record 4 differs from record 3 only in checksum casing
+    records.insert(3, {"address": f"0x{0xab:040X}", "features": [0.9, 0.9, 0.9, 1.0]})
+    records.append(records[0])
+    records_path = tmp_path / "records.jsonl"
+    records_path.write_text("".join(json.dumps(r) + "\n" for r in records))
+    output_dir = tmp_path / "out"
+    result = run_script("--batch", str(records_path), str(output_dir), *options)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "Skipping record 4: " in result.stdout and "repeats record 3" in result.stdout
+    assert "Skipping record 8: " in result.stdout and "repeats record 1" in result.stdout
+    assert "Scored 6 addresses" in result.stdout and "(2 duplicates skipped)" in result.stdout
+    # The first record of an address wins
+    metadata = json.loads((output_dir / f"{0xab:040x}" / "metadata.json").read_text())
+    assert metadata["address"] == f"0x{0xab:040x}"
+    assert not list(output_dir.glob("*/*.tmp"))
+
+
+@pytest.mark.parametrize("address", ["", "0x", "0x0x", ".", "..", "0x..", "../x", "a\\b", "0xäbc"])
+def test_addresses_that_do_not_name_a_directory_are_rejected(address):
+    with pytest.raises(ValueError, match="Address must be"):
+        credit_model.validate_address(address)
+
+
+def test_export_cache_reuses_unchanged_model(tmp_path):
+    pytest.importorskip("torch")
+    model_path = str(tmp_path / "credit_model.onnx")
+
+    assert credit_model.export_onnx(model_path, [0.5, 0.5, 0.5, 1.0])[1] is False
+    manifest = json.loads((tmp_path / "credit_model.manifest.json").read_text())
+    assert manifest["cache_key"] == credit_model.export_cache_key()[0]
+    assert credit_model.export_onnx(model_path, [0.1, 0.2, 0.3, 0.0])[1] is True
+
+    # A modified model file must not be served from the cache
+    with open(model_path, "ab") as f:
+        f.write(b"\0")
+    assert credit_model.export_onnx(model_path, [0.5, 0.5, 0.5, 1.0])[1] is False
+
+
+def run_onnx(model_path, features):
+    reference = pytest.importorskip("onnx.reference")
+    session = reference.ReferenceEvaluator(model_path)
+    return session.run(["output"], {"input": features})[0][:, 0]
+
+
+def test_direct_export_matches_traced_model(tmp_path):
+    pytest.importorskip("torch")
+    onnx = pytest.importorskip("onnx")
+    traced_path = str(tmp_path / "traced.onnx")
+    direct_path = str(tmp_path / "direct.onnx")
+    credit_model.export_onnx(traced_path, [0.5, 0.5, 0.5, 1.0], exporter="torch")
+    credit_model.export_onnx(direct_path, [0.5, 0.5, 0.5, 1.0], exporter="onnx")
+
+    direct = onnx.load(direct_path)
+    traced = onnx.load(traced_path)
+    assert [i.name for i in direct.graph.input] == [i.name for i in traced.graph.input]
+    assert [o.name for o in direct.graph.output] == [o.name for o in traced.graph.output]
+    batch_dim = direct.graph.input[0].type.tensor_type.shape.dim[0]
+    assert batch_dim.dim_param == "batch_size"
+
+    features = feature_grid(11)
+    np.testing.assert_allclose(run_onnx(direct_path, features), run_onnx(traced_path, features), rtol=0, atol=1e-6)
+    np.testing.assert_allclose(run_onnx(direct_path, features), credit_model.score_batch(features), rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("exporter", ["torch", "onnx"])
+def test_canonical_export_is_byte_stable(tmp_path, exporter):
+    pytest.importorskip(exporter)
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    first, _ = credit_model.export_onnx(
+        str(tmp_path / "a" / "credit_model.onnx"), [0.5, 0.5, 0.5, 1.0],
+        use_cache=False, exporter=exporter, canonical=True)
+    second, _ = credit_model.export_onnx(
+        str(tmp_path / "b" / "credit_model.onnx"), [0.1, 0.9, 0.3, 0.0],
+        use_cache=False, exporter=exporter, canonical=True)
+
+    assert first["model_sha256"] == second["model_sha256"]
+    assert list(first["files"]) == ["credit_model.onnx"]
+    features = feature_grid(5)
+    np.testing.assert_allclose(
+        run_onnx(str(tmp_path / "a" / "credit_model.onnx"), features),
+        credit_model.score_batch(features), rtol=0, atol=1e-6)
+
+
+def test_metadata_records_model_hash(tmp_path):
+    pytest.importorskip("onnx")
+    result = run_script("--exporter", "onnx", "--canonical", str(tmp_path), "0xabc", "[0.5, 0.5, 0.5, 1.0]", "1")
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    manifest = json.loads((tmp_path / "credit_model.manifest.json").read_text())
+    metadata = json.loads((tmp_path / "metadata.json").read_text())
+    assert metadata["model_sha256"] == manifest["model_sha256"]
+
+
+def test_folded_graph_matches_standard_graph(tmp_path, capsys):
+    onnx = pytest.importorskip("onnx")
+    model_path = str(tmp_path / "credit_model.onnx")
+    manifest, _ = credit_model.export_onnx(model_path, [0.5, 0.5, 0.5, 1.0], exporter="onnx", graph="folded")
+
+    # The library reports through the manifest; printing is left to create_model.py
+    assert capsys.readouterr().out == ""
+    assert manifest["graph_nodes"].endswith("-> 2 nodes (Gemm, Sigmoid)")
+    assert [node.op_type for node in onnx.load(model_path).graph.node] == ["Gemm", "Sigmoid"]
+    features = feature_grid(11)
+    np.testing.assert_allclose(run_onnx(model_path, features), credit_model.score_batch(features), rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("head", ["hard_sigmoid", "pwl_sigmoid", "poly"])
+def test_head_graphs_match_numpy_heads(tmp_path, head):
+    pytest.importorskip("onnx")
+    model_path = str(tmp_path / "credit_model.onnx")
+    credit_model.export_onnx(model_path, [0.5, 0.5, 0.5, 1.0], exporter="onnx", graph="folded", head=head)
+
+    features = feature_grid(11)
+    np.testing.assert_allclose(
+        run_onnx(model_path, features), credit_model.score_batch(features, head), rtol=0, atol=1e-5)
+
+
+def test_head_report_flags_tier_flips():
+    from heads import head_report
+
+    report = head_report(credit_model.MODEL_WEIGHTS, steps=11)
+    assert report["heads"]["sigmoid"]["max_abs_error"] == 0.0
+    # The piecewise-linear knots sit on the tier thresholds
+    assert report["heads"]["pwl_sigmoid"]["tier_flips"] == 0
+    assert report["heads"]["pwl_sigmoid"]["eligibility_flips"] == 0
+    assert report["heads"]["hard_sigmoid"]["tier_flips"] > 0
+
+
+def test_fixed_batch_export_and_inputs(tmp_path):
+    onnx = pytest.importorskip("onnx")
+    records_path = tmp_path / "records.jsonl"
+    records_path.write_text("".join(
+        json.dumps({"address": f"0x{i:040x}", "features": [i / 5, 0.5, 0.5, 1.0]}) + "\n" for i in range(5)
+    ))
+    out = tmp_path / "out"
+    result = run_script("--batch", str(records_path), str(out), "--batch-size", "2",
+                        "--exporter", "onnx", "--generate-model")
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    model_path = str(out / "credit_model.onnx")
+    dims = onnx.load(model_path).graph.input[0].type.tensor_type.shape.dim
+    assert [dim.dim_value for dim in dims] == [2, 4]
+
+    assert sorted(p.name for p in out.iterdir() if p.is_dir()) == ["batch_00000", "batch_00001", "batch_00002"]
+    last = json.loads((out / "batch_00002" / "input.json").read_text())
+    metadata = json.loads((out / "batch_00002" / "metadata.json").read_text())
+    assert last["input_shapes"] == [[2, 4]]
+    assert len(last["output_data"][0]) == 2
+    assert last["public_output_idxs"] == [[0, 0], [0, 1]]
+    assert metadata["addresses"] == [f"0x{4:040x}"] and metadata["padding"] == 1
+
+    rows = np.asarray(last["input_data"][0], dtype=np.float32).reshape(2, 4)
+    np.testing.assert_allclose(run_onnx(model_path, rows), last["output_data"][0], rtol=0, atol=1e-6)
+
+
+def test_api_writes_same_inputs_as_cli(tmp_path):
+    features = [0.5, 0.5, 0.5, 1.0]
+    result = run_script(str(tmp_path / "cli"), "0xabc", json.dumps(features), "0")
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    score = credit_model.score_batch(np.array([features]))[0]
+    credit_model.write_ezkl_inputs(str(tmp_path / "api"), "0xabc", features, score)
+    for name in ("input.json", "scaling_debug.json", "metadata.json"):
+        cli, api = (json.loads((tmp_path / d / name).read_text()) for d in ("cli", "api"))
+        cli.pop("timestamp", None)
+        api.pop("timestamp", None)
+        assert api == cli
+
+
+def test_worker_survives_a_failed_export(tmp_path, monkeypatch):
+    def failing_export(*args, **kwargs):
+        raise RuntimeError("ONNX export failed")
+
+    monkeypatch.setattr(create_model, "export_onnx", failing_export)
+    features = [0.5, 0.5, 0.5, 1.0]
+    requests = [
+        {"op": "export", "output_dir": str(tmp_path), "address": "0xabc", "features": features,
+         "generate_model": True},
+        {"op": "score", "features": features},
+    ]
+    responses = io.StringIO()
+    create_model.serve(io.StringIO("".join(json.dumps(r) + "\n" for r in requests)), responses)
+    failed, scored = (json.loads(line) for line in responses.getvalue().splitlines())
+    assert failed == {"ok": False, "error": "ONNX export failed"}
+    assert scored["ok"] and scored["tier"] == str(credit_model.tier_of(scored["score"]))
+
+
+@pytest.mark.parametrize("output_format", ["npz", "jsonl"])
+def test_columnar_scores_materialize_like_per_address_dirs(tmp_path, output_format):
+    records = [(f"0x{i:040x}", [i / 4, 0.1, 0.7, float(i % 2)]) for i in range(5)]
+    records_path = tmp_path / "records.jsonl"
+    records_path.write_text("".join(json.dumps({"address": a, "features": f}) + "\n" for a, f in records))
+
+    result = run_script("--batch", str(records_path), str(tmp_path / "dirs"))
+    assert result.returncode == 0, result.stdout + result.stderr
+    result = run_script("--batch", str(records_path), str(tmp_path / "columnar"), "--format", output_format)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert [p.name for p in (tmp_path / "columnar").iterdir()] == [f"scores.{output_format}"]
+
+    columns = credit_model.read_columnar_scores(str(tmp_path / "columnar" / f"scores.{output_format}"))
+    assert columns["address"].tolist() == [a for a, _ in records]
+
+    wanted = records[3][0]
+    result = run_script("--materialize", str(tmp_path / "columnar" / f"scores.{output_format}"),
+                        str(tmp_path / "prover"), wanted)
+    assert result.returncode == 0, result.stdout + result.stderr
+    name = credit_model.address_to_filename(wanted)
+    assert [p.name for p in (tmp_path / "prover").iterdir()] == [name]
+    for file in ("input.json", "scaling_debug.json", "metadata.json"):
+        direct, materialized = (json.loads((tmp_path / d / name / file).read_text()) for d in ("dirs", "prover"))
+        direct.pop("timestamp", None)
+        materialized.pop("timestamp", None)
+        assert materialized == direct
+
+    result = run_script("--materialize", str(tmp_path / "columnar" / f"scores.{output_format}"),
+                        str(tmp_path / "prover"), "0xmissing")
+    assert result.returncode == 1 and "0xmissing" in result.stdout
+
+
+def test_writer_threads_match_inline_writes(tmp_path):
+    records_path = tmp_path / "records.jsonl"
+    records_path.write_text("".join(
+        json.dumps({"address": f"0x{i:040x}", "features": [i / 600, 0.5, 0.25, 1.0]}) + "\n" for i in range(600)
+    ))
+    for name, options in (("inline", ["--writers", "0"]), ("threads", ["--writers", "3", "--compact", "--fsync", "file"])):
+        result = run_script("--batch", str(records_path), str(tmp_path / name), *options)
+        assert result.returncode == 0, result.stdout + result.stderr
+
+    inline_dirs = sorted(p.name for p in (tmp_path / "inline").iterdir())
+    assert sorted(p.name for p in (tmp_path / "threads").iterdir()) == inline_dirs
+    for name in inline_dirs[::97]:
+        for file in ("input.json", "scaling_debug.json", "metadata.json"):
+            inline, threaded = ((tmp_path / d / name / file).read_text() for d in ("inline", "threads"))
+            assert "\n" not in threaded
+            inline, threaded = json.loads(inline), json.loads(threaded)
+            inline.pop("timestamp", None)
+            threaded.pop("timestamp", None)
+            assert threaded == inline
+
+
+def test_artifact_writer_reraises_task_errors():
+    def fail():
+        raise OSError("disk full")
+
+    with pytest.raises(OSError, match="disk full"):
+        with credit_model.ArtifactWriter(threads=2) as writer:
+            writer.submit(fail)
+
+
+def file_names(directory):
+    # Temporary files are <name>.<random>.tmp; drop the random part
+    return sorted(re.sub(r"\.[^.]+\.tmp$", ".tmp", p.name) for p in directory.iterdir())
+
+
+def test_group_commit_renames_files_into_place_in_groups(tmp_path):
+    group = credit_model.GroupCommit(every=4)
+    credit_model.write_ezkl_inputs(str(tmp_path / "a"), "0xa", [0.5, 0.5, 0.5, 0.5], 0.5, fsync=group)
+    # A crash at this point leaves no partial file under a final name
+    assert file_names(tmp_path / "a") == ["input.json.tmp", "metadata.json.tmp", "scaling_debug.json.tmp"]
+
+    credit_model.write_ezkl_inputs(str(tmp_path / "b"), "0xb", [0.5, 0.5, 0.5, 0.5], 0.5, fsync=group)
+    assert file_names(tmp_path / "a") == ["input.json", "metadata.json", "scaling_debug.json"]
+    assert file_names(tmp_path / "b") == ["input.json", "metadata.json.tmp", "scaling_debug.json.tmp"]
+
+    group.commit()
+    assert not list(tmp_path.glob("*/*.tmp"))
+    assert json.loads((tmp_path / "b" / "metadata.json").read_text())["address"] == "0xb"
+
+
+def test_concurrent_writes_to_one_path_do_not_collide(tmp_path):
+    path = str(tmp_path / "input.json")
+
+    def write(value):
+        for _ in range(50):
+            credit_model.write_json(path, {"value": value}, fsync=True)
+
+    with credit_model.ArtifactWriter(threads=4) as writer:
+        for value in range(4):
+            writer.submit(write, value)
+    assert json.loads((tmp_path / "input.json").read_text())["value"] in range(4)
+    assert os.stat(path).st_mode & 0o777 == 0o666 & ~credit_model.UMASK
+    assert file_names(tmp_path) == ["input.json"]
+
+
+def test_resume_rewrites_only_incomplete_directories(tmp_path):
+    records_path = tmp_path / "records.jsonl"
+    records_path.write_text("".join(
+        json.dumps({"address": f"0x{i:040x}", "features": [i / 10, 0.5, 0.25, 1.0]}) + "\n" for i in range(10)
+    ))
+    output_dir = tmp_path / "out"
+    result = run_script("--batch", str(records_path), str(output_dir), "--fsync", "group", "--fsync-every", "7")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert not list(output_dir.glob("*/*.tmp"))
+
+    # Simulate a crash inside one directory: metadata.json never made it
+    crashed = output_dir / f"{3:040x}"
+    (crashed / "metadata.json").unlink()
+    (crashed / "input.json").write_text("{")
+    kept = output_dir / f"{4:040x}" / "input.json"
+    kept.write_text("{}")
+
+    result = run_script("--batch", str(records_path), str(output_dir), "--resume")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert json.loads((crashed / "input.json").read_text())["input_data"] == [[0.3, 0.5, 0.25, 1.0]]
+    assert (crashed / "metadata.json").exists()
+    assert kept.read_text() == "{}"
+
+
+@pytest.mark.parametrize("options", [[], ["--batch-size", "50", "--fsync", "group"]])
+def test_worker_processes_write_the_same_files(tmp_path, options):
+    records_path = tmp_path / "records.jsonl"
+    records_path.write_text("".join(
+        json.dumps({"address": f"0x{i:040x}", "features": [i / 700, 0.5, 0.25, 1.0]}) + "\n" for i in range(700)
+    ))
+    outputs = {}
+    for workers in ("1", "3"):
+        output_dir = tmp_path / f"workers_{workers}"
+        result = run_script("--batch", str(records_path), str(output_dir), "--workers", workers, *options)
+        assert result.returncode == 0, result.stdout + result.stderr
+        summary = [line for line in result.stdout.splitlines() if line.startswith("  ")]
+        files = {str(p.relative_to(output_dir)): json.loads(p.read_text()) for p in output_dir.rglob("*.json")}
+        for data in files.values():
+            data.pop("timestamp", None)
+        outputs[workers] = summary, files
+
+    assert outputs["3"] == outputs["1"]
+    assert len(outputs["1"][1]) == (28 if options else 2100)
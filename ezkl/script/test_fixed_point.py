@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import credit_model  # noqa: E402
+import fixed_point  # noqa: E402
+from heads import feature_grid  # noqa: E402
+
+pytest.importorskip("onnx")
+
+
+def felt_hex(value):
+    # EZKL writes field elements as little-endian hex
+    return "0x" + (value % fixed_point.BN254_MODULUS).to_bytes(32, "little").hex()
+
+
+@pytest.fixture(params=[("onnx", "standard"), ("onnx", "folded")])
+def model_path(request, tmp_path):
+    exporter, graph = request.param
+    path = str(tmp_path / "credit_model.onnx")
+    credit_model.export_onnx(path, [0.5, 0.5, 0.5, 1.0], exporter=exporter, graph=graph)
+    return path
+
+
+def test_felt_decoding_handles_negative_values():
+    assert fixed_point.felt_to_int(felt_hex(110)) == 110
+    assert fixed_point.felt_to_int(felt_hex(-5)) == -5
+    assert fixed_point.felt_to_int("42") == 42
+
+
+def test_rounding_matches_rust_half_away_from_zero():
+    np.testing.assert_array_equal(fixed_point.quantize([0.5 / 128, -0.5 / 128, 1.5 / 128], 7), [1, -1, 2])
+
+
+def test_estimate_converges_to_float_model(model_path):
+    features = feature_grid(11)
+    exact = credit_model.score_batch(features)
+    errors = [
+        np.abs(fixed_point.FixedPointModel(model_path, scale, scale).scores(features) - exact).max()
+        for scale in (7, 10, 14)
+    ]
+    assert errors[0] > errors[1] > errors[2]
+    assert errors[2] < 2.0 ** -10
+
+
+def test_div_by_constant_is_a_lookup_on_the_numerator(tmp_path):
+    from onnx import helper, numpy_helper
+    from onnx_graph import make_model, scalar
+    import circuit_cost
+
+    nodes = [
+        helper.make_node("MatMul", ["input", "weights"], ["mean"]),
+        helper.make_node("Div", ["mean", "three"], ["output"]),
+    ]
+    weights = numpy_helper.from_array(np.full((4, 1), 0.25, dtype=np.float32), "weights")
+    path = str(tmp_path / "div.onnx")
+    with open(path, "wb") as f:
+        f.write(make_model(nodes, [weights, scalar("three", 3.0)], 4, credit_model.ONNX_OPSET).SerializeToString())
+
+    # The means 128 and 64 at scale 7 are divided and rounded at that scale
+    model = fixed_point.FixedPointModel(path, 7, 7)
+    value, scale = model.run(np.array([[1.0] * 4, [0.5] * 4]))
+    assert scale == 7 and value.reshape(-1).tolist() == [43, 21]
+    assert model.lookups == 2 and model.lookup_extent == (0, 128)
+    estimate = circuit_cost.CostEstimator(path, 7, 7).estimate([2, 4])
+    assert estimate["lookups"] == 2 and estimate["lookup_range"] == [0, 128]
+
+
+def test_witness_check_decodes_felts_and_flags_mismatches(model_path, tmp_path):
+    # Not a golden test: no witness from ezkl gen-witness is checked in, so the
+    # witness here is built from the estimate itself. This covers felt decoding
+    # and mismatch reporting only, not agreement with ezkl.
+    settings_path = tmp_path / "settings.json"
+    settings_path.write_text(json.dumps({"run_args": {"input_scale": 7, "param_scale": 7}}))
+    credit_model.write_ezkl_inputs(str(tmp_path), "0xabc", [0.5, 0.5, 0.5, 1.0], 0.8)
+    model = fixed_point.FixedPointModel.from_settings(model_path, str(settings_path))
+    value, _ = model.run(np.array([[0.5, 0.5, 0.5, 1.0]]))
+
+    witness_path = tmp_path / "witness.json"
+    witness_path.write_text(json.dumps({"outputs": [[felt_hex(int(value.item()))]]}))
+    args = [model_path, str(settings_path), "--input", str(tmp_path / "input.json"), "--witness", str(witness_path)]
+    fixed_point.main(args)
+
+    witness_path.write_text(json.dumps({"outputs": [[felt_hex(int(value.item()) + 1)]]}))
+    with pytest.raises(SystemExit):
+        fixed_point.main(args)
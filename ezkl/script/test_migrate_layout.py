@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import create_model  # noqa: E402
+import credit_model  # noqa: E402
+import migrate_layout  # noqa: E402
+
+ADDRESSES = [f"0x{i:040x}" for i in range(1, 21)]
+
+
+def write_records(tmp_path):
+    path = tmp_path / "records.jsonl"
+    path.write_text("".join(json.dumps({"address": a, "features": [0.5, 0.5, 0.5, 1.0]}) + "\n" for a in ADDRESSES))
+    return str(path)
+
+
+def tree(root):
+    return sorted(os.path.relpath(os.path.join(d, f), root) for d, _, files in os.walk(root) for f in files)
+
+
+def test_sharded_batch_matches_migrated_flat_batch(tmp_path):
+    records = write_records(tmp_path)
+    flat, sharded = str(tmp_path / "flat"), str(tmp_path / "sharded")
+    create_model.main(["--batch", records, flat])
+    create_model.main(["--batch", records, sharded, "--layout", "sharded"])
+    assert credit_model.read_layout(sharded) == "sharded"
+    for address in ADDRESSES:
+        assert os.path.exists(os.path.join(credit_model.address_dir(sharded, address, "sharded"), "input.json"))
+
+    # A registry-style <address>.json file moves with the directories
+    with open(os.path.join(flat, f"{ADDRESSES[0]}.json"), "w") as f:
+        f.write("{}")
+    moves = migrate_layout.migrate(flat, "sharded")
+    assert len(moves) == len(ADDRESSES) + 1
+    assert set(tree(flat)) - set(tree(sharded)) == {
+        os.path.join(os.path.relpath(credit_model.shard_dir(flat, ADDRESSES[0], "sharded"), flat),
+                     f"{ADDRESSES[0]}.json")}
+
+    # Migrating back leaves no shard directories behind, and a second run has nothing to do
+    migrate_layout.migrate(flat, "flat")
+    assert sorted(os.listdir(flat)) == sorted(
+        [a[2:] for a in ADDRESSES] + [f"{ADDRESSES[0]}.json", credit_model.LAYOUT_FILE])
+    assert migrate_layout.migrate(flat, "flat") == []
+
+
+def test_layout_is_not_switched_without_migration(tmp_path, capsys):
+    records = write_records(tmp_path)
+    root = str(tmp_path / "root")
+    create_model.main(["--batch", records, root, "--layout", "sharded"])
+    with pytest.raises(SystemExit):
+        create_model.main(["--batch", records, root, "--layout", "flat"])
+    assert "run migrate_layout.py" in capsys.readouterr().out
+
+    migrate_layout.main([root, "--lookup", ADDRESSES[3]])
+    assert capsys.readouterr().out.strip() == credit_model.address_dir(root, ADDRESSES[3], "sharded")
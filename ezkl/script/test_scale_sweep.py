@@ -0,0 +1,34 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPT_DIR)
+
+import credit_model  # noqa: E402
+import scale_sweep  # noqa: E402
+
+pytest.importorskip("onnx")
+
+
+def test_recommends_cheapest_scales_without_flips(tmp_path):
+    model_path = str(tmp_path / "credit_model.onnx")
+    credit_model.export_onnx(model_path, [0.5, 0.5, 0.5, 1.0], exporter="onnx")
+    data_path = tmp_path / "credit_data.json"
+    data_path.write_text(json.dumps({"features": np.random.default_rng(0).random((500, 4)).tolist()}))
+    output_path = tmp_path / "scaling_analysis.json"
+
+    scale_sweep.main([model_path, str(data_path), str(output_path), "--scales", "3", "7", "10", "13"])
+
+    analysis = json.loads(output_path.read_text())
+    best = analysis["recommended"]
+    assert len(analysis["candidates"]) == 16
+    assert best["tier_flips"] == 0 and best["eligibility_flips"] == 0
+    assert analysis["score_multiplier"] == 2 ** analysis["output_scale"]
+    # Every cheaper candidate changes some decision
+    for candidate in analysis["candidates"]:
+        if candidate["estimated_logrows"] < best["estimated_logrows"]:
+            assert candidate["tier_flips"] or candidate["eligibility_flips"]
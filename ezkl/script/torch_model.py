@@ -0,0 +1,18 @@
+import torch
+import torch.nn as nn
+
+
+# Define model that matches Rust implementation
+class CreditScoreModel(nn.Module):
+    def __init__(self, weights):
+        super(CreditScoreModel, self).__init__()
+        self.weights = nn.Parameter(torch.tensor([weights]).float())
+
+    def forward(self, x):
+        # Linear combination of features
+        raw_score = torch.matmul(x, self.weights.t())
+        # Apply the same transformation as Rust: sigmoid(10.0 * x - 5.0)
+        # Fix the order of operations to match Rust
+        scaled_input = 10.0 * raw_score - 5.0
+        scaled_score = 1.0 / (1.0 + torch.exp(-scaled_input))
+        return scaled_score
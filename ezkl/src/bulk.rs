@@ -0,0 +1,224 @@
+use anyhow::{anyhow, Context, Result};
+use serde::Deserialize;
+use std::collections::hash_map::Entry;
+use std::collections::HashMap;
+use std::fs::File;
+use std::io::{BufRead, BufReader};
+use std::path::Path;
+use std::sync::atomic::{AtomicUsize, Ordering};
+use std::sync::mpsc::sync_channel;
+use std::sync::Mutex;
+use std::thread;
+use std::time::{Duration, Instant};
+use synthetic_data::CreditData;
+
+use crate::ezkl_stages::StageRunner;
+use crate::script_generator::prove_address;
+use crate::utils::{address_dir, address_to_filename, get_features_for_address, validate_address, Layout};
+
+/// Addresses queued per worker, so memory stays bounded however long the address file is
+const QUEUE_PER_WORKER: usize = 2;
+
+/// Failed addresses named in the final error; each one is also in its progress line
+const MAX_FAILURES_SHOWN: usize = 10;
+
+/// Features per address the model takes, as NUM_FEATURES in credit_model.py
+const NUM_FEATURES: usize = 4;
+
+/// An address to prove and its features
+type Job = (String, Vec<f32>);
+
+/// One line of an addresses file given as a JSON record
+#[derive(Deserialize)]
+struct AddressRecord {
+    address: String,
+    features: Vec<f32>,
+}
+
+/// True for lines that name no address: blank lines and `#` comments
+fn is_blank(line: &str) -> bool {
+    let line = line.trim();
+    line.is_empty() || line.starts_with('#')
+}
+
+/// Parses one line of an addresses file into an address and its features.
+///
+/// A line is either a bare address, whose features come from the synthetic data,
+/// or a JSON record `{"address": "0x..", "features": [..]}` as read by
+/// `create_model.py --batch`. An address that does not name a directory inside
+/// the artifact roots, or a record with the wrong number of features, is
+/// rejected here rather than failing later in ezkl or writing outside the roots.
+fn parse_line(number: usize, line: &str, data: &CreditData) -> Result<Job> {
+    let line = line.trim();
+    if line.starts_with('{') {
+        let record: AddressRecord = serde_json::from_str(line)
+            .context(format!("Invalid address record on line {}: {}", number, line))?;
+        validate_address(&record.address).context(format!("Line {}", number))?;
+        if record.features.len() != NUM_FEATURES {
+            return Err(anyhow!("Line {}: {} has {} features, expected {}",
+                number, record.address, record.features.len(), NUM_FEATURES));
+        }
+        return Ok((record.address, record.features));
+    }
+    validate_address(line).context(format!("Line {}", number))?;
+    Ok((line.to_string(), get_features_for_address(data, line)?))
+}
+
+/// Formats a duration as e.g. `1h02m03s`, `2m03s` or `3s`
+fn format_duration(duration: Duration) -> String {
+    let seconds = duration.as_secs();
+    match (seconds / 3600, seconds / 60 % 60, seconds % 60) {
+        (0, 0, s) => format!("{}s", s),
+        (0, m, s) => format!("{}m{:02}s", m, s),
+        (h, m, s) => format!("{}h{:02}m{:02}s", h, m, s),
+    }
+}
+
+/// Completed, skipped and failed addresses, shared by the workers
+struct Progress {
+    total: usize,
+    done: AtomicUsize,
+    skipped: AtomicUsize,
+    failed: Mutex<Vec<String>>,
+    start: Instant,
+}
+
+impl Progress {
+    /// Records one finished address and prints a progress line with the ETA
+    fn record(&self, address: &str, result: Result<bool>) {
+        let status = match result {
+            Ok(true) => "proved".to_string(),
+            Ok(false) => "up to date".to_string(),
+            Err(e) => {
+                self.failed.lock().unwrap().push(address.to_string());
+                format!("FAILED ({:#})", e)
+            }
+        };
+        self.report(address, &status);
+    }
+
+    /// Records an address listed again and not proved a second time
+    fn skip(&self, address: &str, first_line: usize) {
+        self.skipped.fetch_add(1, Ordering::SeqCst);
+        self.report(address, &format!("skipped (duplicate of line {})", first_line));
+    }
+
+    fn report(&self, address: &str, status: &str) {
+        let done = self.done.fetch_add(1, Ordering::SeqCst) + 1;
+        let elapsed = self.start.elapsed();
+        let remaining = self.total.saturating_sub(done);
+        let eta = elapsed.mul_f64(remaining as f64 / done as f64);
+        println!("[{}/{}] {} {} | elapsed {} | ETA {}",
+            done, self.total, address, status, format_duration(elapsed), format_duration(eta));
+    }
+}
+
+/// Proves every address listed in `path` with up to `workers` addresses in flight.
+///
+/// Addresses are streamed from the file through a bounded queue, so a long list
+/// is never held in memory beyond one key per address seen. An address listed
+/// more than once is proved once: the later lines are reported as skipped, since
+/// two workers on one address would write the same files. A failed address is
+/// reported and the others carry on; the run fails at the end if any address
+/// failed.
+pub fn prove_addresses(runner: &StageRunner, path: &Path, data: &CreditData, root: &Path, layout: Layout,
+    workers: usize) -> Result<()> {
+    let total = BufReader::new(File::open(path).context(format!("Failed to open {}", path.display()))?)
+        .lines()
+        .filter(|line| line.as_ref().map_or(true, |line| !is_blank(line)))
+        .count();
+    println!("Proving {} addresses from {} with {} workers", total, path.display(), workers);
+
+    let progress = Progress {
+        total,
+        done: AtomicUsize::new(0),
+        skipped: AtomicUsize::new(0),
+        failed: Mutex::new(Vec::new()),
+        start: Instant::now(),
+    };
+    let prove = |address: &str, features: &[f32]| {
+        let result = prove_address(runner, address, features, &address_dir(root, address, layout), false);
+        progress.record(address, result);
+    };
+
+    // Yields the next job with its line number, skipping blank lines
+    let mut lines = BufReader::new(File::open(path)?).lines();
+    let mut number = 0;
+    let mut next_job = || -> Option<(usize, Result<Job>)> {
+        for line in lines.by_ref() {
+            number += 1;
+            match line {
+                Ok(line) if is_blank(&line) => continue,
+                Ok(line) => return Some((number, parse_line(number, &line, data))),
+                Err(e) => return Some((number, Err(e.into()))),
+            }
+        }
+        None
+    };
+
+    let (sender, receiver) = sync_channel::<Job>(workers * QUEUE_PER_WORKER);
+    let receiver = Mutex::new(receiver);
+    thread::scope(|scope| {
+        for _ in 0..workers {
+            scope.spawn(|| loop {
+                let job = receiver.lock().unwrap().recv();
+                match job {
+                    Ok((address, features)) => prove(&address, &features),
+                    Err(_) => break,
+                }
+            });
+        }
+        // send() blocks while the queue is full, so reading keeps pace with proving.
+        // Addresses are keyed without 0x and checksum casing, like their shard
+        let mut first_lines = HashMap::new();
+        while let Some((number, job)) = next_job() {
+            match job {
+                Ok(job) => match first_lines.entry(address_to_filename(&job.0).to_lowercase()) {
+                    Entry::Occupied(first) => progress.skip(&job.0, *first.get()),
+                    Entry::Vacant(slot) => {
+                        slot.insert(number);
+                        sender.send(job).expect("the receiver outlives the workers");
+                    }
+                },
+                Err(e) => progress.record(&format!("line {}", number), Err(e)),
+            }
+        }
+        drop(sender);
+    });
+
+    let failed = progress.failed.into_inner().unwrap();
+    let skipped = progress.skipped.into_inner();
+    println!("Proved {} of {} addresses in {}{}", total - skipped - failed.len(), total - skipped,
+        format_duration(progress.start.elapsed()),
+        if skipped > 0 { format!(" ({} duplicates skipped)", skipped) } else { String::new() });
+    if !failed.is_empty() {
+        let shown = failed.iter().take(MAX_FAILURES_SHOWN).cloned().collect::<Vec<_>>().join(", ");
+        let more = if failed.len() > MAX_FAILURES_SHOWN { ", ..." } else { "" };
+        return Err(anyhow!("{} addresses failed: {}{}", failed.len(), shown, more));
+    }
+    Ok(())
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_records_need_every_feature() {
+        let data = CreditData { features: vec![], scores: vec![], feature_names: vec![], address_mapping: None };
+        let (address, features) = parse_line(1, r#"{"address": "0xabc", "features": [0.5, 0.5, 0.5, 1.0]}"#, &data).unwrap();
+        assert_eq!((address.as_str(), features.len()), ("0xabc", NUM_FEATURES));
+        let error = parse_line(7, r#"{"address": "0xabc", "features": [0.5, 0.5, 0.5]}"#, &data).unwrap_err();
+        assert_eq!(error.to_string(), "Line 7: 0xabc has 3 features, expected 4");
+        let error = parse_line(8, r#"{"address": "../x", "features": [0.5, 0.5, 0.5, 1.0]}"#, &data).unwrap_err();
+        assert!(format!("{:#}", error).starts_with("Line 8: Address must be"), "{:#}", error);
+        assert!(parse_line(9, "0x", &data).is_err());
+    }
+
+    #[test]
+    fn test_format_duration() {
+        assert_eq!(format_duration(Duration::from_secs(3)), "3s");
+        assert_eq!(format_duration(Duration::from_secs(123)), "2m03s");
+        assert_eq!(format_duration(Duration::from_secs(3723)), "1h02m03s");
+    }
+}
@@ -0,0 +1,422 @@
+use anyhow::{anyhow, Context, Result};
+use std::collections::{BTreeMap, VecDeque};
+use std::ffi::OsStr;
+use std::fmt;
+use std::fs::{self, File};
+use std::io::{self, BufRead, BufReader, Read, Write};
+use std::path::{Path, PathBuf};
+use std::process::{Command, Stdio};
+use std::sync::Mutex;
+use std::thread;
+
+use crate::script_generator::SRS_FILE;
+use crate::step_manifest::StepManifest;
+use crate::utils::sha256_file;
+
+/// Per-address log holding the full output of the stages of the latest run
+pub const LOG_FILE: &str = "ezkl.log";
+
+/// Last output lines of a stage kept in memory for its error message
+const OUTPUT_TAIL_LINES: usize = 20;
+
+/// Files of the shared circuit, built by initialize_shared_resources with run_ezkl_common.sh
+pub struct SharedCircuit {
+    pub compiled: PathBuf,
+    pub pk: PathBuf,
+    pub vk: PathBuf,
+    pub settings: PathBuf,
+    pub srs: PathBuf,
+}
+
+impl SharedCircuit {
+    pub fn new(dir: &Path) -> Self {
+        SharedCircuit {
+            compiled: dir.join("model.compiled"),
+            pk: dir.join("pk.key"),
+            vk: dir.join("vk.key"),
+            settings: dir.join("settings.json"),
+            srs: dir.join(SRS_FILE),
+        }
+    }
+}
+
+/// SHA-256 hashes of the shared circuit files, computed once per run
+pub struct SharedHashes {
+    compiled: String,
+    pk: String,
+    vk: String,
+    settings: String,
+    srs: String,
+}
+
+impl SharedHashes {
+    /// Picks the hashes out of a file name to SHA-256 map, as recorded in shared_resources.json
+    pub fn from_files(files: &BTreeMap<String, String>) -> Result<Self> {
+        let hash = |name: &str| files.get(name).cloned()
+            .ok_or_else(|| anyhow!("No SHA-256 recorded for shared file {}", name));
+        Ok(SharedHashes {
+            compiled: hash("model.compiled")?,
+            pk: hash("pk.key")?,
+            vk: hash("vk.key")?,
+            settings: hash("settings.json")?,
+            srs: hash(SRS_FILE)?,
+        })
+    }
+}
+
+/// Files of one address's proof, all inside its artifact directory
+pub struct ProofArtifacts {
+    pub input: PathBuf,
+    pub witness: PathBuf,
+    pub proof: PathBuf,
+    pub vk: PathBuf,
+    pub settings: PathBuf,
+    pub contract_dir: PathBuf,
+    pub verifier: PathBuf,
+    pub calldata: PathBuf,
+    pub log: PathBuf,
+}
+
+impl ProofArtifacts {
+    pub fn new(dir: &Path) -> Self {
+        let contract_dir = dir.join("contract");
+        ProofArtifacts {
+            input: dir.join("input.json"),
+            witness: dir.join("witness.json"),
+            proof: dir.join("proof.json"),
+            vk: dir.join("vk.key"),
+            settings: dir.join("settings.json"),
+            verifier: contract_dir.join("verifier.sol"),
+            calldata: contract_dir.join("calldata.json"),
+            log: dir.join(LOG_FILE),
+            contract_dir,
+        }
+    }
+}
+
+/// An ezkl subcommand run for each address
+#[derive(Clone, Copy, Debug)]
+pub enum Stage {
+    GenWitness,
+    Prove,
+    Verify,
+    CreateEvmVerifier,
+    EncodeEvmCalldata,
+}
+
+impl fmt::Display for Stage {
+    fn fmt(&self, f: &mut fmt::Formatter) -> fmt::Result {
+        f.write_str(match self {
+            Stage::GenWitness => "gen-witness",
+            Stage::Prove => "prove",
+            Stage::Verify => "verify",
+            Stage::CreateEvmVerifier => "create-evm-verifier",
+            Stage::EncodeEvmCalldata => "encode-evm-calldata",
+        })
+    }
+}
+
+/// Runs the per-address EZKL stages directly, without shell launchers.
+///
+/// The ezkl binary and the shared circuit files are checked once when the runner
+/// is created, and every address then costs one ezkl process per stage. The shared
+/// files' hashes come from initialize_shared_resources, so skipping up-to-date
+/// stages only costs hashing the small per-address files.
+pub struct StageRunner {
+    ezkl: PathBuf,
+    shared: SharedCircuit,
+    hashes: SharedHashes,
+}
+
+impl StageRunner {
+    pub fn new(shared_dir: &Path, hashes: SharedHashes) -> Result<Self> {
+        let ezkl = which::which("ezkl")
+            .map_err(|_| anyhow!("EZKL command not found in PATH. Please install EZKL: https://github.com/zkonduit/ezkl"))?;
+        let shared = SharedCircuit::new(shared_dir);
+        for path in [&shared.compiled, &shared.pk, &shared.vk, &shared.settings, &shared.srs] {
+            if !path.exists() {
+                return Err(anyhow!("Shared circuit file {} not found. Run run_ezkl_common.sh first.", path.display()));
+            }
+        }
+        Ok(StageRunner { ezkl, shared, hashes })
+    }
+
+    /// Runs one ezkl stage with its output streamed to the log at `log_path`.
+    ///
+    /// The log is truncated when the first stage of a run opens it. stdout and
+    /// stderr are both copied there line by line, keeping only the last lines of
+    /// the combined output in memory for the error message, so memory stays flat
+    /// however much a stage prints.
+    fn run(&self, stage: Stage, args: &[&OsStr], log: &mut Option<File>, log_path: &Path) -> Result<()> {
+        let log = match log {
+            Some(log) => log,
+            None => log.insert(File::create(log_path).context(format!("Failed to create {}", log_path.display()))?),
+        };
+        writeln!(log, "== ezkl {} ==", stage)?;
+        let mut child = Command::new(&self.ezkl)
+            .arg(stage.to_string())
+            .args(args)
+            .stdout(Stdio::piped())
+            .stderr(Stdio::piped())
+            .spawn()
+            .context(format!("Failed to execute ezkl {}", stage))?;
+
+        let stdout = child.stdout.take().ok_or_else(|| anyhow!("ezkl {} stdout is not available", stage))?;
+        let stderr = child.stderr.take().ok_or_else(|| anyhow!("ezkl {} stderr is not available", stage))?;
+        let output = Mutex::new(StageOutput { log, tail: VecDeque::with_capacity(OUTPUT_TAIL_LINES) });
+        let copied = thread::scope(|scope| {
+            let stderr = scope.spawn(|| copy_lines(stderr, &output));
+            let stdout = copy_lines(stdout, &output);
+            stdout.and(stderr.join().expect("stderr reader panicked"))
+        });
+        let status = child.wait().context(format!("Failed to wait for ezkl {}", stage))?;
+        copied.context(format!("Failed to write {}", log_path.display()))?;
+
+        if !status.success() {
+            let tail = Vec::from(output.into_inner().expect("output lock poisoned").tail).join("\n");
+            return Err(anyhow!("ezkl {} failed ({}), full output in {}:\n{}",
+                stage, status, log_path.display(), tail.trim()));
+        }
+        Ok(())
+    }
+
+    /// Generates, proves and verifies the proof for the input.json in `dir`.
+    ///
+    /// The shared verification key and settings are linked into `dir` so the
+    /// proof directory verifies on its own; `generate_contract` also writes the
+    /// Solidity verifier and calldata to `dir/contract/`. Each stage is recorded in
+    /// `manifest` and skipped when its inputs and outputs are unchanged since it
+    /// last ran. Returns whether any stage ran.
+    pub fn prove(&self, dir: &Path, generate_contract: bool, manifest: &mut StepManifest) -> Result<bool> {
+        let (shared, hashes) = (&self.shared, &self.hashes);
+        let proof = ProofArtifacts::new(dir);
+        // Opened by the first stage that runs, so a run that skips everything keeps the previous log
+        let mut log = None;
+        let log = &mut log;
+
+        let input = sha256_file(&proof.input)?;
+        let mut ran = manifest.run(&Stage::GenWitness.to_string(),
+            &[("input.json", &input), ("model.compiled", &hashes.compiled)],
+            &[&proof.witness],
+            || self.run(Stage::GenWitness, &[
+                "-D".as_ref(), proof.input.as_os_str(),
+                "-M".as_ref(), shared.compiled.as_os_str(),
+                "-O".as_ref(), proof.witness.as_os_str(),
+            ], log, &proof.log))?;
+
+        let witness = sha256_file(&proof.witness)?;
+        ran |= manifest.run(&Stage::Prove.to_string(),
+            &[("witness.json", &witness), ("model.compiled", &hashes.compiled), ("pk.key", &hashes.pk),
+                ("kzg.srs", &hashes.srs)],
+            &[&proof.proof],
+            || self.run(Stage::Prove, &[
+                "--witness".as_ref(), proof.witness.as_os_str(),
+                "--proof-path".as_ref(), proof.proof.as_os_str(),
+                "--pk-path".as_ref(), shared.pk.as_os_str(),
+                "--compiled-circuit".as_ref(), shared.compiled.as_os_str(),
+                "--srs-path".as_ref(), shared.srs.as_os_str(),
+            ], log, &proof.log))?;
+
+        let proof_hash = sha256_file(&proof.proof)?;
+        ran |= manifest.run(&Stage::Verify.to_string(),
+            &[("proof.json", &proof_hash), ("vk.key", &hashes.vk), ("settings.json", &hashes.settings),
+                ("kzg.srs", &hashes.srs)],
+            &[&proof.vk, &proof.settings],
+            || {
+                link_or_copy(&shared.vk, &proof.vk)?;
+                link_or_copy(&shared.settings, &proof.settings)?;
+                self.run(Stage::Verify, &[
+                    "--proof-path".as_ref(), proof.proof.as_os_str(),
+                    "--vk-path".as_ref(), proof.vk.as_os_str(),
+                    "--srs-path".as_ref(), shared.srs.as_os_str(),
+                    "--settings-path".as_ref(), proof.settings.as_os_str(),
+                ], log, &proof.log)
+            })?;
+
+        if generate_contract {
+            ran |= manifest.run(&Stage::CreateEvmVerifier.to_string(),
+                &[("vk.key", &hashes.vk), ("settings.json", &hashes.settings), ("kzg.srs", &hashes.srs)],
+                &[&proof.verifier],
+                || {
+                    fs::create_dir_all(&proof.contract_dir)?;
+                    self.run(Stage::CreateEvmVerifier, &[
+                        "--settings-path".as_ref(), proof.settings.as_os_str(),
+                        "--vk-path".as_ref(), proof.vk.as_os_str(),
+                        "--srs-path".as_ref(), shared.srs.as_os_str(),
+                        "--sol-code-path".as_ref(), proof.verifier.as_os_str(),
+                    ], log, &proof.log)
+                })?;
+
+            ran |= manifest.run(&Stage::EncodeEvmCalldata.to_string(),
+                &[("proof.json", &proof_hash)],
+                &[&proof.calldata],
+                || self.run(Stage::EncodeEvmCalldata, &[
+                    "--proof-path".as_ref(), proof.proof.as_os_str(),
+                    "--calldata-path".as_ref(), proof.calldata.as_os_str(),
+                ], log, &proof.log))?;
+        }
+        Ok(ran)
+    }
+}
+
+/// Log of one stage and the last lines of its output, shared by the stdout and stderr readers
+struct StageOutput<'a> {
+    log: &'a mut File,
+    tail: VecDeque<String>,
+}
+
+/// Copies `stream` line by line into `output`. Reading goes on to the end after a
+/// failed write, so the stage never blocks on a full pipe; the first error is returned.
+fn copy_lines(stream: impl Read, output: &Mutex<StageOutput>) -> io::Result<()> {
+    let mut result = Ok(());
+    for line in BufReader::new(stream).split(b'\n') {
+        let line = line?;
+        let mut output = output.lock().expect("output lock poisoned");
+        if result.is_ok() {
+            result = output.log.write_all(&line).and_then(|_| output.log.write_all(b"\n"));
+        }
+        if output.tail.len() == OUTPUT_TAIL_LINES {
+            output.tail.pop_front();
+        }
+        output.tail.push_back(String::from_utf8_lossy(&line).into_owned());
+    }
+    result
+}
+
+/// Hard-links `from` to `to`, replacing `to`, and copies when linking is not possible
+fn link_or_copy(from: &Path, to: &Path) -> Result<()> {
+    if to.exists() {
+        fs::remove_file(to)?;
+    }
+    if fs::hard_link(from, to).is_err() {
+        fs::copy(from, to).context(format!("Failed to copy {} to {}", from.display(), to.display()))?;
+    }
+    Ok(())
+}
+
+#[cfg(all(test, unix))]
+mod tests {
+    use super::*;
+    use std::os::unix::fs::PermissionsExt;
+
+    /// Stands in for ezkl: logs each stage, fails it with the contents of a
+    /// fail_<stage> file on stdout or a fail_<stage>.err file on stderr if one
+    /// exists, and writes its process id to the files named by the output flags, so
+    /// every run produces new outputs
+    const FAKE_EZKL: &str = r#"#!/bin/sh
+root=$(dirname "$0")
+stage=$1
+echo "$stage" >> "$root/stages.log"
+[ -e "$root/fail_$stage" ] && { cat "$root/fail_$stage"; exit 1; }
+[ -e "$root/fail_$stage.err" ] && { cat "$root/fail_$stage.err" >&2; exit 1; }
+while [ $# -gt 0 ]; do
+    case "$stage $1" in
+        *" -O"|"prove --proof-path"|*" --sol-code-path"|*" --calldata-path") echo $$ > "$2";;
+    esac
+    shift
+done
+"#;
+
+    fn runner(name: &str) -> (StageRunner, PathBuf) {
+        let root = std::env::temp_dir().join(format!("ezkl_stages_{}_{}", name, std::process::id()));
+        let _ = fs::remove_dir_all(&root);
+        let shared_dir = root.join("shared");
+        fs::create_dir_all(&shared_dir).unwrap();
+        let shared = SharedCircuit::new(&shared_dir);
+        for path in [&shared.compiled, &shared.pk, &shared.vk, &shared.settings, &shared.srs] {
+            fs::write(path, "shared").unwrap();
+        }
+        let ezkl = root.join("ezkl");
+        fs::write(&ezkl, FAKE_EZKL).unwrap();
+        fs::set_permissions(&ezkl, fs::Permissions::from_mode(0o755)).unwrap();
+        let hashes = hash_shared(&shared);
+        (StageRunner { ezkl, shared, hashes }, root)
+    }
+
+    fn hash_shared(shared: &SharedCircuit) -> SharedHashes {
+        let files = [&shared.compiled, &shared.pk, &shared.vk, &shared.settings, &shared.srs].iter()
+            .map(|path| (path.file_name().unwrap().to_string_lossy().into_owned(), sha256_file(path).unwrap()))
+            .collect();
+        SharedHashes::from_files(&files).unwrap()
+    }
+
+    /// Creates an address directory holding an input.json
+    fn address(root: &Path) -> PathBuf {
+        let dir = root.join("address");
+        fs::create_dir_all(&dir).unwrap();
+        fs::write(dir.join("input.json"), "input").unwrap();
+        dir
+    }
+
+    fn stages_run(root: &Path) -> Vec<String> {
+        let log = root.join("stages.log");
+        let stages = fs::read_to_string(&log).unwrap_or_default().lines().map(String::from).collect();
+        let _ = fs::remove_file(log);
+        stages
+    }
+
+    #[test]
+    fn test_stages_run_in_order_with_shared_files_linked() {
+        let (runner, root) = runner("order");
+        let dir = address(&root);
+        assert!(runner.prove(&dir, true, &mut StepManifest::load(&dir)).unwrap());
+
+        assert_eq!(stages_run(&root),
+            ["gen-witness", "prove", "verify", "create-evm-verifier", "encode-evm-calldata"]);
+        let proof = ProofArtifacts::new(&dir);
+        assert_eq!(fs::read_to_string(&proof.vk).unwrap(), "shared");
+        assert!(proof.witness.exists() && proof.proof.exists() && proof.calldata.exists());
+        fs::remove_dir_all(root).unwrap();
+    }
+
+    #[test]
+    fn test_failed_stage_reports_its_output_tail_and_logs_only_the_latest_run() {
+        let (runner, root) = runner("failure");
+        let dir = address(&root);
+        let stdout: String = (1..=100).map(|i| format!("line {}\n", i)).collect();
+        fs::write(root.join("fail_prove"), &stdout).unwrap();
+
+        let error = runner.prove(&dir, false, &mut StepManifest::load(&dir)).unwrap_err().to_string();
+        let lines: Vec<_> = error.lines().collect();
+        assert!(lines[0].starts_with("ezkl prove failed"), "{}", error);
+        assert_eq!(lines[1..], (81..=100).map(|i| format!("line {}", i)).collect::<Vec<_>>()[..]);
+        let log = fs::read_to_string(dir.join(LOG_FILE)).unwrap();
+        assert_eq!(log, format!("== ezkl gen-witness ==\n== ezkl prove ==\n{}", stdout));
+        assert_eq!(stages_run(&root), ["gen-witness", "prove"]);
+
+        // The next run starts a new log, and stderr reaches it and the error too
+        fs::write(dir.join("input.json"), "new input").unwrap();
+        fs::write(root.join("fail_gen-witness.err"), "witness error\n").unwrap();
+        let error = runner.prove(&dir, false, &mut StepManifest::load(&dir)).unwrap_err().to_string();
+        assert!(error.ends_with(":\nwitness error"), "{}", error);
+        let log = fs::read_to_string(dir.join(LOG_FILE)).unwrap();
+        assert_eq!(log, "== ezkl gen-witness ==\nwitness error\n");
+        fs::remove_dir_all(root).unwrap();
+    }
+
+    #[test]
+    fn test_up_to_date_stages_are_skipped() {
+        let (runner, root) = runner("incremental");
+        let dir = address(&root);
+        let prove = |runner: &StageRunner| runner.prove(&dir, true, &mut StepManifest::load(&dir)).unwrap();
+        prove(&runner);
+        stages_run(&root);
+
+        let log = fs::read_to_string(dir.join(LOG_FILE)).unwrap();
+        assert!(!prove(&runner));
+        assert!(stages_run(&root).is_empty());
+        assert_eq!(fs::read_to_string(dir.join(LOG_FILE)).unwrap(), log);
+
+        // A new proving key invalidates the proof and everything derived from it
+        fs::write(&runner.shared.pk, "new key").unwrap();
+        let runner = StageRunner { hashes: hash_shared(&runner.shared), ..runner };
+        assert!(prove(&runner));
+        assert_eq!(stages_run(&root), ["prove", "verify", "encode-evm-calldata"]);
+
+        // So does a deleted output
+        fs::remove_file(dir.join("witness.json")).unwrap();
+        prove(&runner);
+        assert_eq!(stages_run(&root), ["gen-witness", "prove", "verify", "encode-evm-calldata"]);
+        fs::remove_dir_all(root).unwrap();
+    }
+}
@@ -1,19 +1,23 @@
+mod bulk;
+mod ezkl_stages;
+mod model_worker;
 mod proof_registry;
 mod script_generator;
+mod step_manifest;
 mod utils;
 
 use anyhow::{Result, anyhow};
 use std::path::Path;
 use std::fs;
-use std::process::Command;
 use synthetic_data::{
     generate_synthetic_data_with_test_addresses,
     save_data_as_json
 };
 
-use crate::proof_registry::create_proof_registry;
-use crate::script_generator::{initialize_shared_resources, create_address_input, create_ezkl_script, run_ezkl_process, PROOF_GEN_DIR};
-use crate::utils::{address_to_filename, get_features_for_address};
+use crate::ezkl_stages::StageRunner;
+use crate::model_worker::ModelWorker;
+use crate::script_generator::{initialize_shared_resources, prove_address, PROOF_GEN_DIR};
+use crate::utils::{get_features_for_address, Layout};
 
 const CONTRACTS_SRC_PATH: &str = "../../contracts/src";
 const CONTRACTS_SCRIPT_PATH: &str = "../../contracts/script";
@@ -23,7 +27,55 @@ const LOW_TIER_ADDRESS: &str = "0x2222222222222222222222222222222222222222";
 const MEDIUM_TIER_ADDRESS: &str = "0x276ef71c8F12508d187E7D8Fcc2FE6A38a5884B1";
 const HIGH_TIER_ADDRESS: &str = "0x4444444444444444444444444444444444444444";
 
+/// Concurrent provers by default. ezkl prove already uses every core and loads
+/// pk.key into each process, so more workers mostly add memory.
+const DEFAULT_WORKERS: usize = 1;
+
+const USAGE: &str = "Usage: ezkl [--addresses <file>] [--workers <n>]
+
+Without --addresses, proves the three test addresses and copies the medium tier
+verifier and calldata to the contracts repo.
+
+  --addresses <file>  prove every address in <file>: one address per line (features
+                      from the synthetic data) or JSON records {\"address\": .., \"features\": [..]}
+  --workers <n>       addresses proved concurrently with --addresses (default: 1); each
+                      runs its own multi-threaded ezkl prove with its own copy of pk.key";
+
+/// Command-line options
+struct Options {
+    addresses: Option<String>,
+    workers: usize,
+}
+
+impl Options {
+    fn parse(mut args: impl Iterator<Item = String>) -> Result<Options> {
+        let mut options = Options {
+            addresses: None,
+            workers: DEFAULT_WORKERS,
+        };
+        while let Some(arg) = args.next() {
+            let mut value = || args.next().ok_or_else(|| anyhow!("{} needs a value\n\n{}", arg, USAGE));
+            match arg.as_str() {
+                "--addresses" => options.addresses = Some(value()?),
+                "--workers" => {
+                    options.workers = value()?.parse()
+                        .ok().filter(|&n| n > 0)
+                        .ok_or_else(|| anyhow!("--workers must be a positive number"))?;
+                }
+                "-h" | "--help" => {
+                    println!("{}", USAGE);
+                    std::process::exit(0);
+                }
+                _ => return Err(anyhow!("Unexpected argument '{}'\n\n{}", arg, USAGE)),
+            }
+        }
+        Ok(options)
+    }
+}
+
 fn main() -> Result<()> {
+    let options = Options::parse(std::env::args().skip(1))?;
+
     // Create directories for artifacts
     fs::create_dir_all(PROOF_GEN_DIR)?;
     fs::create_dir_all("script")?;
@@ -41,68 +93,40 @@ fn main() -> Result<()> {
         HIGH_TIER_ADDRESS,
     ];
 
-    // Step 2: Generate a shared model once before processing addresses
+    // Start one model worker for the whole run instead of a Python process per call
+    let mut model_worker = ModelWorker::spawn()?;
+
+    // Step 2: Generate the shared model, settings, circuit and keys, reused while the
+    // model and the EZKL version are unchanged
     println!("Generating shared credit model...");
     let sample_address = test_addresses[0];
     let sample_features = get_features_for_address(&data, sample_address)?;
-    initialize_shared_resources(&sample_features, sample_address)?;
-
-    // Step 3: Set up common EZKL resources
-    println!("Setting up common EZKL resources...");
-    let status = Command::new("sh")
-        .arg("./run_ezkl_common.sh")
-        .arg("proof_generation/credit_model.onnx")  // model path
-        .arg("proof_generation")                    // output dir
-        .arg("proof_generation/kzg.srs")           // srs path
-        .status()?;
-
-    if !status.success() {
-        return Err(anyhow!("Failed to run common EZKL setup"));
+    let shared_hashes = initialize_shared_resources(&mut model_worker, &sample_features, sample_address)?;
+
+    // Step 3: Generate proofs for each test address, or for the address file in bulk mode
+    let layout = Layout::detect(Path::new(PROOF_GEN_DIR))?;
+    let runner = StageRunner::new(Path::new(PROOF_GEN_DIR), shared_hashes)?;
+    if let Some(addresses) = &options.addresses {
+        return bulk::prove_addresses(&runner, Path::new(addresses), &data, Path::new(PROOF_GEN_DIR), layout,
+            options.workers);
     }
-    println!("[SUCCESS] Common EZKL setup completed successfully");
-
-    // Step 4: Generate proofs for each test address
     for address in &test_addresses {
         println!("Generating proof for address: {}", address);
 
-        // Create a subdirectory for this address
-        let address_dir = format!("{}/{}", PROOF_GEN_DIR, address_to_filename(address));
-        fs::create_dir_all(&address_dir)?;
-
         // Get features for this address
         let address_features = get_features_for_address(&data, address)?;
 
-        // Get score and determine tier classification
-        let score = {
-            let mapping = data.address_mapping.as_ref().unwrap();
-            let index = mapping.get(&address.to_string()).unwrap();
-            data.scores[*index]
-        };
-        let tier = if score < 0.4 {
-            "LOW"
-        } else if score < 0.8 {
-            "MEDIUM"
-        } else {
-            "HIGH"
-        };
-        println!("Credit score for address {}: {:.3} ({})", address, score, tier);
-
-        // Generate input.json for this address (using the shared model)
-        create_address_input(&address_features, address, &address_dir)?;
+        // Get the model score and tier classification that the proof will attest
+        let model_score = model_worker.score(&address_features)?;
+        println!("Credit score for address {}: {:.3} ({}, scaled {}, favorable rate: {})",
+            address, model_score.score, model_score.tier, model_score.scaled_score, model_score.eligible);
 
-        // Generate proof with EZKL
-        println!("Processing with EZKL...");
-        let script_path = Path::new(&address_dir).join("run_ezkl.sh");
+        // Write input.json, prove it with the shared circuit and register the proof
+        let address_dir = utils::address_dir(Path::new(PROOF_GEN_DIR), address, layout);
         let is_medium_tier = *address == MEDIUM_TIER_ADDRESS;
-        create_ezkl_script(&script_path, &address_dir, is_medium_tier)?;
-
-        // Run EZKL script using the new run_ezkl_process function
-        run_ezkl_process(&script_path)?;
-
-        // Create proof registry entry
-        println!("Creating proof registry entry...");
-        create_proof_registry(address, &address_dir)?;
-        println!("Successfully registered proof for address: {}", address);
+        if prove_address(&runner, address, &address_features, &address_dir, is_medium_tier)? {
+            println!("Successfully registered proof for address: {}", address);
+        }
         println!();
     }
 
@@ -111,21 +135,22 @@ fn main() -> Result<()> {
     fs::create_dir_all(CONTRACTS_SRC_PATH)?;
     fs::create_dir_all(CONTRACTS_SCRIPT_PATH)?;
 
-    let medium_dir = format!("{}/{}", PROOF_GEN_DIR, address_to_filename(MEDIUM_TIER_ADDRESS));
+    let medium_dir = utils::address_dir(Path::new(PROOF_GEN_DIR), MEDIUM_TIER_ADDRESS, layout);
     fs::copy(
-        format!("{}/contract/verifier.sol", medium_dir),
+        medium_dir.join("contract/verifier.sol"),
         format!("{}/Halo2Verifier.sol", CONTRACTS_SRC_PATH)
     )?;
 
     fs::copy(
-        format!("{}/contract/calldata.json", medium_dir),
+        medium_dir.join("contract/calldata.json"),
         format!("{}/calldata.json", CONTRACTS_SCRIPT_PATH)
     )?;
 
     println!("Proof generation complete!");
     println!("Generated artifacts:");
     println!(" - Shared credit model in {}/", PROOF_GEN_DIR);
-    println!(" - Proofs for each address in {}/address_dir/", PROOF_GEN_DIR);
+    println!(" - Proofs for each address in {}/{}", PROOF_GEN_DIR,
+        if layout == Layout::Sharded { "ab/cd/<address>/" } else { "<address>/" });
     println!(" - Medium tier address artifacts copied to contracts repo");
 
     Ok(())
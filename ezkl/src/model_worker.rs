@@ -0,0 +1,102 @@
+use anyhow::{Result, Context, anyhow};
+use serde::Deserialize;
+use serde_json::{json, Value};
+use std::io::{BufRead, BufReader, Write};
+use std::process::{Child, ChildStdin, ChildStdout, Command, Stdio};
+
+pub const MODEL_SCRIPT: &str = "./script/create_model.py";
+
+/// Score and tier computed by the credit model for one address
+#[derive(Debug, Deserialize)]
+pub struct ModelScore {
+    pub score: f64,
+    pub scaled_score: i64,
+    pub tier: String,
+    pub eligible: bool,
+}
+
+/// Long-lived `create_model.py --serve` process.
+///
+/// The worker loads the model once and answers one JSON line per request,
+/// so repeated scoring and exports avoid a Python start-up each time.
+pub struct ModelWorker {
+    child: Child,
+    stdin: ChildStdin,
+    stdout: BufReader<ChildStdout>,
+}
+
+impl ModelWorker {
+    /// Start the worker; its progress output is forwarded to our stderr
+    pub fn spawn() -> Result<Self, anyhow::Error> {
+        let mut child = Command::new("python3")
+            .arg(MODEL_SCRIPT)
+            .arg("--serve")
+            .stdin(Stdio::piped())
+            .stdout(Stdio::piped())
+            .stderr(Stdio::inherit())
+            .spawn()
+            .context("Failed to start model worker")?;
+
+        let stdin = child.stdin.take()
+            .ok_or_else(|| anyhow!("Model worker stdin is not available"))?;
+        let stdout = child.stdout.take()
+            .ok_or_else(|| anyhow!("Model worker stdout is not available"))?;
+
+        let mut worker = ModelWorker { child, stdin, stdout: BufReader::new(stdout) };
+        worker.request(&json!({ "op": "ping" }))
+            .context("Model worker did not start correctly")?;
+        Ok(worker)
+    }
+
+    /// Send one request and wait for its response line
+    fn request(&mut self, request: &Value) -> Result<Value, anyhow::Error> {
+        let mut line = serde_json::to_string(request)?;
+        line.push('\n');
+        self.stdin.write_all(line.as_bytes())
+            .and_then(|_| self.stdin.flush())
+            .context("Failed to send request to model worker")?;
+
+        let mut response = String::new();
+        let read = self.stdout.read_line(&mut response)
+            .context("Failed to read response from model worker")?;
+        if read == 0 {
+            return Err(anyhow!("Model worker exited unexpectedly"));
+        }
+
+        let response: Value = serde_json::from_str(&response)
+            .context("Model worker sent an invalid response")?;
+        if response["ok"].as_bool() != Some(true) {
+            let error = response["error"].as_str().unwrap_or("unknown error");
+            return Err(anyhow!("Model worker request failed: {}", error));
+        }
+        Ok(response)
+    }
+
+    /// Score a feature vector without writing any files
+    pub fn score(&mut self, features: &[f32]) -> Result<ModelScore, anyhow::Error> {
+        let response = self.request(&json!({ "op": "score", "features": features }))?;
+        Ok(serde_json::from_value(response)?)
+    }
+
+    /// Write the EZKL input files for an address, optionally exporting the ONNX model
+    pub fn export(&mut self, features: &[f32], address: &str, output_dir: &str, generate_model: bool) -> Result<ModelScore, anyhow::Error> {
+        let response = self.request(&json!({
+            "op": "export",
+            "features": features,
+            "address": address,
+            "output_dir": output_dir,
+            "generate_model": generate_model,
+        }))?;
+        Ok(serde_json::from_value(response)?)
+    }
+}
+
+impl Drop for ModelWorker {
+    fn drop(&mut self) {
+        // Ask the worker to exit; it also stops on its own once stdin closes
+        if self.request(&json!({ "op": "shutdown" })).is_err() {
+            let _ = self.child.kill();
+        }
+        let _ = self.child.wait();
+    }
+}
@@ -1,23 +1,31 @@
 use anyhow::{Result, Context};
 use std::fs;
-use std::path::Path;
+use std::path::{Path, PathBuf};
+
+use crate::utils::{shard_dir, write_renamed, Layout};
+
+/// Path of the registry entry for the given address, in the shard the registry's layout assigns
+pub fn registry_path(address: &str) -> Result<PathBuf, anyhow::Error> {
+    let registry_dir = Path::new("proof_registry");
+    Ok(shard_dir(registry_dir, address, Layout::detect(registry_dir)?).join(format!("{}.json", address)))
+}
 
 /// Creates a proof registry entry for the given address
-/// Returns a boolean indicating success
+/// Returns a boolean indicating success. The entry is renamed into place but not
+/// fsynced; prove_address syncs its directory once the address is done
 pub fn create_proof_registry(address: &str, proof_dir: &str) -> Result<bool, anyhow::Error> {
     // Read the proof from the proof directory
     let proof_path = format!("{}/proof.json", proof_dir);
     let proof_data = fs::read_to_string(Path::new(&proof_path))
         .context(format!("Failed to read proof data from {}", proof_path))?;
     
-    // Store the proof in the registry directory
-    let registry_dir = "proof_registry";
-    fs::create_dir_all(registry_dir)?;
-    
-    // Save the proof with the address as the filename
-    let registry_path = format!("{}/{}.json", registry_dir, address);
-    fs::write(&registry_path, &proof_data)
-        .context(format!("Failed to write proof to registry at {}", registry_path))?;
+    // Store the proof in the registry directory with the address as the filename
+    let registry_path = registry_path(address)?;
+    if let Some(shard) = registry_path.parent() {
+        fs::create_dir_all(shard)?;
+    }
+    write_renamed(&registry_path, proof_data.as_bytes())
+        .context(format!("Failed to write proof to registry at {}", registry_path.display()))?;
     
     Ok(true)
 }
@@ -1,19 +1,77 @@
-use anyhow::{Result, Context, anyhow};
-use std::path::Path;
+use anyhow::{Result, Context};
+use std::path::{Path, PathBuf};
 use std::process::Command;
 use std::fs;
 use colored::*;
+use serde::{Deserialize, Serialize};
+use std::collections::BTreeMap;
+
+use crate::ezkl_stages::{ProofArtifacts, SharedHashes, StageRunner};
+use crate::model_worker::ModelWorker;
+use crate::proof_registry::{create_proof_registry, registry_path};
+use crate::step_manifest::StepManifest;
+use crate::utils::{sha256_file, sync_dir, write_atomic, write_renamed, FileStat};
 
 pub const MODEL_NAME: &str = "credit_model.onnx";
 pub const PROOF_GEN_DIR: &str = "proof_generation";
 pub const SRS_FILE: &str = "kzg.srs";
+pub const CALIBRATION_SCRIPT: &str = "./script/calibration_data.py";
+pub const CALIBRATION_INPUT: &str = "calibration.json";
+pub const SCALE_SWEEP_SCRIPT: &str = "./script/scale_sweep.py";
+pub const SCALING_ANALYSIS: &str = "scaling_analysis.json";
+pub const SHARED_RESOURCES_FILE: &str = "shared_resources.json";
+const SHARED_STAGING_DIR: &str = "shared.tmp";
+
+/// Bits added to the swept input and param scales before they are pinned. The sweep
+/// only estimates ezkl's fixed-point arithmetic, and one extra bit covers the
+/// rescaling and lookup rounding it does not model.
+const SCALE_MARGIN: u64 = 1;
+
+/// Shared files rebuilt together whenever the model or the EZKL version changes
+const SHARED_RESOURCES: [&str; 4] = ["settings.json", "model.compiled", "pk.key", "vk.key"];
+
+/// What the shared settings, circuit and keys were built from
+#[derive(Debug, PartialEq, Serialize, Deserialize)]
+struct SharedResourcesKey {
+    model_sha256: String,
+    ezkl_version: String,
+}
+
+/// Contents of shared_resources.json: the build key, the logrows of the settings and
+/// the SRS, and the SHA-256 of each shared file including kzg.srs. A file whose
+/// size and modification time still match `stats` is taken to have its recorded
+/// hash, so a warm start does not read pk.key and kzg.srs again.
+#[derive(Serialize, Deserialize)]
+struct SharedResources {
+    #[serde(flatten)]
+    key: SharedResourcesKey,
+    logrows: u64,
+    files: BTreeMap<String, String>,
+    // Missing from files written before it was added; those are rehashed once
+    #[serde(default)]
+    stats: BTreeMap<String, FileStat>,
+}
 
-// Define shell script paths
-pub const SHELL_SCRIPTS: &[&str] = &[
-    "./run_ezkl.sh",
-    "./run_ezkl_common.sh",
-    "./run_ezkl_individual.sh"
-];
+impl SharedResources {
+    /// True if `name` in `dir` still has its recorded hash, rehashing it only
+    /// when its size or modification time changed
+    fn file_matches(&self, dir: &Path, name: &str) -> bool {
+        let path = dir.join(name);
+        let Some(recorded) = self.files.get(name) else { return false };
+        if FileStat::of(&path).is_ok_and(|stat| self.stats.get(name) == Some(&stat)) {
+            return true;
+        }
+        sha256_file(&path).is_ok_and(|hash| &hash == recorded)
+    }
+
+    /// Records the current size and modification time of every file in `files`
+    fn record_stats(&mut self, dir: &Path) -> Result<(), anyhow::Error> {
+        self.stats = self.files.keys()
+            .map(|name| Ok((name.clone(), FileStat::of(&dir.join(name))?)))
+            .collect::<Result<_, anyhow::Error>>()?;
+        Ok(())
+    }
+}
 
 /// Log a status message with timestamp
 fn log_status(message: &str) {
@@ -31,7 +89,6 @@ fn log_error(message: &str) {
 }
 
 /// Log a warning message
-#[allow(dead_code)]
 fn log_warning(message: &str) {
     println!("[WARNING] {}", message.yellow());
 }
@@ -41,8 +98,15 @@ fn log_info(message: &str) {
     println!("[INFO] {}", message.blue());
 }
 
-/// Creates the shared model and downloads SRS file if needed
-pub fn initialize_shared_resources(features: &[f32], address: &str) -> Result<(), anyhow::Error> {
+/// Creates the shared model, settings, compiled circuit and keys, and downloads SRS file if needed.
+///
+/// Settings, circuit and keys are keyed by the model's SHA-256 and the EZKL version in
+/// shared_resources.json, and reused while the key matches and the files are unchanged.
+/// Otherwise they are rebuilt in a staging directory and moved into place, with the key
+/// written last, so an interrupted rebuild is never mistaken for a finished one. The SRS
+/// is kept across rebuilds only while the calibrated logrows stays the same. Returns the
+/// hashes of the shared files, so they are not hashed again for the stage runner.
+pub fn initialize_shared_resources(worker: &mut ModelWorker, features: &[f32], address: &str) -> Result<SharedHashes, anyhow::Error> {
     log_status("Initializing shared resources...");
     
     // Ensure proof_generation directory exists
@@ -58,7 +122,7 @@ pub fn initialize_shared_resources(features: &[f32], address: &str) -> Result<()
     let model_path = Path::new(PROOF_GEN_DIR).join(MODEL_NAME);
     if !model_path.exists() {
         log_status("Generating shared model...");
-        match create_model(features, address, PROOF_GEN_DIR, true) {
+        match create_model(worker, features, address, PROOF_GEN_DIR, true) {
             Ok(_) => log_success("Shared model created successfully"),
             Err(e) => {
                 log_error(&format!("Failed to create shared model: {}", e));
@@ -69,27 +133,63 @@ pub fn initialize_shared_resources(features: &[f32], address: &str) -> Result<()
         log_info(&format!("Shared model already exists at {}", model_path.display()));
     }
 
-    // Get absolute paths
-    let model_path_abs = fs::canonicalize(&model_path)?;
-    let model_path_str = model_path_abs.to_string_lossy().into_owned();
-    
-    // Generate settings file
-    log_status("Generating settings file...");
-    let settings_path = Path::new(PROOF_GEN_DIR).join("settings.json");
-    
     let ezkl_bin = which::which("ezkl").map_err(|_| {
         log_error("EZKL command not found in PATH. Make sure EZKL is installed correctly.");
         anyhow::anyhow!("EZKL command not found in PATH. Please install EZKL: https://github.com/zkonduit/ezkl")
     })?;
     
     log_info(&format!("Using EZKL binary at: {}", ezkl_bin.display()));
+
+    let shared_dir = Path::new(PROOF_GEN_DIR);
+    let key = SharedResourcesKey {
+        model_sha256: sha256_file(&model_path)?,
+        ezkl_version: ezkl_version(&ezkl_bin)?,
+    };
+    let mut previous = read_shared_resources(shared_dir);
+    if let Some(current) = previous.as_mut().filter(|previous| shared_resources_current(shared_dir, previous, &key)) {
+        log_info(&format!("Reusing settings, circuit and keys built for this model with {} (logrows {})",
+            key.ezkl_version, current.logrows));
+        // Files that had to be rehashed, e.g. after a copy or a touch, are recorded
+        // again so the next start can skip them
+        let stats = current.stats.clone();
+        current.record_stats(shared_dir)?;
+        if current.stats != stats {
+            write_atomic(&shared_dir.join(SHARED_RESOURCES_FILE), serde_json::to_string_pretty(&current)?.as_bytes())?;
+        }
+        return SharedHashes::from_files(&current.files);
+    }
+    log_status(&format!("Building settings, circuit and keys for this model with {}...", key.ezkl_version));
+    let _ = fs::remove_file(shared_dir.join(SHARED_RESOURCES_FILE));
+    let staging_dir = shared_dir.join(SHARED_STAGING_DIR);
+    let _ = fs::remove_dir_all(&staging_dir);
+    fs::create_dir_all(&staging_dir)?;
+
+    // Get absolute paths
+    let model_path_abs = fs::canonicalize(&model_path)?;
+    let model_path_str = model_path_abs.to_string_lossy().into_owned();
     
-    let output = Command::new(ezkl_bin.clone())
+    // Generate settings file
+    log_status("Generating settings file...");
+    let settings_path = staging_dir.join("settings.json");
+
+    // Use the smallest scales that keep every tier on the synthetic data
+    let scales = recommend_scales(&model_path_str, PROOF_GEN_DIR);
+
+    let mut gen_settings = Command::new(ezkl_bin.clone());
+    gen_settings
         .arg("gen-settings")
         .arg("-M")
         .arg(&model_path_str)
         .arg("-O")
-        .arg(&settings_path)
+        .arg(&settings_path);
+    if let Some((input_scale, param_scale)) = scales {
+        gen_settings
+            .arg("--input-scale")
+            .arg(input_scale.to_string())
+            .arg("--param-scale")
+            .arg(param_scale.to_string());
+    }
+    let output = gen_settings
         .output()
         .context("Failed to execute EZKL gen-settings command")?;
 
@@ -101,20 +201,14 @@ pub fn initialize_shared_resources(features: &[f32], address: &str) -> Result<()
     
     log_success("Settings generated successfully");
 
-    // Create a dummy input.json for calibration
-    create_address_input(features, address, PROOF_GEN_DIR)?;
+    // Calibrate on a stratified set covering every tier instead of one address
+    let input_path = create_calibration_input(PROOF_GEN_DIR)?;
 
     // Calibrate settings
     log_status("Calibrating settings...");
     
-    // First check if input.json exists
-    let input_path = format!("{}/input.json", PROOF_GEN_DIR);
-    if !Path::new(&input_path).exists() {
-        log_error(&format!("Input file not found at: {}", input_path));
-        return Err(anyhow::anyhow!("Input file not found at: {}. Make sure address input was created correctly.", input_path));
-    }
-    
-    let output = Command::new(&ezkl_bin)
+    let mut calibrate_settings = Command::new(&ezkl_bin);
+    calibrate_settings
         .arg("calibrate-settings")
         .arg("-M")
         .arg(&model_path_str)
@@ -122,6 +216,13 @@ pub fn initialize_shared_resources(features: &[f32], address: &str) -> Result<()
         .arg(&input_path)
         .arg("-O")
         .arg(&settings_path)
+        .arg("--target")
+        .arg("resources");
+    if let Some((input_scale, _)) = scales {
+        // Keep calibration from trading the recommended scale for a smaller, inaccurate one
+        calibrate_settings.arg("--scales").arg(input_scale.to_string());
+    }
+    let output = calibrate_settings
         .output()
         .context("Failed to execute EZKL calibrate-settings command")?;
 
@@ -137,10 +238,56 @@ pub fn initialize_shared_resources(features: &[f32], address: &str) -> Result<()
     
     log_success("Settings calibrated successfully");
 
-    // Download SRS file if needed
-    let srs_path = Path::new(PROOF_GEN_DIR).join(SRS_FILE);
-    let settings_path = Path::new(PROOF_GEN_DIR).join("settings.json");
-    
+    // The SRS must match the calibrated logrows, so keep it only if that is unchanged
+    let logrows = settings_logrows(&settings_path)?;
+    let srs_path = shared_dir.join(SRS_FILE);
+    let reused_srs_hash = previous.as_ref()
+        .filter(|previous| previous.logrows == logrows && previous.file_matches(shared_dir, SRS_FILE))
+        .and_then(|previous| previous.files.get(SRS_FILE).cloned());
+    if reused_srs_hash.is_some() {
+        log_info(&format!("SRS file at {} already matches logrows {}", srs_path.display(), logrows));
+    } else {
+        let staged_srs = staging_dir.join(SRS_FILE);
+        download_srs(&ezkl_bin, &settings_path, &staged_srs)?;
+        fs::rename(&staged_srs, &srs_path)
+            .context(format!("Failed to move {} into {}", SRS_FILE, shared_dir.display()))?;
+    }
+
+    // Compile the circuit and generate the keys into the staging directory
+    log_status("Setting up common EZKL resources...");
+    let status = Command::new("sh")
+        .arg("./run_ezkl_common.sh")
+        .arg(&model_path)
+        .arg(&staging_dir)
+        .arg(&srs_path)
+        .status()?;
+    if !status.success() {
+        return Err(anyhow::anyhow!("Failed to run common EZKL setup"));
+    }
+
+    let mut files = BTreeMap::new();
+    for name in SHARED_RESOURCES {
+        let path = shared_dir.join(name);
+        fs::rename(staging_dir.join(name), &path)
+            .context(format!("Failed to move {} into {}", name, shared_dir.display()))?;
+        files.insert(name.to_string(), sha256_file(&path)?);
+    }
+    let srs_hash = match reused_srs_hash {
+        Some(hash) => hash,
+        None => sha256_file(&srs_path)?,
+    };
+    files.insert(SRS_FILE.to_string(), srs_hash);
+    let mut manifest = SharedResources { key, logrows, files, stats: BTreeMap::new() };
+    manifest.record_stats(shared_dir)?;
+    write_atomic(&shared_dir.join(SHARED_RESOURCES_FILE), serde_json::to_string_pretty(&manifest)?.as_bytes())?;
+    fs::remove_dir_all(&staging_dir)?;
+    log_success("Common EZKL setup completed successfully");
+
+    SharedHashes::from_files(&manifest.files)
+}
+
+/// Downloads the SRS file for the given settings if it does not exist yet
+fn download_srs(ezkl_bin: &Path, settings_path: &Path, srs_path: &Path) -> Result<(), anyhow::Error> {
     // Check if settings.json exists before continuing
     if !settings_path.exists() {
         log_error(&format!("Settings file not found at: {}", settings_path.display()));
@@ -151,12 +298,12 @@ pub fn initialize_shared_resources(features: &[f32], address: &str) -> Result<()
         log_status("Downloading SRS file...");
         log_info("This may take a while for large parameters...");
         
-        let output = Command::new(&ezkl_bin)
+        let output = Command::new(ezkl_bin)
             .arg("get-srs")
             .arg("--settings-path")
-            .arg(&settings_path)
+            .arg(settings_path)
             .arg("--srs-path")
-            .arg(&srs_path)
+            .arg(srs_path)
             .output()
             .context("Failed to execute EZKL get-srs command")?;
 
@@ -173,6 +320,109 @@ pub fn initialize_shared_resources(features: &[f32], address: &str) -> Result<()
     Ok(())
 }
 
+/// The installed EZKL version, as printed by `ezkl --version`
+fn ezkl_version(ezkl_bin: &Path) -> Result<String, anyhow::Error> {
+    let output = Command::new(ezkl_bin)
+        .arg("--version")
+        .output()
+        .context("Failed to execute EZKL --version command")?;
+    if !output.status.success() {
+        return Err(anyhow::anyhow!("Failed to get EZKL version: {}", String::from_utf8_lossy(&output.stderr)));
+    }
+    Ok(String::from_utf8_lossy(&output.stdout).trim().to_string())
+}
+
+/// The logrows ezkl calibrated into a settings.json
+fn settings_logrows(settings_path: &Path) -> Result<u64, anyhow::Error> {
+    let settings: serde_json::Value = serde_json::from_str(&fs::read_to_string(settings_path)?)
+        .context(format!("Invalid settings file {}", settings_path.display()))?;
+    settings["run_args"]["logrows"].as_u64()
+        .ok_or_else(|| anyhow::anyhow!("No run_args.logrows in {}", settings_path.display()))
+}
+
+/// shared_resources.json in `dir`, or None if it is missing or unreadable
+fn read_shared_resources(dir: &Path) -> Option<SharedResources> {
+    fs::read_to_string(dir.join(SHARED_RESOURCES_FILE)).ok()
+        .and_then(|json| serde_json::from_str(&json).ok())
+}
+
+/// True if the recorded shared resources in `dir` were built for `key` and their
+/// files, the SRS included, are unchanged since
+fn shared_resources_current(dir: &Path, manifest: &SharedResources, key: &SharedResourcesKey) -> bool {
+    manifest.key == *key && SHARED_RESOURCES.iter().chain([&SRS_FILE])
+        .all(|name| manifest.file_matches(dir, name))
+}
+
+/// Runs the quantization scale sweep and returns its recommended (input_scale, param_scale),
+/// each raised by SCALE_MARGIN.
+///
+/// The full analysis is kept in output_dir/scaling_analysis.json. Returns None, so that
+/// ezkl falls back to its default scales, when the sweep fails or finds no valid scales.
+pub fn recommend_scales(model_path: &str, output_dir: &str) -> Option<(u64, u64)> {
+    log_status("Sweeping quantization scales...");
+
+    let data_path = Path::new(output_dir).join("credit_data.json");
+    let analysis_path = Path::new(output_dir).join(SCALING_ANALYSIS);
+    let output = match Command::new("python3")
+        .arg(SCALE_SWEEP_SCRIPT)
+        .arg(model_path)
+        .arg(&data_path)
+        .arg(&analysis_path)
+        .output()
+    {
+        Ok(output) => output,
+        Err(e) => {
+            log_warning(&format!("Failed to run scale sweep, using default scales: {}", e));
+            return None;
+        }
+    };
+
+    let stdout = String::from_utf8_lossy(&output.stdout);
+    if !output.status.success() {
+        log_warning(&format!("Scale sweep found no scales, using defaults: {}{}",
+            stdout.trim(), String::from_utf8_lossy(&output.stderr).trim()));
+        return None;
+    }
+    log_info(stdout.trim());
+
+    let analysis: serde_json::Value = fs::read_to_string(&analysis_path).ok()
+        .and_then(|contents| serde_json::from_str(&contents).ok())?;
+    let recommended = &analysis["recommended"];
+    let (input_scale, param_scale) = (recommended["input_scale"].as_u64()?, recommended["param_scale"].as_u64()?);
+    log_info(&format!("Sweep recommends input scale {} and param scale {}; using {} and {} for a {}-bit margin",
+        input_scale, param_scale, input_scale + SCALE_MARGIN, param_scale + SCALE_MARGIN, SCALE_MARGIN));
+    Some((input_scale + SCALE_MARGIN, param_scale + SCALE_MARGIN))
+}
+
+/// Samples the multi-row calibration input from credit_data.json in output_dir
+pub fn create_calibration_input(output_dir: &str) -> Result<PathBuf, anyhow::Error> {
+    log_status("Creating calibration input...");
+
+    let data_path = Path::new(output_dir).join("credit_data.json");
+    let input_path = Path::new(output_dir).join(CALIBRATION_INPUT);
+    if !data_path.exists() {
+        log_error(&format!("Credit data not found at: {}", data_path.display()));
+        return Err(anyhow::anyhow!("Credit data not found at: {}", data_path.display()));
+    }
+
+    let output = Command::new("python3")
+        .arg(CALIBRATION_SCRIPT)
+        .arg(&data_path)
+        .arg(&input_path)
+        .output()
+        .context("Failed to execute calibration data script")?;
+
+    if !output.status.success() {
+        let stderr = String::from_utf8_lossy(&output.stderr);
+        log_error(&format!("Failed to create calibration input: {}", stderr));
+        return Err(anyhow::anyhow!("Failed to create calibration input: {}", stderr));
+    }
+
+    log_info(String::from_utf8_lossy(&output.stdout).trim());
+    log_success(&format!("Created calibration input at: {}", input_path.display()));
+    Ok(input_path)
+}
+
 /// Creates address-specific input.json file
 pub fn create_address_input(features: &[f32], address: &str, output_dir: &str) -> Result<(), anyhow::Error> {
     log_status(&format!("Creating input for address: {}", address));
@@ -198,130 +448,101 @@ pub fn create_address_input(features: &[f32], address: &str, output_dir: &str) -
         ]
     });
     
-    // Write the formatted input
+    // Write the formatted input, leaving an identical one untouched
     let input_path = Path::new(output_dir).join("input.json");
-    fs::write(&input_path, serde_json::to_string_pretty(&ezkl_input)?)
+    let contents = serde_json::to_string_pretty(&ezkl_input)?;
+    if fs::read_to_string(&input_path).is_ok_and(|existing| existing == contents) {
+        log_info(&format!("Input file at {} is unchanged", input_path.display()));
+        return Ok(());
+    }
+    write_renamed(&input_path, contents.as_bytes())
         .context("Failed to write input file")?;
 
     log_success(&format!("Created input file at: {}", input_path.display()));
     Ok(())
 }
 
-// Helper function used by initialize_shared_resources
-fn create_model(features: &[f32], address: &str, output_dir: &str, force_generate_model: bool) -> Result<(), anyhow::Error> {
-    // Convert features to JSON string
-    let features_json = serde_json::to_string(features)?;
-    
-    // Call Python script to generate model
-    let status = Command::new("python3")
-        .arg("./script/create_model.py")
-        .arg(output_dir)
-        .arg(address)
-        .arg(&features_json)
-        .arg(if force_generate_model { "1" } else { "0" })
-        .status()
-        .context("Failed to execute Python script")?;
-
-    if !status.success() {
-        return Err(anyhow::anyhow!("Model creation failed with status: {}", status));
+/// Writes the input for one address, runs the EZKL stages on it and registers the proof.
+/// Steps recorded as up to date in the address's step manifest are skipped; returns
+/// whether any step ran. input.json, the registry entry and the manifest are renamed
+/// into place without fsyncs, and their directories are synced once at the end.
+pub fn prove_address(runner: &StageRunner, address: &str, features: &[f32], address_dir: &Path, generate_contract: bool) -> Result<bool, anyhow::Error> {
+    let address_dir_str = address_dir.to_string_lossy();
+    create_address_input(features, address, &address_dir_str)?;
+
+    log_status(&format!("Proving {}...", address));
+    let mut manifest = StepManifest::load(address_dir);
+    let mut ran = runner.prove(address_dir, generate_contract, &mut manifest)
+        .context(format!("Failed to prove {}", address))?;
+
+    let proof = sha256_file(&ProofArtifacts::new(address_dir).proof)?;
+    let registry = registry_path(address)?;
+    ran |= manifest.run("registry", &[("proof.json", &proof)], &[&registry], || {
+        log_status(&format!("Creating proof registry entry for {}...", address));
+        create_proof_registry(address, &address_dir_str).map(|_| ())
+    })?;
+    if ran {
+        sync_dir(address_dir)?;
+        if let Some(shard) = registry.parent() {
+            sync_dir(shard)?;
+        }
+    } else {
+        log_info(&format!("Proof for {} is up to date", address));
     }
-
-    Ok(())
+    Ok(ran)
 }
 
-pub fn create_ezkl_script(script_path: &Path, working_dir: &str, generate_contract: bool) -> Result<(), anyhow::Error> {
-    // Ensure the shared model exists
-    let model_path = Path::new(PROOF_GEN_DIR).join(MODEL_NAME);
-    if !model_path.exists() {
-        return Err(anyhow::anyhow!("Shared model not found at: {}", model_path.display()));
-    }
-
-    // Get absolute paths
-    let working_dir_abs = fs::canonicalize(working_dir)?;
-    let model_path_abs = fs::canonicalize(&model_path)?;
-    let srs_path_abs = fs::canonicalize(Path::new(PROOF_GEN_DIR).join(SRS_FILE))?;
-
-    let working_dir_str = working_dir_abs.to_string_lossy().into_owned();
-    let model_path_str = model_path_abs.to_string_lossy().into_owned();
-    let srs_path_str = srs_path_abs.to_string_lossy().into_owned();
-
-    // Create a launcher bash script that calls the run_ezkl.sh shell script
-    let mut script = if Path::new(SHELL_SCRIPTS[0]).exists() {
-        format!(r#"#!/usr/bin/env bash
-set -e
-
-# First ensure the shell scripts are executable
-chmod +x {} {} {}
-
-# Check if we need to set up common resources
-if [ ! -d "shared_circuit" ] || [ ! -f "shared_circuit/model.compiled" ] || [ ! -f "shared_circuit/pk.key" ] || [ ! -f "shared_circuit/vk.key" ]; then
-    echo "Setting up common circuit resources..."
-    {} "{}" "shared_circuit" "{}"
-fi
-
-# Run the individual proof generation
-{} {} {}"#,
-            SHELL_SCRIPTS[0], SHELL_SCRIPTS[1], SHELL_SCRIPTS[2],
-            SHELL_SCRIPTS[1],
-            model_path_str,
-            srs_path_str,
-            SHELL_SCRIPTS[0],
-            if generate_contract { "--generate-contract" } else { "" },
-            working_dir_str)
-    } else {
-        return Err(anyhow::anyhow!(
-            r#"run_ezkl.sh script not found in the current directory.
-Please ensure run_ezkl.sh, run_ezkl_common.sh, and run_ezkl_individual.sh are in the working directory."#
-        ));
-    };
-    
-    script.push('\n');
+// Helper function used by initialize_shared_resources
+fn create_model(worker: &mut ModelWorker, features: &[f32], address: &str, output_dir: &str, force_generate_model: bool) -> Result<(), anyhow::Error> {
+    // Ask the long-lived Python worker to generate the model
+    worker.export(features, address, output_dir, force_generate_model)
+        .context("Model creation failed")?;
 
-    fs::write(script_path, script).context("Failed to write script file")?;
-    
-    #[cfg(unix)]
-    {
-        use std::os::unix::fs::PermissionsExt;
-        
-        // Set execute permissions on the script and shell scripts
-        let scripts_to_chmod = std::iter::once(script_path)
-            .chain(SHELL_SCRIPTS.iter().map(Path::new));
-        
-        for path in scripts_to_chmod {
-            if path.exists() {
-                let mut perms = fs::metadata(path)?.permissions();
-                perms.set_mode(0o755);
-                fs::set_permissions(path, perms).context("Failed to set permissions")?;
-            }
-        }
-    }
-    
     Ok(())
 }
 
-/// Execute the EZKL shell script and process the results
-pub fn run_ezkl_process(script_path: &Path) -> Result<(), anyhow::Error> {
-    log_status("Processing with EZKL...");
-    
-    // Execute the script with proper error handling
-    let output = Command::new(script_path)
-        .output()
-        .context("Failed to execute EZKL script")?;
-    
-    if !output.status.success() {
-        let stderr = String::from_utf8_lossy(&output.stderr);
-        let stdout = String::from_utf8_lossy(&output.stdout);
-        
-        log_error("EZKL script execution failed");
-        log_error(&format!("stdout: {}", stdout));
-        log_error(&format!("stderr: {}", stderr));
-        
-        return Err(anyhow!("EZKL script failed with status: {}", output.status));
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_shared_resources_reused_only_for_same_key_and_files() {
+        let dir = std::env::temp_dir().join(format!("shared_resources_{}", std::process::id()));
+        let _ = fs::remove_dir_all(&dir);
+        fs::create_dir_all(&dir).unwrap();
+        let key = || SharedResourcesKey { model_sha256: "model".into(), ezkl_version: "ezkl 20.2.0".into() };
+        assert!(read_shared_resources(&dir).is_none());
+
+        let mut files = BTreeMap::new();
+        for name in SHARED_RESOURCES.iter().chain([&SRS_FILE]) {
+            fs::write(dir.join(name), name).unwrap();
+            files.insert(name.to_string(), sha256_file(&dir.join(name)).unwrap());
+        }
+        // Written without stats, as before they were recorded, so every file is hashed
+        let manifest = SharedResources { key: key(), logrows: 11, files, stats: BTreeMap::new() };
+        fs::write(dir.join(SHARED_RESOURCES_FILE), serde_json::to_string(&manifest).unwrap()).unwrap();
+        let mut manifest = read_shared_resources(&dir).unwrap();
+        assert!(manifest.stats.is_empty());
+        assert!(shared_resources_current(&dir, &manifest, &key()));
+
+        // With stats recorded, a file whose size and mtime match is not read again
+        manifest.record_stats(&dir).unwrap();
+        manifest.files.insert("pk.key".into(), "stale".into());
+        assert!(shared_resources_current(&dir, &manifest, &key()));
+        manifest.stats.remove("pk.key");
+        assert!(!shared_resources_current(&dir, &manifest, &key()));
+        manifest.files.insert("pk.key".into(), sha256_file(&dir.join("pk.key")).unwrap());
+        manifest.record_stats(&dir).unwrap();
+        assert!(SharedHashes::from_files(&manifest.files).is_ok());
+        assert!(!shared_resources_current(&dir, &manifest,
+            &SharedResourcesKey { ezkl_version: "ezkl 21.0.0".into(), ..key() }));
+
+        // An edit changes the size here; the mtime alone is too coarse on some filesystems
+        fs::write(dir.join("pk.key"), "edited key").unwrap();
+        assert!(!shared_resources_current(&dir, &manifest, &key()));
+
+        fs::write(dir.join("settings.json"), r#"{"run_args": {"logrows": 12}}"#).unwrap();
+        assert_eq!(settings_logrows(&dir.join("settings.json")).unwrap(), 12);
+        fs::remove_dir_all(dir).unwrap();
     }
-    
-    // Print success output
-    let stdout = String::from_utf8_lossy(&output.stdout);
-    log_success(&format!("EZKL script execution successful:\n{}", stdout));
-    Ok(())
 }
-
@@ -0,0 +1,117 @@
+use anyhow::{Context, Result};
+use serde::{Deserialize, Serialize};
+use std::collections::BTreeMap;
+use std::fs;
+use std::path::{Path, PathBuf};
+
+use crate::utils::{sha256_file, write_renamed};
+
+/// Per-address manifest of the steps already done, next to the artifacts
+pub const MANIFEST_FILE: &str = "steps.json";
+
+/// SHA-256 hashes of what one step consumed and produced
+#[derive(Debug, Default, PartialEq, Serialize, Deserialize)]
+struct StepRecord {
+    inputs: BTreeMap<String, String>,
+    outputs: BTreeMap<String, String>,
+}
+
+/// Records each pipeline step of one address with the hashes of its inputs and
+/// outputs, so a rerun skips the steps whose inputs have not changed.
+///
+/// Outputs inside the address directory are recorded relative to it, so the
+/// manifest stays valid when the directory is moved to another layout. The
+/// manifest is renamed into place without an fsync; the caller syncs the
+/// directory once per address, and a manifest lost in a crash only means the
+/// steps run again.
+pub struct StepManifest {
+    dir: PathBuf,
+    steps: BTreeMap<String, StepRecord>,
+}
+
+impl StepManifest {
+    /// Loads the manifest in `dir`; a missing or unreadable manifest is empty, so every step runs
+    pub fn load(dir: &Path) -> Self {
+        let steps = fs::read_to_string(dir.join(MANIFEST_FILE))
+            .ok()
+            .and_then(|json| serde_json::from_str(&json).ok())
+            .unwrap_or_default();
+        StepManifest { dir: dir.to_path_buf(), steps }
+    }
+
+    /// Runs `step` unless it last ran on the same `inputs` and its recorded outputs
+    /// still have the hashes it left them with. Returns whether the step ran.
+    pub fn run(&mut self, name: &str, inputs: &[(&str, &str)], outputs: &[&Path],
+        step: impl FnOnce() -> Result<()>) -> Result<bool> {
+        let inputs: BTreeMap<String, String> = inputs.iter()
+            .map(|(name, hash)| (name.to_string(), hash.to_string()))
+            .collect();
+        if let Some(record) = self.steps.get(name) {
+            if record.inputs == inputs && self.outputs_unchanged(record) {
+                return Ok(false);
+            }
+        }
+
+        // Forget the step before running it, so a failed or interrupted run cannot look done
+        if self.steps.remove(name).is_some() {
+            self.save()?;
+        }
+        step()?;
+        let outputs = outputs.iter()
+            .map(|path| Ok((self.output_key(path), sha256_file(path)?)))
+            .collect::<Result<_>>()?;
+        self.steps.insert(name.to_string(), StepRecord { inputs, outputs });
+        self.save()?;
+        Ok(true)
+    }
+
+    fn outputs_unchanged(&self, record: &StepRecord) -> bool {
+        record.outputs.iter()
+            .all(|(path, hash)| sha256_file(&self.dir.join(path)).is_ok_and(|current| &current == hash))
+    }
+
+    /// Path relative to the address directory, or absolute for files outside it
+    fn output_key(&self, path: &Path) -> String {
+        match path.strip_prefix(&self.dir) {
+            Ok(relative) => relative.to_string_lossy().into_owned(),
+            Err(_) => fs::canonicalize(path).unwrap_or_else(|_| path.to_path_buf()).to_string_lossy().into_owned(),
+        }
+    }
+
+    fn save(&self) -> Result<()> {
+        let path = self.dir.join(MANIFEST_FILE);
+        write_renamed(&path, serde_json::to_string_pretty(&self.steps)?.as_bytes())
+            .context(format!("Failed to write {}", path.display()))
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use std::cell::Cell;
+
+    #[test]
+    fn test_step_reruns_only_when_inputs_or_outputs_change() {
+        let dir = std::env::temp_dir().join(format!("step_manifest_{}", std::process::id()));
+        let _ = fs::remove_dir_all(&dir);
+        fs::create_dir_all(&dir).unwrap();
+        let output = dir.join("out.json");
+        let runs = Cell::new(0);
+        let step = |hash: &str| {
+            StepManifest::load(&dir).run("step", &[("in.json", hash)], &[&output], || {
+                runs.set(runs.get() + 1);
+                Ok(fs::write(&output, "out")?)
+            }).unwrap()
+        };
+
+        assert!(step("a"));
+        assert!(!step("a"));
+        assert!(step("b"));
+        fs::write(&output, "edited").unwrap();
+        assert!(step("b"));
+        fs::remove_file(&output).unwrap();
+        assert!(step("b"));
+        assert_eq!(runs.get(), 4);
+        fs::remove_dir_all(dir).unwrap();
+    }
+}
@@ -1,11 +1,76 @@
-use anyhow::Result;
+use anyhow::{anyhow, Context, Result};
+use serde::{Deserialize, Serialize};
+use sha2::{Digest, Sha256};
+use std::fs::{self, File};
+use std::io::Write;
+use std::path::{Path, PathBuf};
+use std::time::UNIX_EPOCH;
 use synthetic_data::CreditData;
 
+/// File in an artifact root that names its layout; a root without one is flat
+pub const LAYOUT_FILE: &str = "layout";
+
 pub fn address_to_filename(address: &str) -> String {
     // Remove '0x' prefix if present and return the address
     address.trim_start_matches("0x").to_string()
 }
 
+/// Checks that an address names a directory inside an artifact root, the rule of
+/// validate_address in credit_model.py: ASCII, and once 0x is removed, not empty,
+/// `.` or `..` and without path separators
+pub fn validate_address(address: &str) -> Result<()> {
+    let name = address_to_filename(address);
+    if !address.is_ascii() || name.contains(['/', '\\']) || matches!(name.as_str(), "" | "." | "..") {
+        return Err(anyhow!("Address must be ASCII and name a directory (not empty, . or .., \
+            without path separators) once 0x is removed: {:?}", address));
+    }
+    Ok(())
+}
+
+/// How per-address entries are placed under an artifact root
+#[derive(Clone, Copy, Debug, PartialEq, Eq)]
+pub enum Layout {
+    /// `<root>/<address>`
+    Flat,
+    /// `<root>/ab/cd/<address>`, where abcd starts the SHA-256 of the
+    /// lowercase address without 0x
+    Sharded,
+}
+
+impl Layout {
+    /// Reads the layout recorded in `root`, defaulting to flat
+    pub fn detect(root: &Path) -> Result<Layout> {
+        let path = root.join(LAYOUT_FILE);
+        match fs::read_to_string(&path) {
+            Ok(contents) => match contents.trim() {
+                "flat" => Ok(Layout::Flat),
+                "sharded" => Ok(Layout::Sharded),
+                other => Err(anyhow::anyhow!("Unknown layout '{}' in {}", other, path.display())),
+            },
+            Err(e) if e.kind() == std::io::ErrorKind::NotFound => Ok(Layout::Flat),
+            Err(e) => Err(e).context(format!("Failed to read {}", path.display())),
+        }
+    }
+}
+
+/// The directory holding an address's entry: `root` itself, or its shard under `root`.
+/// Matches shard_dir in script/credit_model.py.
+pub fn shard_dir(root: &Path, address: &str, layout: Layout) -> PathBuf {
+    match layout {
+        Layout::Flat => root.to_path_buf(),
+        Layout::Sharded => {
+            let name = address_to_filename(address).to_ascii_lowercase();
+            let digest = hex::encode(Sha256::digest(name.as_bytes()));
+            root.join(&digest[..2]).join(&digest[2..4])
+        }
+    }
+}
+
+/// The artifact directory of an address under `root`
+pub fn address_dir(root: &Path, address: &str, layout: Layout) -> PathBuf {
+    shard_dir(root, address, layout).join(address_to_filename(address))
+}
+
 pub fn get_features_for_address(data: &CreditData, address: &str) -> Result<Vec<f32>> {
     if let Some(ref address_mapping) = data.address_mapping {
         if let Some(&index) = address_mapping.get(address) {
@@ -16,3 +81,116 @@ pub fn get_features_for_address(data: &CreditData, address: &str) -> Result<Vec<
     // If not found, use default features (this shouldn't happen with our test addresses)
     Err(anyhow::anyhow!("Address not found in synthetic data: {}", address))
 }
+
+/// SHA-256 of a file's contents as lowercase hex, read in a streaming fashion
+pub fn sha256_file(path: &Path) -> Result<String> {
+    let mut file = File::open(path).context(format!("Failed to open {}", path.display()))?;
+    let mut hasher = Sha256::new();
+    std::io::copy(&mut file, &mut hasher).context(format!("Failed to read {}", path.display()))?;
+    Ok(hex::encode(hasher.finalize()))
+}
+
+/// Size and modification time of a file, recorded next to its hash so an
+/// unchanged file can be recognised without reading it again
+#[derive(Debug, Clone, PartialEq, Serialize, Deserialize)]
+pub struct FileStat {
+    size: u64,
+    modified_secs: u64,
+    modified_nanos: u32,
+}
+
+impl FileStat {
+    pub fn of(path: &Path) -> Result<Self> {
+        let metadata = fs::metadata(path).context(format!("Failed to stat {}", path.display()))?;
+        let modified = metadata.modified()?.duration_since(UNIX_EPOCH).unwrap_or_default();
+        Ok(FileStat {
+            size: metadata.len(),
+            modified_secs: modified.as_secs(),
+            modified_nanos: modified.subsec_nanos(),
+        })
+    }
+}
+
+/// Writes `contents` to `<path>.tmp` and renames it into place, fsyncing the
+/// temporary file first when `sync` is set
+fn write_through_tmp(path: &Path, contents: &[u8], sync: bool) -> Result<()> {
+    let mut tmp_name = path.as_os_str().to_owned();
+    tmp_name.push(".tmp");
+    let tmp_path = Path::new(&tmp_name);
+
+    let mut file = File::create(tmp_path)
+        .context(format!("Failed to create {}", tmp_path.display()))?;
+    file.write_all(contents)
+        .context(format!("Failed to write {}", tmp_path.display()))?;
+    if sync {
+        file.sync_all()?;
+    }
+    fs::rename(tmp_path, path)
+        .context(format!("Failed to move {} into place", path.display()))?;
+    Ok(())
+}
+
+/// Directory holding `path`, `.` for a bare file name
+fn parent_dir(path: &Path) -> &Path {
+    match path.parent() {
+        Some(parent) if !parent.as_os_str().is_empty() => parent,
+        _ => Path::new("."),
+    }
+}
+
+/// Writes a file through `<path>.tmp` and renames it into place, so readers
+/// never see a truncated file even if the process dies mid-write. The file
+/// and its directory entry are fsynced before returning.
+pub fn write_atomic(path: &Path, contents: &[u8]) -> Result<()> {
+    write_through_tmp(path, contents, true)?;
+    sync_dir(parent_dir(path))
+}
+
+/// Like write_atomic, but nothing is fsynced: the caller writes a group of files
+/// this way and makes their renames durable with one sync_dir() per directory,
+/// like GroupCommit in credit_model.py. Use it only for files whose contents are
+/// checked or rewritten on the next run, such as the per-address inputs and the
+/// step manifest, whose hashes catch a file torn by a crash.
+pub fn write_renamed(path: &Path, contents: &[u8]) -> Result<()> {
+    write_through_tmp(path, contents, false)
+}
+
+/// fsyncs a directory, making the renames into it durable
+pub fn sync_dir(dir: &Path) -> Result<()> {
+    File::open(dir)
+        .and_then(|dir| dir.sync_all())
+        .context(format!("Failed to sync {}", dir.display()))
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_sharded_dir_matches_python_layout() {
+        let root = Path::new("proof_generation");
+        let address = "0x276ef71c8F12508d187E7D8Fcc2FE6A38a5884B1";
+        assert_eq!(
+            address_dir(root, address, Layout::Flat),
+            Path::new("proof_generation/276ef71c8F12508d187E7D8Fcc2FE6A38a5884B1")
+        );
+        // Same path as credit_model.address_dir(root, address, "sharded")
+        assert_eq!(
+            address_dir(root, address, Layout::Sharded),
+            Path::new("proof_generation/9a/f4/276ef71c8F12508d187E7D8Fcc2FE6A38a5884B1")
+        );
+        // The shard ignores the 0x prefix and the address checksum casing
+        assert_eq!(
+            shard_dir(root, address, Layout::Sharded),
+            shard_dir(root, &address[2..].to_lowercase(), Layout::Sharded)
+        );
+    }
+
+    #[test]
+    fn test_addresses_must_stay_inside_the_root() {
+        assert!(validate_address("0x276ef71c8F12508d187E7D8Fcc2FE6A38a5884B1").is_ok());
+        for address in ["", "0x", "0x0x", ".", "..", "0x..", "../x", "a\\b", "0xäbc"] {
+            assert!(validate_address(address).is_err(), "{:?}", address);
+        }
+    }
+}